@@ -0,0 +1,122 @@
+"""
+Compares the two request execution modes of the backend against a live database:
+
+- sync:  blocking psycopg pool, every handler runs via Starlette's threadpool
+         (anyio.to_thread.run_sync, capped by the default 40-token limiter)
+- async: psycopg AsyncConnectionPool awaited directly on the event loop
+
+Each simulated request checks out a connection and runs a query that sleeps on
+the server side, so the numbers show how many slow-DB requests one worker can
+keep in flight. Uses the same DB_* env vars as the backend.
+
+Usage (from the backend directory):
+    python -m benchmarks.async_vs_sync --requests 500 --concurrency 200 --query-seconds 0.05
+"""
+import argparse
+import asyncio
+import statistics
+import threading
+import time
+
+import anyio.to_thread
+from psycopg_pool import AsyncConnectionPool, ConnectionPool
+
+from db import _conninfo
+
+SLOW_QUERY = "SELECT pg_sleep(%s)"
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _report(mode: str, latencies: list[float], wall_s: float, peak_in_flight: int):
+    print(
+        f"{mode:>5}: {len(latencies)} requests in {wall_s:.2f}s "
+        f"-> {len(latencies) / wall_s:.1f} req/s | "
+        f"p50 {statistics.median(latencies) * 1000:.1f} ms, "
+        f"p95 {_percentile(latencies, 95) * 1000:.1f} ms, "
+        f"max {max(latencies) * 1000:.1f} ms | peak queries in flight: {peak_in_flight}"
+    )
+
+
+async def _drive(handler, n_requests: int, concurrency: int) -> tuple[list[float], float]:
+    """Fires n_requests at handler with at most `concurrency` outstanding client requests"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+
+    async def one_request():
+        async with semaphore:
+            started = time.perf_counter()
+            await handler()
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one_request() for _ in range(n_requests)))
+    return latencies, time.perf_counter() - started
+
+
+async def run_sync_mode(args) -> None:
+    in_flight = 0
+    peak = 0
+    counter_lock = threading.Lock()
+
+    with ConnectionPool(_conninfo(), min_size=args.pool_size, max_size=args.pool_size, timeout=300) as pool:
+        pool.wait()
+
+        def handler():
+            nonlocal in_flight, peak
+            with pool.connection() as conn:
+                with counter_lock:
+                    in_flight += 1
+                    peak = max(peak, in_flight)
+                conn.execute(SLOW_QUERY, (args.query_seconds,))
+                with counter_lock:
+                    in_flight -= 1
+
+        async def via_threadpool():
+            # the same hop Starlette makes for plain `def` endpoints
+            await anyio.to_thread.run_sync(handler)
+
+        latencies, wall_s = await _drive(via_threadpool, args.requests, args.concurrency)
+    _report("sync", latencies, wall_s, peak)
+
+
+async def run_async_mode(args) -> None:
+    in_flight = 0
+    peak = 0
+
+    async with AsyncConnectionPool(_conninfo(), min_size=args.pool_size, max_size=args.pool_size, timeout=300) as pool:
+        await pool.wait()
+
+        async def handler():
+            nonlocal in_flight, peak
+            async with pool.connection() as conn:
+                in_flight += 1
+                peak = max(peak, in_flight)
+                await conn.execute(SLOW_QUERY, (args.query_seconds,))
+                in_flight -= 1
+
+        latencies, wall_s = await _drive(handler, args.requests, args.concurrency)
+    _report("async", latencies, wall_s, peak)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark sync (threadpool) vs async request handling")
+    parser.add_argument("--requests", type=int, default=500, help="total simulated requests per mode")
+    parser.add_argument("--concurrency", type=int, default=200, help="max outstanding client requests")
+    parser.add_argument("--query-seconds", type=float, default=0.05, help="server-side duration of each query")
+    parser.add_argument("--pool-size", type=int, default=100, help="connections in each pool")
+    parser.add_argument("--mode", choices=["sync", "async", "both"], default="both")
+    args = parser.parse_args()
+
+    if args.mode in ("sync", "both"):
+        asyncio.run(run_sync_mode(args))
+    if args.mode in ("async", "both"):
+        asyncio.run(run_async_mode(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+import asyncio
+import datetime
+import hashlib
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional
+from urllib.parse import urlencode
+
+import psycopg
+
+from db import _conninfo, connection
+
+logger = logging.getLogger("response-cache")
+
+# Channel the fetcher NOTIFYs on after committing a load (see BaseProductFetcher._notify_data_changed)
+DATA_CHANGED_CHANNEL = "products_updated"
+
+# Serialized JSON body + extra response headers
+CachedResponse = tuple[bytes, dict[str, str]]
+
+
+class ResponseCache:
+    """
+    In-process cache of serialized response bodies (plus their extra headers, e.g. the next-page
+    cursor), keyed by cache_key.
+    Entries are dropped when the fetcher announces new data, or after ttl_seconds as a
+    fallback in case a notification is missed. At most max_entries are kept: storing one more
+    evicts the least recently used, so varying query parameters cannot grow memory without bound.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int = 1000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max(1, max_entries)
+        self._entries: OrderedDict[str, tuple[float, CachedResponse]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+        #bumped on every invalidation so bodies built from pre-invalidation data are not stored
+        self._generation = 0
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key: str, response: CachedResponse):
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, response)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def get_or_build(self, key: str, build: Callable[[], Awaitable[CachedResponse]]) -> CachedResponse:
+        """Returns the cached (body, headers) for key, or builds (and caches) it on a miss"""
+        response = self.get(key)
+        if response is None:
+            generation = self._generation
+            response = await build()
+            if generation == self._generation:
+                self.set(key, response)
+        return response
+
+    def invalidate(self):
+        self._entries.clear()
+        self._generation += 1
+        self.invalidations += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "evictions": self.evictions,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "ttl_seconds": self.ttl_seconds,
+        }
+
+
+class DatasetVersion:
+    """
+    In-process copy of the data_versions table (last change per data source), used for
+    ETag/Last-Modified. Read from the db at most once per invalidation / ttl_seconds.
+    """
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._expires_at = 0.0
+        self._token = ""
+        self._last_modified: Optional[datetime.datetime] = None
+        self._generation = 0
+
+    async def current(self) -> tuple[str, Optional[datetime.datetime]]:
+        """
+        Returns:
+            tuple[str, Optional[datetime.datetime]]: an opaque version token that changes whenever
+            any data source is reloaded, and the time of the newest change (None if no data yet).
+        """
+        if self._expires_at < time.monotonic():
+            generation = self._generation
+            async with connection() as db, db.cursor() as cursor:
+                await cursor.execute("SELECT tonno_data_source, version_ts FROM data_versions ORDER BY tonno_data_source")
+                rows = await cursor.fetchall()
+            token = hashlib.sha1(repr(rows).encode()).hexdigest()[:16]
+            last_modified = max((row[1] for row in rows), default=None)
+            if generation == self._generation:
+                self._token, self._last_modified = token, last_modified
+                self._expires_at = time.monotonic() + self.ttl_seconds
+            return token, last_modified
+        return self._token, self._last_modified
+
+    def invalidate(self):
+        self._expires_at = 0.0
+        self._generation += 1
+
+
+def cache_key(path: str, **params) -> str:
+    """
+    Response cache key from a route's path and its parsed, validated parameters: unset ones are left
+    out and the rest sorted by name, so reordered, unknown or differently spelled query strings of
+    the same request share one entry.
+    """
+    return f"{path}?{urlencode(sorted((name, str(value)) for name, value in params.items() if value is not None))}"
+
+
+response_cache = ResponseCache(
+    ttl_seconds=float(os.environ.get("RESPONSE_CACHE_TTL_SECONDS", "3600")),
+    max_entries=int(os.environ.get("RESPONSE_CACHE_MAX_ENTRIES", "1000")),
+)
+dataset_version = DatasetVersion(ttl_seconds=response_cache.ttl_seconds)
+
+
+async def listen_for_data_changes(reconnect_delay: float = 5.0):
+    """
+    Background task: LISTENs for fetcher notifications and invalidates the response cache
+    and the dataset version.
+    Reconnects forever on errors; the cache is invalidated on every (re)connect because
+    notifications sent while disconnected are lost.
+    """
+    while True:
+        try:
+            async with await psycopg.AsyncConnection.connect(_conninfo(), autocommit=True) as conn:
+                await conn.execute(f"LISTEN {DATA_CHANGED_CHANNEL}")
+                response_cache.invalidate()
+                dataset_version.invalidate()
+                logger.info(f"Listening for data changes on '{DATA_CHANGED_CHANNEL}'")
+                async for notify in conn.notifies():
+                    logger.info(f"New data loaded for {notify.payload}, invalidating response cache")
+                    response_cache.invalidate()
+                    dataset_version.invalidate()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Data change listener failed ({e}), reconnecting in {reconnect_delay}s")
+            await asyncio.sleep(reconnect_delay)
@@ -0,0 +1,61 @@
+import datetime
+import hashlib
+from email.utils import format_datetime, parsedate_to_datetime
+
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import Request
+from starlette.responses import Response
+
+from cache import dataset_version
+
+# Read endpoints whose responses only change when the fetcher loads new data
+CONDITIONAL_PATH_PREFIX = "/coffees"
+
+
+def _etag(version_token: str, request: Request) -> str:
+    # weak: the same representation may be sent gzip-compressed or not
+    digest = hashlib.sha1(f"{version_token}|{request.url.path}?{request.url.query}".encode()).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+
+def _not_modified(request: Request, etag: str, last_modified: datetime.datetime | None) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # If-None-Match takes precedence over If-Modified-Since (RFC 9110 13.2.2)
+        candidates = {tag.strip() for tag in if_none_match.split(",")}
+        return "*" in candidates or etag in candidates or etag.removeprefix("W/") in candidates
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        return last_modified.astimezone(datetime.timezone.utc).replace(microsecond=0) <= since
+    return False
+
+
+class ConditionalGetMiddleware(BaseHTTPMiddleware):
+    """
+    Adds ETag / Last-Modified (derived from the data_versions table) to successful GETs of the
+    read API, and answers matching If-None-Match / If-Modified-Since requests with 304 before
+    the route (and its db query) runs.
+    """
+
+    async def dispatch(self, request: Request, call_next):
+        if request.method != "GET" or not request.url.path.startswith(CONDITIONAL_PATH_PREFIX):
+            return await call_next(request)
+
+        version_token, last_modified = await dataset_version.current()
+        validators = {"ETag": _etag(version_token, request), "Cache-Control": "no-cache"}
+        if last_modified is not None:
+            # data_versions.version_ts is a TIMESTAMPTZ, HTTP dates are in GMT
+            validators["Last-Modified"] = format_datetime(last_modified.astimezone(datetime.timezone.utc), usegmt=True)
+
+        if _not_modified(request, validators["ETag"], last_modified):
+            return Response(status_code=304, headers=validators)
+
+        response = await call_next(request)
+        if response.status_code == 200:
+            response.headers.update(validators)
+        return response
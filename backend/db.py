@@ -1,15 +1,95 @@
 import os
-import psycopg2
-
-def get_db():
-    conn = psycopg2.connect(
-        host=os.environ["DB_HOST"],
-        port="5432",
-        dbname=os.environ["DB_NAME"],
-        user=os.environ["DB_USER"],
-        password=os.environ["DB_PASSWORD"]
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from psycopg.types.numeric import FloatLoader
+from psycopg_pool import AsyncConnectionPool
+
+# Process-wide pool, opened once on app startup (see lifespan in main.py)
+_pool: Optional[AsyncConnectionPool] = None
+
+
+def _conninfo() -> str:
+    return (
+        f"host={os.environ['DB_HOST']} port=5432 dbname={os.environ['DB_NAME']} "
+        f"user={os.environ['DB_USER']} password={os.environ['DB_PASSWORD']}"
     )
-    try:
+
+
+async def _configure_connection(conn):
+    # NUMERIC columns come back as float instead of Decimal: every API model exposes them as
+    # floats and the fast JSON path (serialization.py) can encode floats natively
+    conn.adapters.register_loader("numeric", FloatLoader)
+
+
+async def open_pool() -> AsyncConnectionPool:
+    """
+    Creates and opens the connection pool. Sizing can be tuned with env vars:
+    DB_POOL_MIN_SIZE (default 2), DB_POOL_MAX_SIZE (default 10) and
+    DB_POOL_TIMEOUT (seconds to wait for a free connection, default 30).
+    Every connection is health checked when it is checked out of the pool.
+    """
+    global _pool
+    if _pool is None:
+        _pool = AsyncConnectionPool(
+            _conninfo(),
+            min_size=int(os.environ.get("DB_POOL_MIN_SIZE", "2")),
+            max_size=int(os.environ.get("DB_POOL_MAX_SIZE", "10")),
+            timeout=float(os.environ.get("DB_POOL_TIMEOUT", "30")),
+            check=AsyncConnectionPool.check_connection,
+            configure=_configure_connection,
+            name="tonno-backend",
+            open=False,
+        )
+        await _pool.open()
+    return _pool
+
+
+async def close_pool():
+    """Closes all pooled connections, waiting for checked out ones to be returned"""
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+
+
+def get_pool_stats() -> dict:
+    """Returns a snapshot of pool usage (connections in use, waiting requests, checkout wait time)"""
+    if _pool is None:
+        return {"open": False}
+    stats = _pool.get_stats()
+    pool_size = stats.get("pool_size", 0)
+    pool_available = stats.get("pool_available", 0)
+    requests_num = stats.get("requests_num", 0)
+    requests_wait_ms = stats.get("requests_wait_ms", 0)
+    return {
+        "open": True,
+        "min_size": stats.get("pool_min"),
+        "max_size": stats.get("pool_max"),
+        "size": pool_size,
+        "available": pool_available,
+        "in_use": pool_size - pool_available,
+        "waiting": stats.get("requests_waiting", 0),
+        "checkouts": requests_num,
+        "checkouts_queued": stats.get("requests_queued", 0),
+        "checkout_errors": stats.get("requests_errors", 0),
+        "checkout_wait_ms_total": requests_wait_ms,
+        "checkout_wait_ms_avg": round(requests_wait_ms / requests_num, 3) if requests_num else 0.0,
+        "connections_opened": stats.get("connections_num", 0),
+        "connections_lost": stats.get("connections_lost", 0),
+    }
+
+
+@asynccontextmanager
+async def connection():
+    """Borrows a connection from the pool, for routes that only touch the db on some code paths"""
+    if _pool is None:
+        raise RuntimeError("Database pool is not open")
+    async with _pool.connection() as conn:
+        yield conn
+
+
+async def get_db():
+    """FastAPI dependency: borrows a connection from the pool for the duration of a request"""
+    async with connection() as conn:
         yield conn
-    finally:
-        conn.close()
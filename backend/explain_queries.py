@@ -0,0 +1,135 @@
+"""
+Captures EXPLAIN (ANALYZE, BUFFERS) plans for every router query against the configured
+database, so index usage can be checked as products_and_prices grows.
+
+Usage (from the backend directory, same DB_* env vars as the API):
+    python explain_queries.py                      # print a summary + text plans
+    python explain_queries.py --output-dir plans   # also store each JSON plan as a file
+    python explain_queries.py --fail-on-seq-scan   # exit 1 if a history table is seq scanned
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+import psycopg
+
+from db import _conninfo
+from pagination import encode_cursor
+from routers.get_coffee_prices import build_coffee_prices_query
+from routers.get_latest_price_changes import build_latest_price_changes_query
+from routers.get_price_history import (
+    MAX_HISTORY_IDS, build_batch_price_history_query, build_price_history_query, build_product_list_query,
+)
+
+# Tables that must be read through an index once they are large
+INDEXED_TABLES = {"products_and_prices", "price_intervals", "price_change_events"}
+
+
+def router_queries(conn) -> dict[str, tuple[str, list | tuple]]:
+    """Every router query with representative parameters taken from the db itself"""
+    row = conn.execute(
+        "SELECT id FROM price_intervals GROUP BY id ORDER BY count(*) DESC LIMIT 1"
+    ).fetchone()
+    sample_product_id = row[0] if row else ""
+    sample_product_ids = [
+        product_id for (product_id,) in conn.execute(
+            "SELECT DISTINCT id FROM price_intervals LIMIT %s", (MAX_HISTORY_IDS,)
+        ).fetchall()
+    ]
+    row = conn.execute(
+        "SELECT CAST(change_ts AS varchar), id, tonno_store_id FROM price_change_events "
+        "ORDER BY change_ts DESC, id DESC, tonno_store_id DESC OFFSET 50 LIMIT 1"
+    ).fetchone()
+    deep_changes_cursor = encode_cursor(*row) if row else None
+    return {
+        "coffee_prices": build_coffee_prices_query(),
+        "coffee_prices_page": build_coffee_prices_query(limit=100),
+        "product_list": build_product_list_query(),
+        "price_history": build_price_history_query(sample_product_id),
+        "price_history_batch": build_batch_price_history_query(sample_product_ids),
+        "latest_price_changes": build_latest_price_changes_query(limit=50),
+        "latest_price_changes_deep_page": build_latest_price_changes_query(limit=50, cursor=deep_changes_cursor),
+    }
+
+
+def _walk(plan_node: dict):
+    yield plan_node
+    for child in plan_node.get("Plans", []):
+        yield from _walk(child)
+
+
+def format_plan(plan_node: dict, depth: int = 0) -> list[str]:
+    """Indented text rendering of a JSON plan tree, one line per node with its estimates and actuals"""
+    label = plan_node["Node Type"]
+    if "Index Name" in plan_node:
+        label += f" using {plan_node['Index Name']}"
+    if "Relation Name" in plan_node:
+        label += f" on {plan_node['Relation Name']}"
+    line = (
+        f"{'  ' * depth}{'-> ' if depth else ''}{label}  "
+        f"(cost={plan_node['Startup Cost']:.2f}..{plan_node['Total Cost']:.2f} rows={plan_node['Plan Rows']})"
+    )
+    if "Actual Total Time" in plan_node:
+        line += (
+            f" (actual time={plan_node['Actual Startup Time']:.3f}..{plan_node['Actual Total Time']:.3f} "
+            f"rows={plan_node['Actual Rows']} loops={plan_node['Actual Loops']})"
+        )
+    lines = [line]
+    for key in ("Index Cond", "Filter", "Recheck Cond", "Sort Key"):
+        if key in plan_node:
+            value = plan_node[key]
+            lines.append(f"{'  ' * depth}     {key}: {', '.join(value) if isinstance(value, list) else value}")
+    if "Shared Hit Blocks" in plan_node:
+        lines.append(
+            f"{'  ' * depth}     Buffers: shared hit={plan_node['Shared Hit Blocks']} read={plan_node['Shared Read Blocks']}"
+        )
+    for child in plan_node.get("Plans", []):
+        lines.extend(format_plan(child, depth + 1))
+    return lines
+
+
+def seq_scanned_tables(plan: dict) -> set[str]:
+    """Relations read with a sequential scan anywhere in the plan tree"""
+    return {
+        node["Relation Name"]
+        for node in _walk(plan["Plan"])
+        if node.get("Node Type") == "Seq Scan" and "Relation Name" in node
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Capture EXPLAIN plans of the API's router queries")
+    parser.add_argument("--output-dir", type=Path, help="directory to write <query>.json plans into")
+    parser.add_argument("--fail-on-seq-scan", action="store_true",
+                        help=f"exit with status 1 if any of {sorted(INDEXED_TABLES)} is sequentially scanned")
+    args = parser.parse_args()
+
+    offending: list[str] = []
+    with psycopg.connect(_conninfo()) as conn:
+        for name, (query, params) in router_queries(conn).items():
+            # one EXPLAIN ANALYZE per query: the text plan is rendered from the same JSON plan
+            plan = conn.execute(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {query}", params or None).fetchone()[0][0]
+            text_plan = "\n".join(format_plan(plan["Plan"]))
+            seq_scans = seq_scanned_tables(plan) & INDEXED_TABLES
+            if seq_scans:
+                offending.append(name)
+
+            print(f"=== {name}: {plan['Execution Time']:.2f} ms, "
+                  f"seq scans on indexed tables: {sorted(seq_scans) or 'none'}")
+            print(text_plan)
+            print()
+
+            if args.output_dir:
+                args.output_dir.mkdir(parents=True, exist_ok=True)
+                (args.output_dir / f"{name}.json").write_text(json.dumps(plan, indent=2))
+            # EXPLAIN ANALYZE really executes the query; never keep any side effects
+            conn.rollback()
+
+    if offending and args.fail_on_seq_scan:
+        print(f"Sequential scans on indexed tables in: {offending}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
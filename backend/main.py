@@ -1,10 +1,18 @@
+import asyncio
 import requests
+from contextlib import asynccontextmanager, suppress
 from fastapi import FastAPI
 
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from routers.get_coffee_prices import router as coffee_router
 from routers.get_price_history import router as history_router
 from routers.get_latest_price_changes import router as latest_changes_router
+from routers.get_stats import router as stats_router
+from db import open_pool, close_pool
+from cache import listen_for_data_changes
+from pagination import NEXT_CURSOR_HEADER
+from conditional import ConditionalGetMiddleware
 from fastapi.routing import APIRoute
 
 #frontend will be running on same machine as the backend -> get curr machine IP to be allowed in CORS
@@ -23,11 +31,33 @@ allowed_origins: list = [
     f"http://tonnopannu.duckdns.org:49101",
 ]
 
-app = FastAPI(title="Tonno coffee API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    #one db connection pool per process, shared by all requests
+    await open_pool()
+    #fetcher NOTIFYs after every load -> drop cached responses
+    listener = asyncio.create_task(listen_for_data_changes())
+    try:
+        yield
+    finally:
+        listener.cancel()
+        #wait for the listener to close its own (non-pool) LISTEN connection, so shutdown leaves nothing behind
+        with suppress(asyncio.CancelledError):
+            await listener
+        await close_pool()
+
+app = FastAPI(title="Tonno coffee API", lifespan=lifespan)
 
 app.include_router(coffee_router)
 app.include_router(history_router)
 app.include_router(latest_changes_router)
+app.include_router(stats_router)
+
+#compresses larger JSON bodies for clients sending Accept-Encoding: gzip
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
+#answers If-None-Match/If-Modified-Since with 304, added first so CORS headers still wrap it
+app.add_middleware(ConditionalGetMiddleware)
 
 app.add_middleware(
     CORSMiddleware,
@@ -36,6 +66,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
 @app.get("/")
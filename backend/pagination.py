@@ -0,0 +1,37 @@
+import base64
+import binascii
+import json
+from typing import Optional
+
+from fastapi import HTTPException
+
+# Response header carrying the cursor of the next page (absent on the last page)
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(*values) -> str:
+    """Packs the sort key of the last returned row into an opaque, url-safe cursor string"""
+    return base64.urlsafe_b64encode(json.dumps(values, separators=(",", ":")).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> list:
+    """Unpacks a cursor made by encode_cursor, answering 400 if it is malformed"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(values, list) or len(values) != size or not all(isinstance(v, str) for v in values):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+
+def where_clause(conditions: list[str]) -> str:
+    return f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+
+def limit_clause(limit: Optional[int], params: list) -> str:
+    """LIMIT fetching one extra row, so the caller knows whether there is a next page"""
+    if limit is None:
+        return ""
+    params.append(limit + 1)
+    return "LIMIT %s"
@@ -1,10 +1,33 @@
-from fastapi import APIRouter, Depends
+import datetime
+from typing import Optional
+
+from fastapi import APIRouter, Query, Request, Response
 from pydantic import BaseModel
-from db import get_db
-import psycopg2
+from db import connection
+from cache import cache_key, response_cache
+from pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor, limit_clause, where_clause
+from serialization import Layout, render_rows
 
 router = APIRouter()
 
+# Pages are ordered by (tonno_load_ts, id, tonno_store_id), served by current_prices_load_ts_idx
+COFFEE_PRICES_QUERY = """
+    SELECT
+        name_finnish,
+        current_price,
+        net_weight,
+        price_per_weight,
+        tonno_data_source,
+        fl_deal_price,
+        CAST(tonno_load_ts AS varchar),
+        tonno_store_id,
+        id
+    FROM current_prices
+    {where}
+    ORDER BY tonno_load_ts ASC, id ASC, tonno_store_id ASC
+    {limit}
+"""
+
 class CoffeeOut(BaseModel):
     name_finnish: str
     normal_price: float
@@ -13,41 +36,74 @@ class CoffeeOut(BaseModel):
     data_source: str
     fl_deal_price: int
     data_fetched_ts: str
+    store_id: str
+
+
+def build_coffee_prices_query(
+    data_source: Optional[str] = None,
+    store_id: Optional[str] = None,
+    brand: Optional[str] = None,
+    since: Optional[datetime.datetime] = None,
+    until: Optional[datetime.datetime] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+) -> tuple[str, list]:
+    """Renders COFFEE_PRICES_QUERY with the requested filters and keyset position pushed into SQL"""
+    conditions: list[str] = []
+    params: list = []
+    if data_source:
+        conditions.append("tonno_data_source = %s")
+        params.append(data_source)
+    if store_id:
+        conditions.append("tonno_store_id = %s")
+        params.append(store_id)
+    if brand:
+        conditions.append("LOWER(brand_name) = LOWER(%s)")
+        params.append(brand)
+    if since:
+        conditions.append("tonno_load_ts >= %s")
+        params.append(since)
+    if until:
+        conditions.append("tonno_load_ts < %s")
+        params.append(until)
+    if cursor:
+        conditions.append("(tonno_load_ts, id, tonno_store_id) > (CAST(%s AS timestamp), %s, %s)")
+        params.extend(decode_cursor(cursor, 3))
+    limit_sql = limit_clause(limit, params)
+    return COFFEE_PRICES_QUERY.format(where=where_clause(conditions), limit=limit_sql), params
+
 
 @router.get("/coffees", response_model=list[CoffeeOut])
-def get_coffee_prices(db=Depends(get_db)):
-    cursor = db.cursor()
-    cursor.execute("""
-        with get_correct_price as ( 
-            select  
-                id, 
-                case  
-                    when batch_price is not null and batch_price < normal_price then batch_price 
-                    else normal_price 
-                end as current_price, 
-                case  
-                    when batch_price is not null and batch_price < normal_price then 1 
-                    else 0 
-                end as fl_deal_price
-                FROM products_and_prices 
-                WHERE tonno_end_ts IS NULL 
-        ) 
-        SELECT  
-            aa.name_finnish,
-            bb.current_price as normal_price,  
-            aa.net_weight, 
-            bb.current_price / aa.net_weight as price_per_weight, 
-            aa.tonno_data_source,
-            bb.fl_deal_price,
-            CAST(aa.tonno_load_ts as varchar) as  data_fetched_ts
-        FROM products_and_prices aa 
-            left join get_correct_price bb 
-                on aa.id = bb.id 
-        WHERE aa.tonno_end_ts IS NULL
-            AND NOT LOWER(aa.name_finnish) LIKE '%suodatinpussi%'
-            AND NOT LOWER(aa.name_finnish) LIKE '%kahvinsuodatin%'
+async def get_coffee_prices(
+    request: Request,
+    data_source: Optional[str] = None,
+    store_id: Optional[str] = None,
+    brand: Optional[str] = None,
+    since: Optional[datetime.datetime] = Query(default=None, description="Only prices fetched at or after this time"),
+    until: Optional[datetime.datetime] = Query(default=None, description="Only prices fetched before this time"),
+    cursor: Optional[str] = Query(default=None, description=f"Value of the {NEXT_CURSOR_HEADER} header of the previous page"),
+    limit: Optional[int] = Query(default=None, ge=1, le=500, description="Page size; all matching rows if omitted"),
+    layout: Layout = Query(default="rows", description="'columnar' returns one array per field instead of a list of objects"),
+):
+    """
+    Current coffee prices. With `limit` the list is paged by keyset: when more rows exist,
+    the response carries an X-Next-Cursor header to pass back as `cursor`.
     """
+    query, params = build_coffee_prices_query(data_source, store_id, brand, since, until, cursor, limit)
+
+    async def build():
+        async with connection() as db, db.cursor() as db_cursor:
+            await db_cursor.execute(query, params)
+            rows = await db_cursor.fetchall()
+        headers = {}
+        if limit is not None and len(rows) > limit:
+            rows = rows[:limit]
+            headers[NEXT_CURSOR_HEADER] = encode_cursor(rows[-1][6], rows[-1][8], rows[-1][7])
+        return render_rows(rows, CoffeeOut, layout), headers
+
+    key = cache_key(
+        request.url.path, data_source=data_source, store_id=store_id, brand=brand, since=since, until=until,
+        cursor=encode_cursor(*decode_cursor(cursor, 3)) if cursor else None, limit=limit, layout=layout,
     )
-    rows = cursor.fetchall()
-    cursor.close()
-    return [CoffeeOut(name_finnish=row[0], normal_price=row[1], net_weight=row[2], price_per_weight=row[3],data_source=row[4],fl_deal_price=row[5],data_fetched_ts=row[6]) for row in rows]
+    body, headers = await response_cache.get_or_build(key, build)
+    return Response(content=body, media_type="application/json", headers=headers)
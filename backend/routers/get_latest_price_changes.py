@@ -1,10 +1,29 @@
-from fastapi import APIRouter, Depends, Query
+import datetime
+from fastapi import APIRouter, Depends, Query, Response
 from pydantic import BaseModel
 from db import get_db
+from pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor, limit_clause, where_clause
+from serialization import Layout, render_rows
 from typing import Optional
 
 router = APIRouter()
 
+# Pages are ordered newest first by (change_ts, id, tonno_store_id), served by price_change_events_change_ts_idx
+LATEST_PRICE_CHANGES_QUERY = """
+    SELECT
+        name_finnish,
+        tonno_data_source,
+        price_before,
+        price_after,
+        CAST(change_ts AS varchar),
+        tonno_store_id,
+        id
+    FROM price_change_events
+    {where}
+    ORDER BY change_ts DESC, id DESC, tonno_store_id DESC
+    {limit}
+"""
+
 
 class PriceChangeRow(BaseModel):
     product_name: str
@@ -12,56 +31,64 @@ class PriceChangeRow(BaseModel):
     price_before: float
     price_after: float
     change_date: str
+    store_id: str
+
+
+def build_latest_price_changes_query(
+    limit: int,
+    data_source: Optional[str] = None,
+    since: Optional[datetime.datetime] = None,
+    until: Optional[datetime.datetime] = None,
+    cursor: Optional[str] = None,
+    store_id: Optional[str] = None,
+) -> tuple[str, list]:
+    """Renders LATEST_PRICE_CHANGES_QUERY with the requested filters and keyset position pushed into SQL"""
+    conditions: list[str] = []
+    params: list = []
+    if data_source:
+        conditions.append("tonno_data_source = %s")
+        params.append(data_source)
+    if store_id:
+        conditions.append("tonno_store_id = %s")
+        params.append(store_id)
+    if since:
+        conditions.append("change_ts >= %s")
+        params.append(since)
+    if until:
+        conditions.append("change_ts < %s")
+        params.append(until)
+    if cursor:
+        conditions.append("(change_ts, id, tonno_store_id) < (CAST(%s AS timestamp), %s, %s)")
+        params.extend(decode_cursor(cursor, 3))
+    limit_sql = limit_clause(limit, params)
+    return LATEST_PRICE_CHANGES_QUERY.format(where=where_clause(conditions), limit=limit_sql), params
 
 
 @router.get("/coffees/latest-price-changes", response_model=list[PriceChangeRow])
-def get_latest_price_changes(
+async def get_latest_price_changes(
     limit: int = Query(default=50, ge=1, le=200),
+    data_source: Optional[str] = None,
+    store_id: Optional[str] = None,
+    since: Optional[datetime.datetime] = Query(default=None, description="Only changes at or after this time"),
+    until: Optional[datetime.datetime] = Query(default=None, description="Only changes before this time"),
+    cursor: Optional[str] = Query(default=None, description=f"Value of the {NEXT_CURSOR_HEADER} header of the previous page"),
+    layout: Layout = Query(default="rows", description="'columnar' returns one array per field instead of a list of objects"),
     db=Depends(get_db),
 ):
     """
     Return the most recent products whose normal_price actually changed.
-    Compares each row to its predecessor (by tonno_load_ts per product)
-    and returns only rows where normal_price differs.
+    Reads the price_change_events log the fetcher writes whenever a product's
+    normal_price differs from its previous version. Older changes can be paged
+    through with the X-Next-Cursor response header.
     """
-    cursor = db.cursor()
-    cursor.execute(
-        """
-        WITH price_with_prev AS (
-            SELECT
-                id,
-                name_finnish,
-                tonno_data_source,
-                normal_price,
-                LAG(normal_price) OVER (PARTITION BY id ORDER BY tonno_load_ts) AS prev_price,
-                tonno_load_ts
-            FROM products_and_prices
-            WHERE normal_price IS NOT NULL
-        )
-        SELECT
-            name_finnish,
-            tonno_data_source,
-            prev_price,
-            normal_price,
-            CAST(tonno_load_ts AS varchar)
-        FROM price_with_prev
-        WHERE prev_price IS NOT NULL
-          AND normal_price IS DISTINCT FROM prev_price
-        ORDER BY tonno_load_ts DESC
-        LIMIT %s
-        """,
-        (limit,),
-    )
-    rows = cursor.fetchall()
-    cursor.close()
+    query, params = build_latest_price_changes_query(limit, data_source, since, until, cursor, store_id)
+    async with db.cursor() as db_cursor:
+        await db_cursor.execute(query, params)
+        rows = await db_cursor.fetchall()
+
+    headers = {}
+    if len(rows) > limit:
+        rows = rows[:limit]
+        headers[NEXT_CURSOR_HEADER] = encode_cursor(rows[-1][4], rows[-1][6], rows[-1][5])
 
-    return [
-        PriceChangeRow(
-            product_name=row[0],
-            data_source=row[1],
-            price_before=row[2],
-            price_after=row[3],
-            change_date=row[4],
-        )
-        for row in rows
-    ]
+    return Response(content=render_rows(rows, PriceChangeRow, layout), media_type="application/json", headers=headers)
@@ -1,10 +1,69 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from pydantic import BaseModel
-from db import get_db
+from db import get_db, connection
+from cache import cache_key, response_cache
+from pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor, limit_clause, where_clause
+from serialization import Layout, render_groups, render_rows
 from typing import Optional
 
 router = APIRouter()
 
+# Intervals of every store the product is sold in, ordered along the price_intervals
+# primary key (id, tonno_store_id, valid_from)
+PRICE_HISTORY_QUERY = """
+    SELECT
+        name_finnish,
+        normal_price,
+        batch_price,
+        batch_discount_pct,
+        batch_discount_type,
+        net_weight,
+        content_unit,
+        price_per_weight,
+        tonno_data_source,
+        CAST(valid_from AS varchar),
+        CAST(valid_to AS varchar),
+        tonno_store_id
+    FROM price_intervals
+    {where}
+    ORDER BY tonno_store_id ASC, valid_from ASC
+"""
+
+# Same columns as PRICE_HISTORY_QUERY plus the product id, for many products in one pass over
+# the price_intervals primary key
+BATCH_PRICE_HISTORY_QUERY = """
+    SELECT
+        name_finnish,
+        normal_price,
+        batch_price,
+        batch_discount_pct,
+        batch_discount_type,
+        net_weight,
+        content_unit,
+        price_per_weight,
+        tonno_data_source,
+        CAST(valid_from AS varchar),
+        CAST(valid_to AS varchar),
+        tonno_store_id,
+        id
+    FROM price_intervals
+    {where}
+    ORDER BY id ASC, tonno_store_id ASC, valid_from ASC
+"""
+
+# Upper bound of product ids one batch history request may ask for
+MAX_HISTORY_IDS = 50
+
+# One row per product even when it is sold in several stores.
+# Pages are ordered by (name_finnish, id), served by current_prices_name_idx
+PRODUCT_LIST_QUERY = """
+    SELECT DISTINCT ON (name_finnish, id) id, name_finnish, tonno_data_source
+    FROM current_prices
+    {where}
+    ORDER BY name_finnish ASC, id ASC
+    {limit}
+"""
+
 
 class PriceHistoryRow(BaseModel):
     name_finnish: str
@@ -18,6 +77,11 @@ class PriceHistoryRow(BaseModel):
     data_source: str
     valid_from: str
     valid_to: Optional[str]
+    store_id: str
+
+
+class HistoryBatchRequest(BaseModel):
+    ids: list[str]
 
 
 class ProductSummary(BaseModel):
@@ -26,108 +90,153 @@ class ProductSummary(BaseModel):
     data_source: str
 
 
+def build_price_history_query(product_id: str, store_id: Optional[str] = None) -> tuple[str, list]:
+    """Renders PRICE_HISTORY_QUERY for one product, optionally limited to one store"""
+    conditions: list[str] = ["id = %s"]
+    params: list = [product_id]
+    if store_id:
+        conditions.append("tonno_store_id = %s")
+        params.append(store_id)
+    return PRICE_HISTORY_QUERY.format(where=where_clause(conditions)), params
+
+
+def build_batch_price_history_query(product_ids: list[str], store_id: Optional[str] = None) -> tuple[str, list]:
+    """Renders BATCH_PRICE_HISTORY_QUERY for several products, optionally limited to one store"""
+    conditions: list[str] = ["id = ANY(%s)"]
+    params: list = [product_ids]
+    if store_id:
+        conditions.append("tonno_store_id = %s")
+        params.append(store_id)
+    return BATCH_PRICE_HISTORY_QUERY.format(where=where_clause(conditions)), params
+
+
+def _requested_ids(ids: list[str]) -> list[str]:
+    """Strips and de-duplicates the requested ids (keeping their order) and enforces MAX_HISTORY_IDS"""
+    unique_ids = list(dict.fromkeys(product_id.strip() for product_id in ids if product_id.strip()))
+    if not unique_ids:
+        raise HTTPException(status_code=400, detail="No product ids given")
+    if len(unique_ids) > MAX_HISTORY_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_HISTORY_IDS} product ids per request")
+    return unique_ids
+
+
+async def _price_histories(db, ids: list[str], store_id: Optional[str], layout: Layout) -> Response:
+    query, params = build_batch_price_history_query(ids, store_id)
+    async with db.cursor() as cursor:
+        await cursor.execute(query, params)
+        rows = await cursor.fetchall()
+
+    # ids without any history are returned with an empty list
+    histories: dict[str, list[tuple]] = {product_id: [] for product_id in ids}
+    for row in rows:
+        histories[row[12]].append(row)
+    return Response(content=render_groups(histories, PriceHistoryRow, layout), media_type="application/json")
+
+
+@router.get("/coffees/history", response_model=dict[str, list[PriceHistoryRow]])
+async def get_price_histories(
+    ids: str = Query(description=f"Comma separated product ids, at most {MAX_HISTORY_IDS}"),
+    store_id: Optional[str] = None,
+    layout: Layout = Query(default="rows", description="'columnar' returns one array per field instead of a list of objects"),
+    db=Depends(get_db),
+):
+    """
+    Price histories of several products in one request, keyed by product id.
+    Each value has the same rows as /coffees/{product_id}/history.
+    """
+    return await _price_histories(db, _requested_ids(ids.split(",")), store_id, layout)
+
+
+@router.post("/coffees/history", response_model=dict[str, list[PriceHistoryRow]])
+async def post_price_histories(
+    body: HistoryBatchRequest,
+    store_id: Optional[str] = None,
+    layout: Layout = Query(default="rows", description="'columnar' returns one array per field instead of a list of objects"),
+    db=Depends(get_db),
+):
+    """Same as GET /coffees/history, with the ids in a JSON body: {"ids": ["a", "b"]}"""
+    return await _price_histories(db, _requested_ids(body.ids), store_id, layout)
+
+
 @router.get("/coffees/{product_id}/history", response_model=list[PriceHistoryRow])
-def get_price_history(product_id: str, db=Depends(get_db)):
-    """Get full price history for a single product."""
-    cursor = db.cursor()
-    cursor.execute(
-        """
-        WITH numbered AS (
-            -- Assign a group: increment when price changes from previous row
-            SELECT *,
-                SUM(price_changed) OVER (ORDER BY tonno_load_ts) AS price_group
-            FROM (
-                SELECT
-                    name_finnish,
-                    normal_price,
-                    batch_price,
-                    batch_discount_pct,
-                    batch_discount_type,
-                    net_weight,
-                    content_unit,
-                    tonno_data_source,
-                    tonno_load_ts,
-                    tonno_end_ts,
-                    CASE
-                        WHEN normal_price IS DISTINCT FROM
-                             LAG(normal_price) OVER (ORDER BY tonno_load_ts)
-                          OR batch_price IS DISTINCT FROM
-                             LAG(batch_price) OVER (ORDER BY tonno_load_ts)
-                        THEN 1 ELSE 0
-                    END AS price_changed
-                FROM products_and_prices
-                WHERE id = %s
-            ) sub
-        )
-        SELECT
-            -- Take the first name_finnish in each group (name can change too)
-            (ARRAY_AGG(name_finnish ORDER BY tonno_load_ts))[1] AS name_finnish,
-            normal_price,
-            batch_price,
-            (ARRAY_AGG(batch_discount_pct ORDER BY tonno_load_ts))[1],
-            (ARRAY_AGG(batch_discount_type ORDER BY tonno_load_ts))[1],
-            (ARRAY_AGG(net_weight ORDER BY tonno_load_ts))[1] AS net_weight,
-            (ARRAY_AGG(content_unit ORDER BY tonno_load_ts))[1],
-            CASE
-                WHEN (ARRAY_AGG(net_weight ORDER BY tonno_load_ts))[1] IS NOT NULL
-                     AND (ARRAY_AGG(net_weight ORDER BY tonno_load_ts))[1] > 0
-                    THEN COALESCE(
-                        CASE WHEN batch_price IS NOT NULL AND batch_price < normal_price
-                             THEN batch_price ELSE normal_price END,
-                        normal_price
-                    ) / (ARRAY_AGG(net_weight ORDER BY tonno_load_ts))[1]
-                ELSE NULL
-            END AS price_per_weight,
-            (ARRAY_AGG(tonno_data_source ORDER BY tonno_load_ts))[1],
-            CAST(MIN(tonno_load_ts) AS varchar) AS valid_from,
-            CAST(MAX(tonno_end_ts) AS varchar) AS valid_to
-        FROM numbered
-        GROUP BY price_group, normal_price, batch_price
-        ORDER BY MIN(tonno_load_ts) ASC
-        """,
-        (product_id,),
-    )
-    rows = cursor.fetchall()
-    cursor.close()
+async def get_price_history(
+    product_id: str,
+    store_id: Optional[str] = None,
+    layout: Layout = Query(default="rows", description="'columnar' returns one array per field instead of a list of objects"),
+    db=Depends(get_db),
+):
+    """
+    Get full price history for a single product: one row per consecutive price state,
+    read from the price_intervals table the fetcher keeps up to date.
+    Products sold in several stores have one such series per store (see store_id).
+    valid_to is null for the product's current price.
+    """
+    query, params = build_price_history_query(product_id, store_id)
+    async with db.cursor() as cursor:
+        await cursor.execute(query, params)
+        rows = await cursor.fetchall()
 
     if not rows:
         raise HTTPException(status_code=404, detail="Product not found")
 
-    return [
-        PriceHistoryRow(
-            name_finnish=row[0],
-            normal_price=row[1],
-            batch_price=row[2],
-            batch_discount_pct=row[3],
-            batch_discount_type=row[4],
-            net_weight=row[5],
-            content_unit=row[6],
-            price_per_weight=row[7],
-            data_source=row[8],
-            valid_from=row[9],
-            valid_to=row[10],
-        )
-        for row in rows
-    ]
+    return Response(content=render_rows(rows, PriceHistoryRow, layout), media_type="application/json")
+
+
+def build_product_list_query(
+    data_source: Optional[str] = None,
+    store_id: Optional[str] = None,
+    brand: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+) -> tuple[str, list]:
+    """Renders PRODUCT_LIST_QUERY with the requested filters and keyset position pushed into SQL"""
+    conditions: list[str] = []
+    params: list = []
+    if data_source:
+        conditions.append("tonno_data_source = %s")
+        params.append(data_source)
+    if store_id:
+        conditions.append("tonno_store_id = %s")
+        params.append(store_id)
+    if brand:
+        conditions.append("LOWER(brand_name) = LOWER(%s)")
+        params.append(brand)
+    if cursor:
+        conditions.append("(name_finnish, id) > (%s, %s)")
+        params.extend(decode_cursor(cursor, 2))
+    limit_sql = limit_clause(limit, params)
+    return PRODUCT_LIST_QUERY.format(where=where_clause(conditions), limit=limit_sql), params
 
 
 @router.get("/coffees/products", response_model=list[ProductSummary])
-def list_products(db=Depends(get_db)):
-    """List all products (current active ones) for selection dropdown."""
-    cursor = db.cursor()
-    cursor.execute(
-        """
-        SELECT DISTINCT id, name_finnish, tonno_data_source
-        FROM products_and_prices
-        WHERE tonno_end_ts IS NULL
-            AND NOT LOWER(name_finnish) LIKE '%%suodatinpussi%%'
-            AND NOT LOWER(name_finnish) LIKE '%%kahvinsuodatin%%'
-        ORDER BY name_finnish ASC
-        """
+async def list_products(
+    request: Request,
+    data_source: Optional[str] = None,
+    store_id: Optional[str] = None,
+    brand: Optional[str] = None,
+    cursor: Optional[str] = Query(default=None, description=f"Value of the {NEXT_CURSOR_HEADER} header of the previous page"),
+    limit: Optional[int] = Query(default=None, ge=1, le=500, description="Page size; all matching products if omitted"),
+    layout: Layout = Query(default="rows", description="'columnar' returns one array per field instead of a list of objects"),
+):
+    """
+    List all products (current active ones) for selection dropdown, ordered by name.
+    With `limit` the list is paged by keyset, see the X-Next-Cursor response header.
+    """
+    query, params = build_product_list_query(data_source, store_id, brand, cursor, limit)
+
+    async def build():
+        async with connection() as db, db.cursor() as db_cursor:
+            await db_cursor.execute(query, params)
+            rows = await db_cursor.fetchall()
+        headers = {}
+        if limit is not None and len(rows) > limit:
+            rows = rows[:limit]
+            headers[NEXT_CURSOR_HEADER] = encode_cursor(rows[-1][1], rows[-1][0])
+        return render_rows(rows, ProductSummary, layout), headers
+
+    key = cache_key(
+        request.url.path, data_source=data_source, store_id=store_id, brand=brand,
+        cursor=encode_cursor(*decode_cursor(cursor, 2)) if cursor else None, limit=limit, layout=layout,
     )
-    rows = cursor.fetchall()
-    cursor.close()
-    return [
-        ProductSummary(id=row[0], name_finnish=row[1], data_source=row[2])
-        for row in rows
-    ]
+    body, headers = await response_cache.get_or_build(key, build)
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -0,0 +1,17 @@
+from fastapi import APIRouter
+from db import get_pool_stats
+from cache import response_cache
+
+router = APIRouter()
+
+
+@router.get("/stats/db-pool")
+async def get_db_pool_stats():
+    """Current database connection pool usage (in use, waiting, checkout wait times)."""
+    return get_pool_stats()
+
+
+@router.get("/stats/cache")
+async def get_cache_stats():
+    """Hit/miss/eviction counters of the in-process response cache."""
+    return response_cache.stats()
@@ -0,0 +1,42 @@
+import os
+from typing import Literal, Mapping, Sequence
+
+import orjson
+from pydantic import BaseModel, TypeAdapter
+
+# Opt-in: encode cursor rows straight to JSON instead of building + validating a Pydantic model per row
+FAST_SERIALIZATION = os.environ.get("FAST_SERIALIZATION", "0") == "1"
+
+# rows: list of objects (the documented response_model shape)
+# columnar: one array per field, {"field": [v1, v2, ...], ...}, smaller and faster to build
+Layout = Literal["rows", "columnar"]
+
+_list_adapters: dict[type[BaseModel], TypeAdapter] = {}
+
+
+def render_rows(rows: Sequence[tuple], model: type[BaseModel], layout: Layout = "rows") -> bytes:
+    """
+    Serializes db rows whose leading columns are the fields of model, in declaration order
+    (trailing columns, e.g. keyset cursor values, are ignored).
+    """
+    fields = tuple(model.model_fields)
+    width = len(fields)
+
+    if layout == "columnar":
+        columns = list(zip(*rows)) if rows else [()] * width
+        return orjson.dumps({field: list(columns[i]) for i, field in enumerate(fields)})
+
+    if FAST_SERIALIZATION:
+        return orjson.dumps([dict(zip(fields, row[:width])) for row in rows])
+
+    adapter = _list_adapters.get(model)
+    if adapter is None:
+        adapter = _list_adapters[model] = TypeAdapter(list[model])
+    return adapter.dump_json([model(**dict(zip(fields, row))) for row in rows])
+
+
+def render_groups(groups: Mapping[str, Sequence[tuple]], model: type[BaseModel], layout: Layout = "rows") -> bytes:
+    """Serializes {key: rows} as a JSON object, each value rendered like render_rows"""
+    return b"{" + b",".join(
+        orjson.dumps(key) + b":" + render_rows(rows, model, layout) for key, rows in groups.items()
+    ) + b"}"
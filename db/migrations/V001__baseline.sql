@@ -0,0 +1,45 @@
+-- Baseline schema, equal to what db/init_tables.sql created before migrations existed.
+-- IF NOT EXISTS so it is a no-op on databases initialized from that file.
+CREATE EXTENSION IF NOT EXISTS pgcrypto;
+
+CREATE TABLE IF NOT EXISTS products_and_prices (
+    id TEXT,
+    name_finnish TEXT,
+    name_english TEXT,
+    available_store BOOLEAN,
+    available_web BOOLEAN,
+    net_weight NUMERIC,
+    content_unit TEXT,
+    image_url TEXT,
+    brand_name TEXT,
+    normal_price_unit TEXT,
+    normal_price NUMERIC,
+    batch_price NUMERIC,
+    batch_discount_pct NUMERIC,
+    batch_discount_type TEXT,
+    batch_days_left INTEGER,
+    tonno_data_source TEXT,
+    tonno_load_ts TIMESTAMP,
+    tonno_end_ts TIMESTAMP,
+    tonno_row_hash TEXT,
+
+    PRIMARY KEY (id, tonno_load_ts)
+);
+
+-- Narrow copy of the currently valid price per product, rebuilt by the fetcher after every load
+-- (see BaseProductFetcher._refresh_current_prices). Coffee filters/filter bags are left out here,
+-- so the API can read it as-is.
+CREATE TABLE IF NOT EXISTS current_prices (
+    id TEXT,
+    tonno_data_source TEXT,
+    name_finnish TEXT,
+    net_weight NUMERIC,
+    current_price NUMERIC,
+    fl_deal_price INTEGER,
+    price_per_weight NUMERIC,
+    tonno_load_ts TIMESTAMP,
+
+    PRIMARY KEY (tonno_data_source, id)
+);
+
+CREATE INDEX IF NOT EXISTS current_prices_name_idx ON current_prices (name_finnish, id);
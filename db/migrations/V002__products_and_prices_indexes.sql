@@ -0,0 +1,16 @@
+-- Open (current) SCD versions per data source. Serves the hash comparison joins and the
+-- active-row count in _update_prices, and the current_prices refresh. tonno_row_hash is
+-- INCLUDEd so the diff can be answered from the index alone.
+CREATE INDEX IF NOT EXISTS products_and_prices_open_idx
+    ON products_and_prices (tonno_data_source, id)
+    INCLUDE (tonno_row_hash)
+    WHERE tonno_end_ts IS NULL;
+
+-- Per-source lookups over the whole history (target_tbl_has_existing_data, newest load per source).
+CREATE INDEX IF NOT EXISTS products_and_prices_source_load_ts_idx
+    ON products_and_prices (tonno_data_source, tonno_load_ts);
+
+-- The (id, tonno_load_ts) ordering needed by the per-product window functions
+-- (PARTITION BY id ORDER BY tonno_load_ts) is already provided by the primary key.
+
+ANALYZE products_and_prices;
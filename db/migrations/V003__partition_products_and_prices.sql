@@ -0,0 +1,77 @@
+-- Converts products_and_prices into a table range partitioned by month on tonno_load_ts.
+-- New partitions are created on demand through ensure_products_and_prices_partition(), which
+-- the fetcher calls before every insert; old ones are detached/archived by
+-- fetcher/partition_maintenance.py.
+
+CREATE OR REPLACE FUNCTION ensure_products_and_prices_partition(ts TIMESTAMP) RETURNS TEXT AS $$
+DECLARE
+    month_start DATE := date_trunc('month', ts)::date;
+    partition_name TEXT := 'products_and_prices_' || to_char(month_start, 'YYYY_MM');
+BEGIN
+    IF to_regclass(partition_name) IS NULL THEN
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF products_and_prices FOR VALUES FROM (%L) TO (%L)',
+            partition_name, month_start, (month_start + INTERVAL '1 month')::date
+        );
+    END IF;
+    RETURN partition_name;
+END;
+$$ LANGUAGE plpgsql;
+
+ALTER TABLE products_and_prices RENAME TO products_and_prices_unpartitioned;
+ALTER TABLE products_and_prices_unpartitioned RENAME CONSTRAINT products_and_prices_pkey TO products_and_prices_unpartitioned_pkey;
+DROP INDEX IF EXISTS products_and_prices_open_idx;
+DROP INDEX IF EXISTS products_and_prices_source_load_ts_idx;
+
+CREATE TABLE products_and_prices (
+    id TEXT,
+    name_finnish TEXT,
+    name_english TEXT,
+    available_store BOOLEAN,
+    available_web BOOLEAN,
+    net_weight NUMERIC,
+    content_unit TEXT,
+    image_url TEXT,
+    brand_name TEXT,
+    normal_price_unit TEXT,
+    normal_price NUMERIC,
+    batch_price NUMERIC,
+    batch_discount_pct NUMERIC,
+    batch_discount_type TEXT,
+    batch_days_left INTEGER,
+    tonno_data_source TEXT,
+    tonno_load_ts TIMESTAMP,
+    tonno_end_ts TIMESTAMP,
+    tonno_row_hash TEXT,
+
+    PRIMARY KEY (id, tonno_load_ts)
+) PARTITION BY RANGE (tonno_load_ts);
+
+-- Same indexes as V002, created on the parent so every partition gets them
+CREATE INDEX products_and_prices_open_idx
+    ON products_and_prices (tonno_data_source, id)
+    INCLUDE (tonno_row_hash)
+    WHERE tonno_end_ts IS NULL;
+
+CREATE INDEX products_and_prices_source_load_ts_idx
+    ON products_and_prices (tonno_data_source, tonno_load_ts);
+
+DO $$
+DECLARE
+    month_start TIMESTAMP;
+BEGIN
+    FOR month_start IN
+        SELECT DISTINCT date_trunc('month', tonno_load_ts) FROM products_and_prices_unpartitioned
+        UNION
+        SELECT date_trunc('month', now()::timestamp)
+    LOOP
+        PERFORM ensure_products_and_prices_partition(month_start);
+    END LOOP;
+END;
+$$;
+
+INSERT INTO products_and_prices SELECT * FROM products_and_prices_unpartitioned;
+
+DROP TABLE products_and_prices_unpartitioned;
+
+ANALYZE products_and_prices;
@@ -0,0 +1,31 @@
+-- One row per actual normal_price change of a product, written by the fetcher's update step
+-- (BaseProductFetcher._record_price_changes) so /coffees/latest-price-changes is a top-N index read.
+CREATE TABLE price_change_events (
+    id TEXT NOT NULL,
+    tonno_data_source TEXT NOT NULL,
+    name_finnish TEXT,
+    price_before NUMERIC NOT NULL,
+    price_after NUMERIC NOT NULL,
+    change_ts TIMESTAMP NOT NULL,
+
+    PRIMARY KEY (id, change_ts)
+);
+
+CREATE INDEX price_change_events_change_ts_idx ON price_change_events (change_ts DESC, id DESC);
+
+-- One-off backfill from the existing history: same rule the endpoint used to compute on every request
+INSERT INTO price_change_events (id, tonno_data_source, name_finnish, price_before, price_after, change_ts)
+SELECT id, tonno_data_source, name_finnish, prev_price, normal_price, tonno_load_ts
+FROM (
+    SELECT
+        id,
+        name_finnish,
+        tonno_data_source,
+        normal_price,
+        LAG(normal_price) OVER (PARTITION BY id ORDER BY tonno_load_ts) AS prev_price,
+        tonno_load_ts
+    FROM products_and_prices
+    WHERE normal_price IS NOT NULL
+) price_with_prev
+WHERE prev_price IS NOT NULL
+  AND normal_price IS DISTINCT FROM prev_price;
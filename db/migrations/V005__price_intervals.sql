@@ -0,0 +1,68 @@
+-- Run-length compacted price history: one row per (product, consecutive price state), where the
+-- price state is (normal_price, batch_price). The fetcher closes/opens intervals as prices change
+-- (BaseProductFetcher._close_price_intervals / _open_price_intervals); an interval with
+-- valid_to IS NULL is the product's current price state.
+CREATE TABLE price_intervals (
+    id TEXT NOT NULL,
+    tonno_data_source TEXT NOT NULL,
+    valid_from TIMESTAMP NOT NULL,
+    valid_to TIMESTAMP,
+    name_finnish TEXT,
+    normal_price NUMERIC,
+    batch_price NUMERIC,
+    batch_discount_pct NUMERIC,
+    batch_discount_type TEXT,
+    net_weight NUMERIC,
+    content_unit TEXT,
+    price_per_weight NUMERIC,
+
+    PRIMARY KEY (id, valid_from)
+);
+
+CREATE INDEX price_intervals_open_idx ON price_intervals (tonno_data_source, id) WHERE valid_to IS NULL;
+
+-- One-off backfill: the grouping /coffees/{product_id}/history used to run per request, for every product
+WITH flagged AS (
+    SELECT
+        *,
+        CASE
+            WHEN normal_price IS DISTINCT FROM LAG(normal_price) OVER w
+              OR batch_price IS DISTINCT FROM LAG(batch_price) OVER w
+            THEN 1 ELSE 0
+        END AS price_changed
+    FROM products_and_prices
+    WINDOW w AS (PARTITION BY id ORDER BY tonno_load_ts)
+), numbered AS (
+    SELECT *, SUM(price_changed) OVER (PARTITION BY id ORDER BY tonno_load_ts) AS price_group
+    FROM flagged
+), grouped AS (
+    SELECT
+        id,
+        (ARRAY_AGG(tonno_data_source ORDER BY tonno_load_ts))[1] AS tonno_data_source,
+        MIN(tonno_load_ts) AS valid_from,
+        CASE WHEN BOOL_OR(tonno_end_ts IS NULL) THEN NULL ELSE MAX(tonno_end_ts) END AS valid_to,
+        (ARRAY_AGG(name_finnish ORDER BY tonno_load_ts))[1] AS name_finnish,
+        normal_price,
+        batch_price,
+        (ARRAY_AGG(batch_discount_pct ORDER BY tonno_load_ts))[1] AS batch_discount_pct,
+        (ARRAY_AGG(batch_discount_type ORDER BY tonno_load_ts))[1] AS batch_discount_type,
+        (ARRAY_AGG(net_weight ORDER BY tonno_load_ts))[1] AS net_weight,
+        (ARRAY_AGG(content_unit ORDER BY tonno_load_ts))[1] AS content_unit
+    FROM numbered
+    GROUP BY id, price_group, normal_price, batch_price
+)
+INSERT INTO price_intervals (
+    id, tonno_data_source, valid_from, valid_to, name_finnish, normal_price, batch_price,
+    batch_discount_pct, batch_discount_type, net_weight, content_unit, price_per_weight
+)
+SELECT
+    id, tonno_data_source, valid_from, valid_to, name_finnish, normal_price, batch_price,
+    batch_discount_pct, batch_discount_type, net_weight, content_unit,
+    CASE
+        WHEN net_weight > 0 THEN COALESCE(
+            CASE WHEN batch_price IS NOT NULL AND batch_price < normal_price
+                 THEN batch_price ELSE normal_price END,
+            normal_price
+        ) / net_weight
+    END
+FROM grouped;
@@ -0,0 +1,11 @@
+-- Brand filter and (tonno_load_ts, id) keyset paging for /coffees and /coffees/products
+ALTER TABLE current_prices ADD COLUMN brand_name TEXT;
+
+UPDATE current_prices c
+SET brand_name = p.brand_name
+FROM products_and_prices p
+WHERE p.id = c.id
+    AND p.tonno_data_source = c.tonno_data_source
+    AND p.tonno_end_ts IS NULL;
+
+CREATE INDEX current_prices_load_ts_idx ON current_prices (tonno_load_ts, id);
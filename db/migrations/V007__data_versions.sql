@@ -0,0 +1,11 @@
+-- Dataset version per data source: bumped by the fetcher in every load transaction that changes data
+-- (BaseProductFetcher._notify_data_changed). The API derives ETag/Last-Modified from it.
+CREATE TABLE data_versions (
+    tonno_data_source TEXT PRIMARY KEY,
+    version_ts TIMESTAMP NOT NULL
+);
+
+INSERT INTO data_versions (tonno_data_source, version_ts)
+SELECT tonno_data_source, GREATEST(MAX(tonno_load_ts), MAX(tonno_end_ts))
+FROM products_and_prices
+GROUP BY tonno_data_source;
@@ -0,0 +1,82 @@
+"""
+Prices are fetched per store: every SCD row, interval, change event and current price is tagged with
+the store it was read from, and the store becomes part of each table's key.
+
+Existing rows were all fetched from the single store used before: K-ruoka N106 (the store id was
+hard-coded in the fetcher) and the S-ryhma store of S_KAUPAT_STORE_ID. The S-ryhma id is read from the
+same environment as the fetcher, so the backfilled history continues under the store the next update
+fetches instead of being closed and re-inserted under another id.
+"""
+import os
+
+K_RUOKA_STORE_ID = 'N106'
+
+TABLES = ('products_and_prices', 'price_intervals', 'price_change_events', 'current_prices')
+
+
+def _s_ryhma_store_id(cur) -> str | None:
+    """The store the existing S-ryhma rows were fetched from; None if there are none to backfill"""
+    cur.execute("SELECT EXISTS (SELECT 1 FROM products_and_prices WHERE tonno_data_source <> 'K-ruoka')")
+    if not cur.fetchone()[0]:
+        return None
+    store_id = (os.environ.get('S_KAUPAT_STORE_ID') or '').strip()
+    if store_id:
+        return store_id
+    store_ids = [s.strip() for s in (os.environ.get('S_KAUPAT_STORE_IDS') or '').split(',') if s.strip()]
+    if len(store_ids) != 1:
+        raise RuntimeError(
+            "Cannot tell which S-kaupat store the existing S-ryhma rows were fetched from: set S_KAUPAT_STORE_ID "
+            "to the store used before multi-store fetching before applying this migration."
+        )
+    return store_ids[0]
+
+
+def migrate(conn):
+    with conn.cursor() as cur:
+        s_ryhma_store_id = _s_ryhma_store_id(cur)
+        for table in TABLES:
+            cur.execute(f"ALTER TABLE {table} ADD COLUMN tonno_store_id TEXT")
+            cur.execute(
+                f"""
+                UPDATE {table}
+                SET tonno_store_id = CASE tonno_data_source WHEN 'K-ruoka' THEN %s ELSE %s END
+                """,
+                (K_RUOKA_STORE_ID, s_ryhma_store_id),
+            )
+            cur.execute(f"ALTER TABLE {table} ALTER COLUMN tonno_store_id SET NOT NULL")
+
+        cur.execute("""
+            ALTER TABLE products_and_prices DROP CONSTRAINT products_and_prices_pkey;
+            ALTER TABLE products_and_prices ADD PRIMARY KEY (id, tonno_store_id, tonno_load_ts);
+
+            DROP INDEX products_and_prices_open_idx;
+            CREATE INDEX products_and_prices_open_idx
+                ON products_and_prices (tonno_data_source, tonno_store_id, id)
+                INCLUDE (tonno_row_hash)
+                WHERE tonno_end_ts IS NULL;
+
+            ANALYZE products_and_prices;
+
+
+            ALTER TABLE price_intervals DROP CONSTRAINT price_intervals_pkey;
+            ALTER TABLE price_intervals ADD PRIMARY KEY (id, tonno_store_id, valid_from);
+
+            DROP INDEX price_intervals_open_idx;
+            CREATE INDEX price_intervals_open_idx ON price_intervals (tonno_data_source, tonno_store_id, id) WHERE valid_to IS NULL;
+
+
+            ALTER TABLE price_change_events DROP CONSTRAINT price_change_events_pkey;
+            ALTER TABLE price_change_events ADD PRIMARY KEY (id, tonno_store_id, change_ts);
+
+            DROP INDEX price_change_events_change_ts_idx;
+            CREATE INDEX price_change_events_change_ts_idx ON price_change_events (change_ts DESC, id DESC, tonno_store_id DESC);
+
+
+            ALTER TABLE current_prices DROP CONSTRAINT current_prices_pkey;
+            ALTER TABLE current_prices ADD PRIMARY KEY (tonno_data_source, tonno_store_id, id);
+
+            DROP INDEX current_prices_name_idx;
+            CREATE INDEX current_prices_name_idx ON current_prices (name_finnish, id, tonno_store_id);
+            DROP INDEX current_prices_load_ts_idx;
+            CREATE INDEX current_prices_load_ts_idx ON current_prices (tonno_load_ts, id, tonno_store_id);
+        """)
@@ -0,0 +1,18 @@
+-- One row per fetcher run, written by the fetcher's scheduler (fetcher/scheduler.py). The last run decides
+-- when a source is due again (missed runs are caught up on start), recent change counts drive adaptive polling.
+CREATE TABLE fetch_runs (
+    tonno_data_source TEXT NOT NULL,
+    started_ts TIMESTAMP NOT NULL,
+    finished_ts TIMESTAMP NOT NULL,
+    status TEXT NOT NULL,
+    operation TEXT,
+    change_count INTEGER,
+    message TEXT,
+
+    PRIMARY KEY (tonno_data_source, started_ts)
+);
+
+-- Last known load per source, so an upgraded deployment keeps its cadence instead of fetching right away
+INSERT INTO fetch_runs (tonno_data_source, started_ts, finished_ts, status)
+SELECT tonno_data_source, version_ts, version_ts, 'ok'
+FROM data_versions;
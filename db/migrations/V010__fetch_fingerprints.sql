@@ -0,0 +1,9 @@
+-- Fingerprint of each data source's last merged result set (all fetched stores, every product's row hash).
+-- A run whose result set has the same fingerprint skips the db merge entirely
+-- (BaseProductFetcher._result_fingerprint / _stored_fingerprint).
+CREATE TABLE fetch_fingerprints (
+    tonno_data_source TEXT PRIMARY KEY,
+    result_fingerprint TEXT NOT NULL,
+    product_count INTEGER NOT NULL,
+    updated_ts TIMESTAMP NOT NULL
+);
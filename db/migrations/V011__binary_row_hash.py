@@ -0,0 +1,100 @@
+"""
+tonno_row_hash becomes a 16 byte BLAKE2b fingerprint (bytea) instead of a 64 character SHA-256 hex string.
+The new value cannot be computed in SQL, so every existing row is re-hashed here, in batches: unchanged
+products keep matching their open row and get no spurious new version on the next update.
+
+The column list and the encoding are frozen copies of what the fetcher hashed when this migration was
+written (PRODUCT_COLUMNS + tonno_store_id through fetcher/fingerprint.py), so a later change to the
+records or the fingerprint never changes what this migration does. Such a change needs a migration of its own.
+
+ALTER COLUMN TYPE also rebuilds products_and_prices_open_idx, the covering index the SCD diff reads
+(tonno_data_source, tonno_store_id, id) INCLUDE (tonno_row_hash), with the narrower values.
+"""
+import decimal
+import hashlib
+
+from psycopg2.extras import execute_values
+
+BATCH_SIZE = 10_000
+
+HASHED_COLUMNS = (
+    'id', 'name_finnish', 'name_english', 'available_store', 'available_web',
+    'net_weight', 'content_unit', 'image_url', 'brand_name',
+    'normal_price_unit', 'normal_price', 'batch_price',
+    'batch_discount_pct', 'batch_discount_type', 'batch_days_left',
+    'tonno_store_id',
+)
+
+_NULL, _TRUE, _FALSE, _NUMBER, _TEXT = b'\x00', b'\x01', b'\x02', b'\x03', b'\x04'
+
+
+def _canonical_number(value) -> str:
+    number = value if isinstance(value, decimal.Decimal) else decimal.Decimal(str(value))
+    if not number.is_finite():
+        return str(number)
+    if number.is_zero():
+        return '0'
+    return format(number.normalize(), 'f')
+
+
+def _encode(value) -> bytes:
+    if value is None:
+        return _NULL
+    if value is True:
+        return _TRUE
+    if value is False:
+        return _FALSE
+    if isinstance(value, (int, float, decimal.Decimal)):
+        data = _canonical_number(value).encode()
+        tag = _NUMBER
+    else:
+        data = str(value).encode()
+        tag = _TEXT
+    return tag + len(data).to_bytes(4, 'big') + data
+
+
+def _row_hash(values) -> bytes:
+    digest = hashlib.blake2b(digest_size=16)
+    for value in values:
+        digest.update(_encode(value))
+    return digest.digest()
+
+
+def migrate(conn):
+    with conn.cursor() as cur:
+        cur.execute("""
+            CREATE TEMP TABLE row_hashes (
+                id TEXT,
+                tonno_store_id TEXT,
+                tonno_load_ts TIMESTAMP,
+                tonno_row_hash BYTEA
+            ) ON COMMIT DROP
+        """)
+
+        # the server side cursor stays open while the batches are inserted, so read it batch by batch
+        with conn.cursor(name='row_hash_migration') as rows:
+            rows.execute(f"""
+                SELECT {', '.join(HASHED_COLUMNS)}, tonno_load_ts
+                FROM products_and_prices
+            """)
+            while True:
+                batch = rows.fetchmany(BATCH_SIZE)
+                if not batch:
+                    break
+                execute_values(
+                    cur, "INSERT INTO row_hashes (id, tonno_store_id, tonno_load_ts, tonno_row_hash) VALUES %s",
+                    [(row[0], row[-2], row[-1], _row_hash(row[:-1])) for row in batch],
+                    page_size=1000,
+                )
+
+        cur.execute("ANALYZE row_hashes")
+        cur.execute("ALTER TABLE products_and_prices ALTER COLUMN tonno_row_hash TYPE BYTEA USING NULL")
+        cur.execute("""
+            UPDATE products_and_prices p
+            SET tonno_row_hash = h.tonno_row_hash
+            FROM row_hashes h
+            WHERE p.id = h.id
+                AND p.tonno_store_id = h.tonno_store_id
+                AND p.tonno_load_ts = h.tonno_load_ts
+        """)
+        cur.execute("ANALYZE products_and_prices")
@@ -0,0 +1,30 @@
+-- ensure_products_and_prices_partition() checked for the partition and created it in two steps, so two
+-- fetchers loading into a month without a partition (parallel runs, the first run after a month boundary)
+-- could both see it missing and the second CREATE failed its whole load. Creating partitions is now
+-- serialized with a transaction level advisory lock, and a partition created by a concurrent transaction
+-- since the check counts as existing.
+
+CREATE OR REPLACE FUNCTION ensure_products_and_prices_partition(ts TIMESTAMP) RETURNS TEXT AS $$
+DECLARE
+    month_start DATE := date_trunc('month', ts)::date;
+    partition_name TEXT := 'products_and_prices_' || to_char(month_start, 'YYYY_MM');
+BEGIN
+    IF to_regclass(partition_name) IS NOT NULL THEN
+        RETURN partition_name;
+    END IF;
+
+    PERFORM pg_advisory_xact_lock(hashtext('ensure_products_and_prices_partition'));
+    IF to_regclass(partition_name) IS NULL THEN
+        BEGIN
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF products_and_prices FOR VALUES FROM (%L) TO (%L)',
+                partition_name, month_start, (month_start + INTERVAL '1 month')::date
+            );
+        EXCEPTION WHEN duplicate_table OR unique_violation THEN
+            -- created and committed by another transaction after this one's catalog lookup
+            NULL;
+        END;
+    END IF;
+    RETURN partition_name;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,5 @@
+-- data_versions.version_ts is written with now(), in the session's time zone, but the API read it as
+-- UTC: in a non-UTC session Last-Modified / If-Modified-Since were off by the UTC offset. As TIMESTAMPTZ
+-- it is an absolute point in time. Existing values are converted from the time zone of the migrating
+-- session, the fetcher's, which is the one they were written in.
+ALTER TABLE data_versions ALTER COLUMN version_ts TYPE TIMESTAMPTZ;
@@ -1,17 +1,515 @@
 from abc import ABC, abstractmethod
-from typing import List, Dict
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import List, Dict, Iterator, Optional
+import hashlib
+import itertools
 import logging
+import queue
+import random
+import threading
+import time
+import datetime
 import psycopg2
 import os
 
+from curl_cffi import requests as cffi_requests
+
+from fetcher.bulk_copy import copy_records
+from fetcher.fingerprint import row_fingerprint
+from fetcher.product_record import PRODUCT_COLUMNS, STAGING_COLUMNS, ProductRecord, compile_mapping
+from fetcher.partition_maintenance import ensure_partitions
+
 logger = logging.getLogger("base-fetcher")
 
+# Backend LISTENs on this channel and drops its cached responses when a load commits
+DATA_CHANGED_CHANNEL = "products_updated"
+
+# Streaming load: pages the store workers may queue ahead of the db writes (backpressure beyond that),
+# and new/changed products COPYed into staging at a time
+PIPELINE_QUEUE_PAGES = 16
+STAGING_BATCH_ROWS = 5000
+
+
+# The whole SCD2 diff of one update as data-modifying CTEs over the incoming_products (new/changed)
+# and disappeared_products staging tables: one statement, one round trip, exact counts from RETURNING.
+# Every CTE reads the snapshot taken before the statement, so none of them sees another one's writes:
+# price_events and opened_intervals still see the versions/intervals that closed_changed and
+# closed_intervals are closing, which is exactly the "previous" state they compare against.
+SCD2_MERGE_QUERY = """
+    WITH closed_changed AS (
+        UPDATE products_and_prices p
+        SET tonno_end_ts = %(update_ts)s
+        FROM incoming_products i
+        WHERE p.id = i.id
+            AND p.tonno_store_id = i.tonno_store_id
+            AND p.tonno_end_ts IS NULL
+            AND p.tonno_data_source = %(data_source)s
+            AND p.tonno_row_hash IS DISTINCT FROM i.tonno_row_hash
+        RETURNING p.id, p.tonno_store_id
+    ),
+    closed_disappeared AS (
+        UPDATE products_and_prices p
+        SET tonno_end_ts = %(update_ts)s
+        FROM disappeared_products d
+        WHERE p.id = d.id
+            AND p.tonno_store_id = d.tonno_store_id
+            AND p.tonno_end_ts IS NULL
+            AND p.tonno_data_source = %(data_source)s
+        RETURNING p.id, p.tonno_store_id
+    ),
+    price_events AS (
+        INSERT INTO price_change_events (
+            id, tonno_store_id, tonno_data_source, name_finnish, price_before, price_after, change_ts
+        )
+        SELECT i.id, i.tonno_store_id, %(data_source)s, i.name_finnish, prev.normal_price, i.normal_price, %(update_ts)s
+        FROM incoming_products i
+        CROSS JOIN LATERAL (
+            SELECT p.normal_price
+            FROM products_and_prices p
+            WHERE p.id = i.id
+                AND p.tonno_store_id = i.tonno_store_id
+                AND p.tonno_data_source = %(data_source)s
+                AND p.normal_price IS NOT NULL
+            ORDER BY p.tonno_load_ts DESC
+            LIMIT 1
+        ) prev
+        WHERE i.normal_price IS NOT NULL
+            AND i.normal_price IS DISTINCT FROM prev.normal_price
+        RETURNING 1
+    ),
+    inserted AS (
+        INSERT INTO products_and_prices (
+            id, name_finnish, name_english, available_store, available_web,
+            net_weight, content_unit, image_url, brand_name,
+            normal_price_unit, normal_price, batch_price,
+            batch_discount_pct, batch_discount_type, batch_days_left,
+            tonno_store_id, tonno_data_source, tonno_load_ts, tonno_end_ts, tonno_row_hash
+        )
+        SELECT
+            i.id, i.name_finnish, i.name_english, i.available_store, i.available_web,
+            i.net_weight, i.content_unit, i.image_url, i.brand_name,
+            i.normal_price_unit, i.normal_price, i.batch_price,
+            i.batch_discount_pct, i.batch_discount_type, i.batch_days_left,
+            i.tonno_store_id, %(data_source)s, %(update_ts)s, NULL, i.tonno_row_hash
+        FROM incoming_products i
+        LEFT JOIN products_and_prices p
+            ON p.id = i.id
+            AND p.tonno_store_id = i.tonno_store_id
+            AND p.tonno_end_ts IS NULL
+            AND p.tonno_data_source = %(data_source)s
+        WHERE p.id IS NULL OR p.tonno_row_hash IS DISTINCT FROM i.tonno_row_hash
+        RETURNING
+            id, tonno_store_id, tonno_data_source, tonno_load_ts, name_finnish, brand_name, net_weight,
+            content_unit, normal_price, batch_price, batch_discount_pct, batch_discount_type
+    ),
+    closed_intervals AS (
+        UPDATE price_intervals pi
+        SET valid_to = %(update_ts)s
+        WHERE pi.tonno_data_source = %(data_source)s
+            AND pi.valid_to IS NULL
+            AND (
+                EXISTS (
+                    SELECT 1
+                    FROM incoming_products i
+                    WHERE i.id = pi.id
+                        AND i.tonno_store_id = pi.tonno_store_id
+                        AND (i.normal_price IS DISTINCT FROM pi.normal_price
+                             OR i.batch_price IS DISTINCT FROM pi.batch_price)
+                )
+                OR EXISTS (
+                    SELECT 1
+                    FROM disappeared_products d
+                    WHERE d.id = pi.id AND d.tonno_store_id = pi.tonno_store_id
+                )
+            )
+        RETURNING 1
+    ),
+    opened_intervals AS (
+        -- new versions without an open interval of the same price state (the ones closed_intervals closes)
+        INSERT INTO price_intervals (
+            id, tonno_store_id, tonno_data_source, valid_from, valid_to, name_finnish, normal_price, batch_price,
+            batch_discount_pct, batch_discount_type, net_weight, content_unit, price_per_weight
+        )
+        SELECT
+            n.id, n.tonno_store_id, n.tonno_data_source, n.tonno_load_ts, NULL, n.name_finnish, n.normal_price, n.batch_price,
+            n.batch_discount_pct, n.batch_discount_type, n.net_weight, n.content_unit,
+            CASE
+                WHEN n.net_weight > 0 THEN COALESCE(
+                    CASE WHEN n.batch_price IS NOT NULL AND n.batch_price < n.normal_price
+                         THEN n.batch_price ELSE n.normal_price END,
+                    n.normal_price
+                ) / n.net_weight
+            END
+        FROM inserted n
+        WHERE NOT EXISTS (
+            SELECT 1
+            FROM price_intervals pi
+            WHERE pi.id = n.id
+                AND pi.tonno_store_id = n.tonno_store_id
+                AND pi.tonno_data_source = n.tonno_data_source
+                AND pi.valid_to IS NULL
+                AND pi.normal_price IS NOT DISTINCT FROM n.normal_price
+                AND pi.batch_price IS NOT DISTINCT FROM n.batch_price
+        )
+        RETURNING 1
+    ),
+    current_removed AS (
+        -- disappeared products, and new versions now excluded by the current_prices name filter
+        DELETE FROM current_prices c
+        USING (
+            SELECT id, tonno_store_id FROM closed_disappeared
+            UNION ALL
+            SELECT id, tonno_store_id FROM inserted
+            WHERE LOWER(name_finnish) LIKE '%%suodatinpussi%%' OR LOWER(name_finnish) LIKE '%%kahvinsuodatin%%'
+        ) gone
+        WHERE c.tonno_data_source = %(data_source)s
+            AND c.tonno_store_id = gone.tonno_store_id
+            AND c.id = gone.id
+        RETURNING 1
+    ),
+    current_upserted AS (
+        INSERT INTO current_prices (
+            id, tonno_store_id, tonno_data_source, name_finnish, brand_name, net_weight,
+            current_price, fl_deal_price, price_per_weight, tonno_load_ts
+        )
+        SELECT
+            id, tonno_store_id, tonno_data_source, name_finnish, brand_name, net_weight,
+            effective_price, fl_deal_price, effective_price / NULLIF(net_weight, 0), tonno_load_ts
+        FROM (
+            SELECT
+                *,
+                CASE
+                    WHEN batch_price IS NOT NULL AND batch_price < normal_price THEN batch_price
+                    ELSE normal_price
+                END AS effective_price,
+                CASE
+                    WHEN batch_price IS NOT NULL AND batch_price < normal_price THEN 1
+                    ELSE 0
+                END AS fl_deal_price
+            FROM inserted
+            WHERE NOT LOWER(name_finnish) LIKE '%%suodatinpussi%%'
+                AND NOT LOWER(name_finnish) LIKE '%%kahvinsuodatin%%'
+        ) new_rows
+        ON CONFLICT (tonno_data_source, tonno_store_id, id) DO UPDATE SET
+            name_finnish = EXCLUDED.name_finnish,
+            brand_name = EXCLUDED.brand_name,
+            net_weight = EXCLUDED.net_weight,
+            current_price = EXCLUDED.current_price,
+            fl_deal_price = EXCLUDED.fl_deal_price,
+            price_per_weight = EXCLUDED.price_per_weight,
+            tonno_load_ts = EXCLUDED.tonno_load_ts
+        RETURNING 1
+    )
+    SELECT
+        (SELECT count(*) FROM closed_changed),
+        (SELECT count(*) FROM closed_disappeared),
+        (SELECT count(*) FROM price_events),
+        (SELECT count(*) FROM inserted),
+        (SELECT count(*) FROM closed_intervals),
+        (SELECT count(*) FROM opened_intervals)
+"""
+
 
 class FetchResponseValidationError(Exception):
     """Raised when an API response fails validation (e.g. missing keys, no products, Cloudflare challenge)."""
     pass
 
 
+@dataclass
+class LoadResult:
+    """What one initial insert or update did; str() gives the summary the orchestrator logs"""
+    message: str
+    #new SCD versions inserted + rows closed because their product disappeared; 0 = source data unchanged
+    changed_rows: int = 0
+
+    def __str__(self) -> str:
+        return self.message
+
+
+@dataclass
+class StagingResult:
+    """What _stream_to_staging staged for one load"""
+    #stores fetched successfully, in configuration order
+    store_ids: list[str]
+    #unique products returned by those stores
+    incoming_count: int
+    #new/changed products in incoming_products
+    staged_count: int
+    #open rows in disappeared_products
+    disappeared_count: int
+    fingerprint: str
+
+
+def _put_until_stopped(pages: queue.Queue, item, stop: threading.Event) -> bool:
+    """Blocking put that gives up (returns False) once stop is set, so producers never outlive the consumer"""
+    while not stop.is_set():
+        try:
+            pages.put(item, timeout=0.5)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+class FetchCancelledError(Exception):
+    """Raised inside a fetcher whose run was cancelled by the orchestrator (e.g. it exceeded its deadline)."""
+    pass
+
+
+class CircuitOpenError(FetchResponseValidationError):
+    """Raised instead of sending a request while a retailer's circuit breaker is open (repeated Cloudflare challenges)."""
+    pass
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: allows bursts of up to `capacity` requests, refilled at rate_per_second.
+    rate_per_second <= 0 disables the limit.
+    """
+
+    def __init__(self, rate_per_second: float, capacity: float = 1.0):
+        self._rate = rate_per_second
+        self._capacity = max(1.0, capacity)
+        self._tokens = self._capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, cancelled: Optional[threading.Event] = None):
+        """Blocks until a token is available (or cancelled is set)"""
+        if self._rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self._rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait_seconds = (1 - self._tokens) / self._rate
+            if cancelled is not None:
+                if cancelled.wait(wait_seconds):
+                    return
+            else:
+                time.sleep(wait_seconds)
+
+
+class CircuitBreaker:
+    """
+    Opens after `threshold` consecutive Cloudflare challenges and rejects requests for `cooldown_seconds`.
+    After the cooldown one trial request is let through (half-open): success closes the circuit,
+    another challenge opens it again.
+    """
+
+    def __init__(self, threshold: int, cooldown_seconds: float):
+        self._threshold = threshold
+        self._cooldown_seconds = cooldown_seconds
+        self._consecutive_challenges = 0
+        self._opened_at: Optional[float] = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def before_request(self) -> tuple[bool, bool]:
+        """
+        Returns (allowed, is_trial): whether a request may be sent, and whether this call took the half-open
+        trial slot, which only its own caller may give back with release_trial
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return True, False
+            if time.monotonic() - self._opened_at < self._cooldown_seconds or self._trial_in_flight:
+                return False, False
+            self._trial_in_flight = True
+            return True, True
+
+    def release_trial(self):
+        """
+        Ends a half-open trial that got no answer (transport error) without changing the circuit state;
+        only for the caller whose before_request returned is_trial
+        """
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_success(self):
+        """Any answer that is not a challenge closes the circuit"""
+        with self._lock:
+            self._consecutive_challenges = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_challenge(self) -> bool:
+        """Returns True if this challenge (re)opened the circuit"""
+        with self._lock:
+            self._consecutive_challenges += 1
+            if self._trial_in_flight or (self._opened_at is None and self._consecutive_challenges >= self._threshold):
+                self._opened_at = time.monotonic()
+                self._trial_in_flight = False
+                return True
+            return False
+
+
+# Statuses worth retrying: throttling and transient server/proxy errors
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+# Markers of Cloudflare's interstitial challenge page
+_CHALLENGE_MARKERS = ('Just a moment...', 'challenge-platform', 'cf-chl-')
+
+
+def is_cloudflare_challenge(response) -> bool:
+    """True if the response is a Cloudflare challenge page instead of the API's answer"""
+    if response.headers.get('cf-mitigated') == 'challenge':
+        return True
+    if response.status_code not in (403, 429, 503):
+        return False
+    if 'text/html' not in response.headers.get('content-type', ''):
+        return False
+    text = response.text or ''
+    return any(marker in text for marker in _CHALLENGE_MARKERS)
+
+
+class RetailerSession:
+    """
+    HTTP client shared by all fetcher instances and threads of one retailer (see for_retailer).
+
+    - keeps curl_cffi sessions (Firefox TLS fingerprint, HTTP/2 negotiated via ALPN) in a pool, so
+      connections and TLS sessions are reused between requests, threads and cycles
+    - limits the request rate with a token bucket
+    - retries transport errors, RETRYABLE_STATUSES and Cloudflare challenges with exponential backoff
+      and full jitter (honouring Retry-After)
+    - trips a circuit breaker after repeated Cloudflare challenges, then fails fast with CircuitOpenError
+
+    Settings come from <prefix>_REQUESTS_PER_SECOND, <prefix>_BURST, <prefix>_MAX_RETRIES,
+    <prefix>_CIRCUIT_THRESHOLD, <prefix>_CIRCUIT_COOLDOWN_SECONDS and FETCH_REQUEST_TIMEOUT.
+    """
+    BACKOFF_BASE_SECONDS: float = 1.0
+    BACKOFF_MAX_SECONDS: float = 60.0
+
+    _instances: dict[str, 'RetailerSession'] = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(
+        self,
+        name: str,
+        rate_per_second: float = 2.0,
+        burst: float = 1.0,
+        max_retries: int = 3,
+        timeout_seconds: float = 30.0,
+        circuit_threshold: int = 3,
+        circuit_cooldown_seconds: float = 900.0,
+        impersonate: str = "firefox",
+    ):
+        self.name = name
+        self._bucket = TokenBucket(rate_per_second, burst)
+        self._breaker = CircuitBreaker(circuit_threshold, circuit_cooldown_seconds)
+        self._max_retries = max_retries
+        self._timeout_seconds = timeout_seconds
+        self._impersonate = impersonate
+        self._idle_sessions: queue.LifoQueue = queue.LifoQueue()
+
+    @classmethod
+    def for_retailer(cls, env_prefix: str) -> 'RetailerSession':
+        """The process-wide session of a retailer, created from its environment settings on first use"""
+        with cls._instances_lock:
+            if env_prefix not in cls._instances:
+                cls._instances[env_prefix] = cls(
+                    name=env_prefix,
+                    rate_per_second=float(os.environ.get(f'{env_prefix}_REQUESTS_PER_SECOND', '2')),
+                    burst=float(os.environ.get(f'{env_prefix}_BURST', '1')),
+                    max_retries=int(os.environ.get(f'{env_prefix}_MAX_RETRIES', '3')),
+                    timeout_seconds=float(os.environ.get('FETCH_REQUEST_TIMEOUT', '30')),
+                    circuit_threshold=int(os.environ.get(f'{env_prefix}_CIRCUIT_THRESHOLD', '3')),
+                    circuit_cooldown_seconds=float(os.environ.get(f'{env_prefix}_CIRCUIT_COOLDOWN_SECONDS', '900')),
+                )
+            return cls._instances[env_prefix]
+
+    def _backoff_seconds(self, attempt: int, response=None) -> float:
+        retry_after = response.headers.get('retry-after') if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), self.BACKOFF_MAX_SECONDS)
+        return random.uniform(0, min(self.BACKOFF_MAX_SECONDS, self.BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+    def _send(self, method: str, url: str, **kwargs):
+        try:
+            session = self._idle_sessions.get_nowait()
+        except queue.Empty:
+            session = cffi_requests.Session(impersonate=self._impersonate)
+        try:
+            response = session.request(method, url, timeout=self._timeout_seconds, **kwargs)
+        except Exception:
+            # a failed transfer may leave the connection unusable, the next request gets a fresh session
+            session.close()
+            raise
+        self._idle_sessions.put(session)
+        return response
+
+    def request(self, method: str, url: str, cancelled: Optional[threading.Event] = None, **kwargs):
+        """
+        Sends a request with rate limiting, retries and the circuit breaker applied. Returns the last
+        response (which may still be an error or a challenge page once retries are exhausted, for
+        validate_fetch_response to report) or raises the last transport error.
+
+        Raises:
+            CircuitOpenError: If the retailer's circuit is open.
+            FetchCancelledError: If cancelled is set before or between attempts.
+        """
+        for attempt in range(self._max_retries + 1):
+            if cancelled is not None and cancelled.is_set():
+                raise FetchCancelledError(f"{self.name} request cancelled")
+            allowed, is_trial = self._breaker.before_request()
+            if not allowed:
+                raise CircuitOpenError(
+                    f"{self.name} circuit breaker is open after repeated Cloudflare challenges, not sending {url}"
+                )
+
+            response = None
+            try:
+                self._bucket.acquire(cancelled)
+                if cancelled is not None and cancelled.is_set():
+                    raise FetchCancelledError(f"{self.name} request cancelled")
+                response = self._send(method, url, **kwargs)
+            except cffi_requests.RequestsError as e:
+                if is_trial:
+                    self._breaker.release_trial()
+                if attempt == self._max_retries:
+                    raise
+                logger.warning(f"{self.name} {method} {url} failed ({e}), retry {attempt + 1}/{self._max_retries}")
+            except BaseException:
+                # cancelled or failed without an answer: a half-open trial left in flight would keep the circuit shut
+                if is_trial:
+                    self._breaker.release_trial()
+                raise
+            else:
+                if is_cloudflare_challenge(response):
+                    if self._breaker.record_challenge():
+                        logger.error(f"{self.name} circuit breaker opened after repeated Cloudflare challenges")
+                    if attempt == self._max_retries:
+                        return response
+                    logger.warning(f"{self.name} got a Cloudflare challenge, retry {attempt + 1}/{self._max_retries}")
+                elif response.status_code in RETRYABLE_STATUSES:
+                    self._breaker.record_success()
+                    if attempt == self._max_retries:
+                        return response
+                    logger.warning(
+                        f"{self.name} {method} {url} returned HTTP {response.status_code}, "
+                        f"retry {attempt + 1}/{self._max_retries}"
+                    )
+                else:
+                    self._breaker.record_success()
+                    return response
+
+            delay = self._backoff_seconds(attempt, response)
+            if cancelled is not None:
+                if cancelled.wait(delay):
+                    raise FetchCancelledError(f"{self.name} request cancelled")
+            else:
+                time.sleep(delay)
+
+    def post(self, url: str, cancelled: Optional[threading.Event] = None, **kwargs):
+        return self.request("POST", url, cancelled=cancelled, **kwargs)
+
+
 class BaseProductFetcher(ABC):
     """Defines basic operations for any fetcher per webshop"""
     #valid categories for the fetcher - category to fetch needs to be one of these
@@ -19,6 +517,10 @@ class BaseProductFetcher(ABC):
 
     category: str
     _data_source: str
+    #prefix of the per-retailer fetch settings: <prefix>_MAX_CONCURRENCY and the RetailerSession ones
+    _env_prefix: str
+    #declarative JSON paths of every ProductRecord field (see product_record), compiled into _extract_product
+    _field_mapping: dict
     
     def __init_subclass__(cls, **kwargs):
         """Validates that subclasses set a valid category"""
@@ -27,30 +529,561 @@ class BaseProductFetcher(ABC):
             raise TypeError(f"Can't instantiate abstract class {cls.__name__} without 'category' attribute")
         if cls.category not in cls.VALID_CATEGORIES:
             raise ValueError(f"Invalid category '{cls.category}'. Must be one of: {cls.VALID_CATEGORIES}")
+        if hasattr(cls, '_field_mapping'):
+            cls._extract_product = staticmethod(compile_mapping(cls._field_mapping))
         
-    def __init__(self):
-        """Connecting to the db of this solution - it is used by all subclasses"""
-        self._conn = psycopg2.connect(
+    def __init__(self, conn=None):
+        """
+        Connecting to the db of this solution - it is used by all subclasses.
+        conn: an already open connection to use instead (e.g. the benchmarks' stand-in for the db).
+        """
+        self._conn = conn if conn is not None else psycopg2.connect(
             host=os.environ['DB_HOST'],
             database=os.environ['DB_NAME'],
             user=os.environ['DB_USER'],
             password=os.environ['DB_PASSWORD']
         )
+        #stores of one retailer are fetched in parallel, but never faster than the retailer's rate limit
+        self._max_concurrency = max(1, int(os.environ.get(f'{self._env_prefix}_MAX_CONCURRENCY', '4')))
+        #every request of this fetcher takes a slot, whichever store or page thread sends it
+        self._request_slots = threading.BoundedSemaphore(self._max_concurrency)
+        #page pool shared by all store workers of a _stream_to_staging run (see _page_pool)
+        self._page_executor: Optional[ThreadPoolExecutor] = None
+        self._session = RetailerSession.for_retailer(self._env_prefix)
+        self._cancelled = threading.Event()
 
     def close_connection(self):
         """Close connection to db if it exists"""
         if self._conn:
             self._conn.close()
 
+    def cancel(self):
+        """
+        Asks a running fetch/load to stop, safe to call from another thread: requests not yet sent raise
+        FetchCancelledError and a db statement in progress is cancelled (its transaction is rolled back).
+        Cancellation is cooperative, a request already in flight still runs until its timeout.
+        """
+        self._cancelled.set()
+        if self._conn and not self._conn.closed:
+            self._conn.cancel()
+
+    def is_cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def _raise_if_cancelled(self):
+        if self._cancelled.is_set():
+            raise FetchCancelledError(f"{self._data_source} fetcher was cancelled")
+
+    def _post(self, url: str, **kwargs):
+        """
+        POSTs through the retailer's RetailerSession, with at most <prefix>_MAX_CONCURRENCY requests (retries
+        included) in flight across all threads of this fetcher; raises FetchCancelledError once cancelled
+        """
+        while not self._request_slots.acquire(timeout=0.5):
+            self._raise_if_cancelled()
+        try:
+            return self._session.post(url, cancelled=self._cancelled, **kwargs)
+        finally:
+            self._request_slots.release()
+
+    def _produce_store(self, store_id: str, pages: queue.Queue, stop: threading.Event):
+        """
+        Pipeline producer, run on a worker thread per store: puts (store_id, records) on pages for every page
+        _iter_store_products yields, with tonno_store_id and tonno_row_hash set, then (store_id, None) when
+        the store is complete or (store_id, exception) when it failed. Blocks while pages is full.
+        """
+        try:
+            for records in self._iter_store_products(store_id):
+                for record in records:
+                    record.tonno_store_id = store_id
+                    record.tonno_row_hash = self._row_hash(record)
+                if not _put_until_stopped(pages, (store_id, records), stop):
+                    return
+            _put_until_stopped(pages, (store_id, None), stop)
+        except Exception as e:
+            _put_until_stopped(pages, (store_id, e), stop)
+
+    def _stream_to_staging(self, cur, store_ids: list[str], open_hashes: dict) -> StagingResult:
+        """
+        Fetches every store and stages the result while it streams in: the store workers fetch, extract and
+        hash pages into a bounded queue, this thread diffs each record against open_hashes ((store, id) ->
+        tonno_row_hash of the open rows) and COPYs the new and changed ones into incoming_products every
+        STAGING_BATCH_ROWS rows. <prefix>_MAX_CONCURRENCY bounds the store workers, the page threads they
+        share and the requests in flight (see _post), however many stores there are. Network I/O of the workers
+        overlaps the db writes here, and a full queue makes the workers wait, so memory stays at a few
+        pages and one batch (plus the product keys) however large the catalog is.
+
+        A store whose fetch fails is logged and its staged rows are removed, the other stores are still
+        loaded. Products repeated across pages of a store are staged once.
+
+        Raises:
+            FetchResponseValidationError: If no store could be fetched.
+        """
+        pages: queue.Queue = queue.Queue(maxsize=PIPELINE_QUEUE_PAGES)
+        stop = threading.Event()
+        seen_ids: dict[str, set] = {store_id: set() for store_id in store_ids}
+        hash_sums: dict[str, int] = {store_id: 0 for store_id in store_ids}
+        failed: set[str] = set()
+        batch: list[ProductRecord] = []
+        staged_count = 0
+
+        def flush():
+            nonlocal staged_count
+            if batch:
+                staged_count += copy_records(cur, 'incoming_products', STAGING_COLUMNS, (item.staging_row() for item in batch))
+                batch.clear()
+
+        executor = ThreadPoolExecutor(
+            max_workers=max(1, min(self._max_concurrency, len(store_ids))),
+            thread_name_prefix=f"{self._data_source}-fetch",
+        )
+        #one page pool for all stores: MAX_CONCURRENCY page threads per fetcher, not per store
+        self._page_executor = ThreadPoolExecutor(
+            max_workers=self._max_concurrency, thread_name_prefix=f"{self._data_source}-page"
+        )
+        try:
+            for store_id in store_ids:
+                executor.submit(self._produce_store, store_id, pages, stop)
+
+            remaining = set(store_ids)
+            while remaining:
+                store_id, payload = pages.get()
+                if isinstance(payload, list):
+                    store_seen = seen_ids[store_id]
+                    for record in payload:
+                        if record.id in store_seen:
+                            continue
+                        store_seen.add(record.id)
+                        hash_sums[store_id] += int.from_bytes(record.tonno_row_hash, 'big')
+                        if open_hashes.get((store_id, record.id)) != record.tonno_row_hash:
+                            batch.append(record)
+                    if len(batch) >= STAGING_BATCH_ROWS:
+                        flush()
+                    continue
+
+                remaining.discard(store_id)
+                if payload is None:
+                    logger.info(f"{self._data_source}: store {store_id} returned {len(seen_ids[store_id])} products")
+                    continue
+                logger.error(
+                    f"{self._data_source}: fetching store {store_id} failed, skipping it: {payload}",
+                    exc_info=payload,
+                )
+                failed.add(store_id)
+                batch[:] = [item for item in batch if item.tonno_store_id != store_id]
+                cur.execute("DELETE FROM incoming_products WHERE tonno_store_id = %s", (store_id,))
+                staged_count -= cur.rowcount
+            flush()
+        finally:
+            stop.set()
+            # pages not started yet are dropped, a store worker waiting for one gets CancelledError
+            self._page_executor.shutdown(wait=False, cancel_futures=True)
+            executor.shutdown(wait=True)
+            self._page_executor.shutdown(wait=True)
+            self._page_executor = None
+
+        #stores that failed because of the cancellation must not be loaded as a partial result
+        self._raise_if_cancelled()
+        succeeded = [store_id for store_id in store_ids if store_id not in failed]
+        if not succeeded:
+            raise FetchResponseValidationError(f"{self._data_source}: all {len(store_ids)} stores failed to fetch")
+
+        disappeared = [
+            (store_id, product_id) for store_id, product_id in open_hashes
+            if store_id not in failed and product_id not in seen_ids[store_id]
+        ]
+        copy_records(cur, 'disappeared_products', ('tonno_store_id', 'id'), disappeared)
+
+        incoming_count = sum(len(seen_ids[store_id]) for store_id in succeeded)
+        logger.info(
+            f"{self._data_source}: {incoming_count} incoming products against {len(open_hashes)} open rows, "
+            f"{staged_count} new or changed, {len(disappeared)} disappeared"
+        )
+        return StagingResult(
+            store_ids=succeeded,
+            incoming_count=incoming_count,
+            staged_count=staged_count,
+            disappeared_count=len(disappeared),
+            fingerprint=self._result_fingerprint({store_id: hash_sums[store_id] for store_id in succeeded}),
+        )
+
+    @contextmanager
+    def _page_pool(self, size: int):
+        """The page pool shared by the store workers of _stream_to_staging, or a pool of size of its own outside it"""
+        if self._page_executor is not None:
+            yield self._page_executor
+            return
+        with ThreadPoolExecutor(max_workers=size, thread_name_prefix=f"{self._data_source}-page") as executor:
+            yield executor
+
+    def _iter_concurrently(self, fetch, args: list) -> Iterator:
+        """
+        Like _fetch_concurrently, but yields the results one by one (in the order of args) with at most
+        <prefix>_MAX_CONCURRENCY calls submitted: a new call is only started when a result has been taken,
+        so a slow consumer slows the fetching down instead of piling up results.
+        """
+        if not args:
+            return
+        workers = min(self._max_concurrency, len(args))
+        pending_args = iter(args)
+        with self._page_pool(workers) as executor:
+            running = deque(executor.submit(fetch, arg) for arg in itertools.islice(pending_args, workers))
+            while running:
+                result = running.popleft().result()
+                for arg in itertools.islice(pending_args, 1):
+                    running.append(executor.submit(fetch, arg))
+                yield result
+
+    def _fetch_concurrently(self, fetch, args: list) -> list:
+        """
+        Calls fetch(arg) for every arg on the page pool (requests still go through the retailer's rate
+        limiter) and returns the results in the order of args.
+        Used for the pages of one store; the first failing call fails the whole batch.
+        """
+        if not args:
+            return []
+        with self._page_pool(min(self._max_concurrency, len(args))) as executor:
+            return list(executor.map(fetch, args))
+
+    @staticmethod
+    def _result_fingerprint(hash_sums: dict[str, int]) -> str:
+        """
+        Fingerprint of a whole result set from the fetched stores and, per store, the sum (mod 2^128) of
+        its products' tonno_row_hash: computed while the products stream in, independent of the order the
+        API returned them in. The row hash covers the product id and store.
+        """
+        digest = hashlib.sha256()
+        for store_id in sorted(hash_sums):
+            digest.update(f"{store_id}|{hash_sums[store_id] % (1 << 128):032x}\n".encode())
+        return digest.hexdigest()
+
+    def _stored_fingerprint(self, cur) -> Optional[str]:
+        """Fingerprint of the result set merged by this data source's last successful load"""
+        cur.execute(
+            "SELECT result_fingerprint FROM fetch_fingerprints WHERE tonno_data_source = %s",
+            (self._data_source,)
+        )
+        row = cur.fetchone()
+        return row[0] if row else None
+
+    def _save_fingerprint(self, cur, fingerprint: str, product_count: int):
+        """Stores the fingerprint of the result set just merged; run inside the load transaction"""
+        cur.execute("""
+            INSERT INTO fetch_fingerprints (tonno_data_source, result_fingerprint, product_count, updated_ts)
+            VALUES (%s, %s, %s, now())
+            ON CONFLICT (tonno_data_source) DO UPDATE SET
+                result_fingerprint = EXCLUDED.result_fingerprint,
+                product_count = EXCLUDED.product_count,
+                updated_ts = EXCLUDED.updated_ts
+        """, (self._data_source, fingerprint, product_count))
+
+    def _open_row_hashes(self, cur, store_ids: list[str]) -> dict[tuple[str, str], Optional[bytes]]:
+        """
+        tonno_row_hash of the open SCD rows of the given stores, keyed by (tonno_store_id, id)
+        (an index-only read of products_and_prices_open_idx)
+        """
+        cur.execute("""
+            SELECT tonno_store_id, id, tonno_row_hash
+            FROM products_and_prices
+            WHERE tonno_end_ts IS NULL
+                AND tonno_data_source = %s
+                AND tonno_store_id = ANY(%s)
+        """, (self._data_source, store_ids))
+        return {
+            (store_id, product_id): bytes(row_hash) if row_hash is not None else None
+            for store_id, product_id, row_hash in cur.fetchall()
+        }
+
+    def _unconfigured_store_rows(self, cur, store_ids: list[str]) -> list[tuple[str, str]]:
+        """
+        (tonno_store_id, id) of the open SCD rows of stores no longer configured for this data source: nothing
+        fetches them anymore, so they are closed as disappeared instead of being served as current forever
+        """
+        cur.execute("""
+            SELECT tonno_store_id, id
+            FROM products_and_prices
+            WHERE tonno_end_ts IS NULL
+                AND tonno_data_source = %s
+                AND NOT tonno_store_id = ANY(%s)
+        """, (self._data_source, store_ids))
+        return cur.fetchall()
+
+    @staticmethod
+    def _row_hash(item: ProductRecord) -> bytes:
+        """Fingerprint of the product's attributes and store, compared against tonno_row_hash to detect changed products"""
+        return row_fingerprint(item.product_values())
+
+    def _create_staging_tables(self, cur):
+        """
+        Creates the incoming_products (new/changed products with their tonno_row_hash) and
+        disappeared_products ((tonno_store_id, id) of closed products) temp tables SCD2_MERGE_QUERY reads,
+        filled with COPY by _stream_to_staging. Both are dropped when the load transaction ends.
+        """
+        cur.execute("""
+            CREATE TEMP TABLE incoming_products (
+                id TEXT,
+                name_finnish TEXT,
+                name_english TEXT,
+                available_store BOOLEAN,
+                available_web BOOLEAN,
+                net_weight NUMERIC,
+                content_unit TEXT,
+                image_url TEXT,
+                brand_name TEXT,
+                normal_price_unit TEXT,
+                normal_price NUMERIC,
+                batch_price NUMERIC,
+                batch_discount_pct NUMERIC,
+                batch_discount_type TEXT,
+                batch_days_left INT,
+                tonno_store_id TEXT,
+                tonno_row_hash BYTEA
+            ) ON COMMIT DROP;
+            CREATE TEMP TABLE disappeared_products (
+                tonno_store_id TEXT,
+                id TEXT
+            ) ON COMMIT DROP;
+        """)
+
+    def _notify_data_changed(self, cur):
+        """
+        Bumps this data source's row in data_versions (the API's ETag/Last-Modified source) and
+        queues a NOTIFY for the backend's caches. Postgres delivers the NOTIFY only when the
+        surrounding transaction commits, so call this right before conn.commit().
+        """
+        cur.execute("""
+            INSERT INTO data_versions (tonno_data_source, version_ts)
+            VALUES (%s, now())
+            ON CONFLICT (tonno_data_source) DO UPDATE SET version_ts = EXCLUDED.version_ts
+        """, (self._data_source,))
+        cur.execute("SELECT pg_notify(%s, %s)", (DATA_CHANGED_CHANNEL, self._data_source))
+
+    def _open_price_intervals(self, cur) -> int:
+        """
+        Opens a price_intervals row, starting at the version's tonno_load_ts, for every current product
+        (per store) of this data source that has no open interval (new products and ones whose price just changed).
+        Run after the new versions have been inserted into products_and_prices.
+
+        Returns:
+            int: number of intervals opened.
+        """
+        cur.execute("""
+            INSERT INTO price_intervals (
+                id, tonno_store_id, tonno_data_source, valid_from, valid_to, name_finnish, normal_price, batch_price,
+                batch_discount_pct, batch_discount_type, net_weight, content_unit, price_per_weight
+            )
+            SELECT
+                p.id, p.tonno_store_id, p.tonno_data_source, p.tonno_load_ts, NULL, p.name_finnish, p.normal_price, p.batch_price,
+                p.batch_discount_pct, p.batch_discount_type, p.net_weight, p.content_unit,
+                CASE
+                    WHEN p.net_weight > 0 THEN COALESCE(
+                        CASE WHEN p.batch_price IS NOT NULL AND p.batch_price < p.normal_price
+                             THEN p.batch_price ELSE p.normal_price END,
+                        p.normal_price
+                    ) / p.net_weight
+                END
+            FROM products_and_prices p
+            WHERE p.tonno_data_source = %s
+                AND p.tonno_end_ts IS NULL
+                AND NOT EXISTS (
+                    SELECT 1
+                    FROM price_intervals pi
+                    WHERE pi.id = p.id
+                        AND pi.tonno_store_id = p.tonno_store_id
+                        AND pi.tonno_data_source = p.tonno_data_source
+                        AND pi.valid_to IS NULL
+                )
+        """, (self._data_source,))
+        return cur.rowcount
+
+    def _refresh_current_prices(self, cur):
+        """
+        Rebuilds this data source's rows in current_prices from the open SCD rows of
+        products_and_prices, with the effective price, deal flag and price per weight
+        already computed. Run inside the load transaction, before conn.commit().
+        """
+        cur.execute("DELETE FROM current_prices WHERE tonno_data_source = %s", (self._data_source,))
+        cur.execute("""
+            INSERT INTO current_prices (
+                id, tonno_store_id, tonno_data_source, name_finnish, brand_name, net_weight,
+                current_price, fl_deal_price, price_per_weight, tonno_load_ts
+            )
+            SELECT
+                id,
+                tonno_store_id,
+                tonno_data_source,
+                name_finnish,
+                brand_name,
+                net_weight,
+                effective_price,
+                fl_deal_price,
+                effective_price / NULLIF(net_weight, 0),
+                tonno_load_ts
+            FROM (
+                SELECT
+                    *,
+                    CASE
+                        WHEN batch_price IS NOT NULL AND batch_price < normal_price THEN batch_price
+                        ELSE normal_price
+                    END AS effective_price,
+                    CASE
+                        WHEN batch_price IS NOT NULL AND batch_price < normal_price THEN 1
+                        ELSE 0
+                    END AS fl_deal_price
+                FROM products_and_prices
+                WHERE tonno_end_ts IS NULL
+                    AND tonno_data_source = %s
+                    AND NOT LOWER(name_finnish) LIKE '%%suodatinpussi%%'
+                    AND NOT LOWER(name_finnish) LIKE '%%kahvinsuodatin%%'
+            ) open_rows
+        """, (self._data_source,))
+
+    def target_tbl_has_existing_data(self) -> bool:
+        """
+        Checks if there are existing rows in the products_and_prices table
+        for the fetcher's data source.
+
+        Returns:
+            bool: True if there are existing rows of the data source (>0), False if no rows (0)
+        """
+        with self._conn.cursor() as cur:
+            cur.execute("""
+                SELECT EXISTS (
+                    SELECT 1
+                    FROM products_and_prices
+                    WHERE tonno_data_source = %s
+                )
+            """, (self._data_source,))
+            return cur.fetchone()[0]
+
+    def _insert_init_prices(self, conn) -> LoadResult:
+        """
+        Initial insert of product data into products_and_prices: the products are streamed into the
+        incoming_products staging table with COPY while they are fetched (see _stream_to_staging) and
+        inserted from there in one statement, all with the same tonno_load_ts.
+        """
+        store_ids = self._get_store_ids()
+        load_ts = datetime.datetime.now()
+
+        try:
+            with conn.cursor() as cur:
+                self._create_staging_tables(cur)
+                staged = self._stream_to_staging(cur, store_ids, {})
+                if not staged.incoming_count:
+                    conn.rollback()
+                    return LoadResult("No products to insert.")
+
+                # products_and_prices is partitioned by month of tonno_load_ts
+                ensure_partitions(cur, load_ts)
+                cur.execute(f"""
+                    INSERT INTO products_and_prices (
+                        {', '.join(PRODUCT_COLUMNS)},
+                        tonno_store_id, tonno_data_source, tonno_load_ts, tonno_end_ts, tonno_row_hash
+                    )
+                    SELECT
+                        {', '.join(PRODUCT_COLUMNS)},
+                        tonno_store_id, %s, %s, NULL, tonno_row_hash
+                    FROM incoming_products
+                    ON CONFLICT (id, tonno_store_id, tonno_load_ts) DO NOTHING
+                """, (self._data_source, load_ts))
+                inserted_count = cur.rowcount
+                self._open_price_intervals(cur)
+                self._refresh_current_prices(cur)
+                self._notify_data_changed(cur)
+                self._save_fingerprint(cur, staged.fingerprint, staged.incoming_count)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+        return LoadResult(
+            f"Inserted {inserted_count} of {staged.incoming_count} products (duplicates skipped).", inserted_count
+        )
+
+    def _update_prices(self, conn) -> LoadResult:
+        """
+        Updates product data in the target table using a slowly changing dimension + row_hash,
+        keyed by (id, tonno_store_id).
+        0. Streams the fetched products into staging (see _stream_to_staging): only new/changed products
+           (row_hash compared in Python) and the disappeared products of the stores fetched successfully.
+           Open rows of stores removed from the configuration are staged as disappeared too.
+           Otherwise skips the merge if the result set's fingerprint equals the last merged one.
+        1. Runs SCD2_MERGE_QUERY, which in one statement closes the changed and disappeared versions,
+           records normal_price changes into price_change_events, inserts the new versions,
+           closes/opens price_intervals where the price state changed and updates current_prices.
+        """
+        store_ids = self._get_store_ids()
+        update_ts = datetime.datetime.now()
+
+        try:
+            with conn.cursor() as cur:
+                open_hashes = self._open_row_hashes(cur, store_ids)
+                self._create_staging_tables(cur)
+                staged = self._stream_to_staging(cur, store_ids, open_hashes)
+                if not staged.incoming_count:
+                    conn.rollback()
+                    return LoadResult("No product data from source, no updates performed.")
+
+                unconfigured = self._unconfigured_store_rows(cur, store_ids)
+                if unconfigured:
+                    removed_stores = sorted({store_id for store_id, _ in unconfigured})
+                    logger.warning(
+                        f"{self._data_source}: stores {removed_stores} are no longer configured, closing their "
+                        f"{len(unconfigured)} open rows"
+                    )
+                    copy_records(cur, 'disappeared_products', ('tonno_store_id', 'id'), unconfigured)
+                elif self._stored_fingerprint(cur) == staged.fingerprint:
+                    conn.rollback()
+                    return LoadResult(
+                        f"Result set unchanged since the last load ({staged.incoming_count} products from "
+                        f"{len(staged.store_ids)} stores), merge skipped."
+                    )
+
+                # new versions go into the monthly partition of update_ts
+                ensure_partitions(cur, update_ts)
+                cur.execute(SCD2_MERGE_QUERY, {'update_ts': update_ts, 'data_source': self._data_source})
+                (updated_count, disappeared_count, price_change_count, inserted_count,
+                 closed_interval_count, opened_interval_count) = cur.fetchone()
+
+                if inserted_count or updated_count or disappeared_count:
+                    self._notify_data_changed(cur)
+                self._save_fingerprint(cur, staged.fingerprint, staged.incoming_count)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+        unchanged_count = staged.incoming_count - inserted_count
+        return LoadResult(
+            (f"Price update complete. Stores: {len(staged.store_ids)}, Incoming: {staged.incoming_count}, "
+             f"Unchanged: {unchanged_count}, Inserted: {inserted_count}, "
+             f"Updated (new version): {updated_count}, "
+             f"Disappeared: {disappeared_count}, "
+             f"Price changes: {price_change_count}, "
+             f"Price intervals closed/opened: {closed_interval_count}/{opened_interval_count}."),
+            inserted_count + disappeared_count,
+        )
+
+    def init_fetch_and_insert(self) -> LoadResult:
+        """Performs both fetch + insert operations, returns a LoadResult describing the end result of the insert"""
+        return self._insert_init_prices(self._conn)
+
+    def run_update(self) -> LoadResult:
+        """Performs a scheduled fetch and update of prices, returns a LoadResult describing the changes."""
+        return self._update_prices(self._conn)
+
     #abstract class method definitions begin
     @abstractmethod
-    def target_tbl_has_existing_data(self):
+    def _get_store_ids(self) -> list[str]:
+        """Returns the ids of the stores whose prices this fetcher loads, from its environment configuration"""
+        pass
+
+    @abstractmethod
+    def _iter_store_products(self, store_id: str) -> Iterator[list[ProductRecord]]:
         """
-        Checks if there are existing rows in the products_and_prices table 
-        for the selected data source.
-        
-        Returns:
-            bool: True if there are existing K-ruoka rows (>0), False if no rows (0)
+        Fetches the products of one store, yielding the extracted records of each page as soon as it
+        arrives; raises if the store's result turns out to be invalid. Runs on a worker thread of
+        _stream_to_staging, so it must not touch the db connection.
         """
         pass
 
@@ -75,13 +1108,3 @@ class BaseProductFetcher(ABC):
             FetchResponseValidationError: If the response fails any validation check.
         """
         pass
-
-    @abstractmethod
-    def init_fetch_and_insert(self):
-        """Performs both fetch + insert operations, returns some description string of the operation end result from insert"""
-        pass
-
-    @abstractmethod
-    def run_update(self):
-        """Performs a scheduled fetch and update of prices."""
-        pass
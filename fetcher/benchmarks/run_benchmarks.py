@@ -0,0 +1,218 @@
+"""
+Fetcher throughput benchmarks against the local stand-in server (see standin_server.py): runs each
+fetcher's streaming fetch -> extract -> hash -> stage pipeline (BaseProductFetcher._stream_to_staging)
+and reports requests/s, products/s and the time spent in each phase.
+
+Without --db nothing touches a database: staging COPY data is encoded and dropped. With --db the rows
+are COPYed into the temp staging tables of the DB_* database and rolled back, products_and_prices is
+never written.
+
+Usage (from the repo root):
+    python -m fetcher.benchmarks.run_benchmarks --stores 4 --products 2000 --latency-ms 40
+    python -m fetcher.benchmarks.run_benchmarks --error-rate 0.05 --challenge-rate 0.01 --repeat 3
+    python -m fetcher.benchmarks.run_benchmarks --db --json
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from fetcher.base_fetcher import FetchResponseValidationError
+from fetcher.benchmarks.standin_server import StandInServer, add_config_arguments, config_from_arguments
+from fetcher.fetchers.kesko_fetcher import KRuokaFetcher
+from fetcher.fetchers.s_ryhma_fetcher import SRyhmaFetcher
+
+FETCHERS = {'k-ruoka': KRuokaFetcher, 's-kaupat': SRyhmaFetcher}
+PHASES = ('fetch', 'extract', 'hash', 'stage')
+
+
+class PhaseTimer:
+    """Thread-safe sums of the time spent per phase (thread seconds: parallel work adds up)"""
+
+    def __init__(self):
+        self.seconds: dict[str, float] = defaultdict(float)
+        self.calls: dict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def measure(self, phase: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.seconds[phase] += elapsed
+                self.calls[phase] += 1
+
+    def wrap(self, phase: str, func):
+        def timed(*args, **kwargs):
+            with self.measure(phase):
+                return func(*args, **kwargs)
+        return timed
+
+
+class DiscardingCursor:
+    """Cursor without a database: statements are ignored, COPY data is read (so encoded) and dropped"""
+    rowcount = 0
+
+    def execute(self, query, params=None):
+        pass
+
+    def fetchone(self):
+        return None
+
+    def fetchall(self):
+        return []
+
+    def copy_expert(self, sql, file, size=8192):
+        while file.read(size):
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+class DiscardingConnection:
+    closed = False
+
+    def cursor(self):
+        return DiscardingCursor()
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def cancel(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class TimedCursor:
+    """Counts the COPYs of a cursor into the 'stage' phase"""
+
+    def __init__(self, cursor, timer: PhaseTimer):
+        self._cursor = cursor
+        self._timer = timer
+
+    def copy_expert(self, sql, file, *args):
+        with self._timer.measure('stage'):
+            return self._cursor.copy_expert(sql, file, *args)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+def configure_environment(server: StandInServer, stores: int, concurrency: int | None):
+    """Points the fetchers at the stand-in; rate limits off and a short circuit cooldown unless set explicitly"""
+    os.environ.update(server.env())
+    os.environ['K_RUOKA_STORE_IDS'] = ','.join(f"N{100 + n}" for n in range(stores))
+    os.environ['S_KAUPAT_STORE_IDS'] = ','.join(str(726308750 + n) for n in range(stores))
+    for prefix in ('K_RUOKA', 'S_KAUPAT'):
+        os.environ.setdefault(f'{prefix}_REQUESTS_PER_SECOND', '0')
+        os.environ.setdefault(f'{prefix}_CIRCUIT_COOLDOWN_SECONDS', '5')
+        if concurrency:
+            os.environ[f'{prefix}_MAX_CONCURRENCY'] = str(concurrency)
+
+
+def run_benchmark(name: str, server: StandInServer, use_db: bool) -> dict:
+    """One run of a fetcher's pipeline over all its configured stores"""
+    conn = None
+    if use_db:
+        from fetcher.fetcher_main import connect_db
+        conn = connect_db()
+    fetcher = FETCHERS[name](conn=conn or DiscardingConnection())
+
+    timer = PhaseTimer()
+    fetcher._fetch_page = timer.wrap('fetch', fetcher._fetch_page)
+    fetcher._extract_product_data = timer.wrap('extract', fetcher._extract_product_data)
+    fetcher._row_hash = timer.wrap('hash', fetcher._row_hash)
+
+    requests_before = dict(server.stats[name])
+    store_ids = fetcher._get_store_ids()
+    started = time.perf_counter()
+    error = None
+    staged = None
+    try:
+        with fetcher._conn.cursor() as cur:
+            fetcher._create_staging_tables(cur)
+            staged = fetcher._stream_to_staging(TimedCursor(cur, timer), store_ids, {})
+    except FetchResponseValidationError as e:
+        error = str(e)
+    finally:
+        wall_seconds = time.perf_counter() - started
+        fetcher._conn.rollback()
+        fetcher.close_connection()
+
+    requests = {key: server.stats[name][key] - requests_before[key] for key in requests_before}
+    products = staged.incoming_count if staged else 0
+    return {
+        'fetcher': name,
+        'stores': len(store_ids),
+        'failed_stores': len(store_ids) - len(staged.store_ids) if staged else len(store_ids),
+        'pages': timer.calls['extract'],
+        'requests': requests['requests'],
+        'injected_errors': requests['errors'],
+        'injected_challenges': requests['challenges'],
+        'products': products,
+        'wall_seconds': round(wall_seconds, 3),
+        'requests_per_second': round(requests['requests'] / wall_seconds, 1) if wall_seconds else 0.0,
+        'products_per_second': round(products / wall_seconds, 1) if wall_seconds else 0.0,
+        'phase_seconds': {phase: round(timer.seconds[phase], 3) for phase in PHASES},
+        'error': error,
+    }
+
+
+def format_result(result: dict) -> str:
+    phases = ', '.join(f"{phase} {seconds:.2f}s" for phase, seconds in result['phase_seconds'].items())
+    line = (
+        f"{result['fetcher']:<9} stores {result['stores'] - result['failed_stores']}/{result['stores']}  "
+        f"pages {result['pages']:>5}  requests {result['requests']:>5} "
+        f"({result['injected_errors']} errors, {result['injected_challenges']} challenges)  "
+        f"products {result['products']:>7}  {result['wall_seconds']:.2f}s  "
+        f"{result['requests_per_second']:.1f} req/s  {result['products_per_second']:.1f} products/s\n"
+        f"{'':<9} thread seconds: {phases}"
+    )
+    if result['error']:
+        line += f"\n{'':<9} failed: {result['error']}"
+    return line
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the fetchers against a local stand-in of the retailer APIs")
+    parser.add_argument("--fetcher", choices=sorted(FETCHERS), action="append",
+                        help="fetcher to benchmark (repeatable, default all)")
+    parser.add_argument("--stores", type=int, default=2, help="stores per fetcher (default 2)")
+    parser.add_argument("--concurrency", type=int, help="<prefix>_MAX_CONCURRENCY for both fetchers")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per fetcher (default 1)")
+    parser.add_argument("--db", action="store_true", help="COPY into the staging tables of the DB_* database")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    results = []
+    with StandInServer(config_from_arguments(args)) as server:
+        configure_environment(server, args.stores, args.concurrency)
+        for name in args.fetcher or sorted(FETCHERS):
+            for _ in range(args.repeat):
+                result = run_benchmark(name, server, args.db)
+                results.append(result)
+                if not args.json:
+                    print(format_result(result))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
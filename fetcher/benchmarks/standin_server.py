@@ -0,0 +1,290 @@
+"""
+Local stand-in for the retailer APIs, for benchmarking the fetchers without touching the real shops.
+Serves the K-ruoka product-search REST endpoint and the S-kaupat GraphQL endpoint with synthetic
+products, or with products cloned from recorded responses, and can add latency, HTTP 503 errors and
+Cloudflare challenge pages.
+
+Usage (from the repo root):
+    python -m fetcher.benchmarks.standin_server --port 8099 --products 2000 --latency-ms 40
+    K_RUOKA_BASE_URL=http://127.0.0.1:8099 S_KAUPAT_API_URL=http://127.0.0.1:8099/graphql ...
+"""
+import argparse
+import copy
+import json
+import random
+import threading
+import time
+import zlib
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Optional
+from urllib.parse import parse_qs, urlparse
+
+K_RUOKA_PATH_PREFIX = '/kr-api/v2/product-search/'
+S_KAUPAT_PATH = '/graphql'
+
+_BRANDS = ('Juhla Mokka', 'Presidentti', 'Kulta Katriina', 'Paulig', 'Löfbergs', 'Arvid Nordquist')
+
+CHALLENGE_PAGE = (
+    '<!DOCTYPE html><html><head><title>Just a moment...</title></head>'
+    '<body><div id="challenge-platform"></div></body></html>'
+)
+
+
+@dataclass
+class StandInConfig:
+    #products every store returns; pages per store = products / page_size (rounded up)
+    products_per_store: int = 500
+    #most items one page holds, whatever limit the fetcher asks for
+    page_size: int = 100
+    #delay added to every response, uniformly varied by +-latency_jitter_ms
+    latency_ms: float = 0.0
+    latency_jitter_ms: float = 0.0
+    #share of requests answered with HTTP 503 / with a Cloudflare challenge page
+    error_rate: float = 0.0
+    challenge_rate: float = 0.0
+    seed: int = 0
+    #items of recorded responses (K-ruoka 'result' / S-kaupat 'items') used as templates instead of synthetic ones
+    k_ruoka_samples: list[dict] = field(default_factory=list)
+    s_kaupat_samples: list[dict] = field(default_factory=list)
+
+
+def load_samples(path: Path) -> list[dict]:
+    """Product items of a recorded K-ruoka (result) or S-kaupat (data.store.products.items) response"""
+    data = json.loads(path.read_text())
+    if 'result' in data:
+        return data['result']
+    return data['data']['store']['products']['items']
+
+
+def _price(store_id: str, index: int) -> float:
+    # deterministic per store and product, so repeated runs return identical data
+    return round(3.5 + zlib.crc32(f"{store_id}/{index}".encode()) % 700 / 100, 2)
+
+
+def k_ruoka_item(config: StandInConfig, store_id: str, index: int) -> dict:
+    if config.k_ruoka_samples:
+        item = copy.deepcopy(config.k_ruoka_samples[index % len(config.k_ruoka_samples)])
+        item['id'] = f"{item.get('id', 'sample')}-{index}"
+        return item
+    price = _price(store_id, index)
+    pricing = {'normal': {'unit': 'kpl', 'price': price}}
+    if index % 5 == 0:
+        pricing['batch'] = {
+            'price': round(price * 0.8, 2), 'discountPercentage': 20,
+            'discountType': 'batch', 'validNumberOfDaysLeft': 3,
+        }
+    return {
+        'id': f"{index:013d}",
+        'product': {
+            'localizedName': {'finnish': f"Suodatinkahvi {index} 500g", 'english': f"Filter coffee {index} 500g"},
+            'availability': {'store': True, 'web': index % 3 != 0},
+            'productAttributes': {
+                'measurements': {'netWeight': 0.5, 'contentUnit': 'kg'},
+                'image': {'url': f"https://example.invalid/{index}.jpg"},
+            },
+            'brand': {'name': _BRANDS[index % len(_BRANDS)]},
+            'mobilescan': {'pricing': pricing},
+        },
+    }
+
+
+def s_kaupat_item(config: StandInConfig, store_id: str, index: int) -> dict:
+    if config.s_kaupat_samples:
+        item = copy.deepcopy(config.s_kaupat_samples[index % len(config.s_kaupat_samples)])
+        item['id'] = f"{item.get('id', 'sample')}-{index}"
+        return item
+    price = _price(store_id, index)
+    return {
+        'id': f"{6400000000000 + index}",
+        'name': f"Suodatinkahvi {index} 500g",
+        'price': price,
+        'comparisonPrice': round(price * 2, 2),
+        'comparisonUnit': 'KGM',
+        'brandName': _BRANDS[index % len(_BRANDS)],
+        'pricing': {
+            'regularPrice': price,
+            'campaignPrice': round(price * 0.85, 2) if index % 4 == 0 else None,
+            'comparisonUnit': 'KGM',
+        },
+    }
+
+
+def _s_kaupat_indexes(config: StandInConfig, term: str) -> range:
+    # the second search term finds a quarter of the products again, like the real overlapping searches
+    if term == 'suodatinjauhatus':
+        return range(0, config.products_per_store, 4)
+    return range(config.products_per_store)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: 'StandInServer'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: str, content_type: str = 'application/json'):
+        data = body.encode()
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        path = urlparse(self.path)
+        if path.path.startswith(K_RUOKA_PATH_PREFIX):
+            kind = 'k-ruoka'
+        elif path.path in (S_KAUPAT_PATH, '/'):
+            kind = 's-kaupat'
+        else:
+            self._send(404, json.dumps({'error': f"unknown path {path.path}"}))
+            return
+
+        fault = self.server.next_fault(kind)
+        if fault == 'error':
+            self._send(503, json.dumps({'error': 'injected failure'}))
+        elif fault == 'challenge':
+            self._send(403, CHALLENGE_PAGE, 'text/html; charset=UTF-8')
+        elif kind == 'k-ruoka':
+            self._send(200, json.dumps(self.server.k_ruoka_page(parse_qs(path.query))))
+        else:
+            self._send(200, json.dumps(self.server.s_kaupat_page(json.loads(body or b'{}'))))
+
+
+class StandInServer(ThreadingHTTPServer):
+    """
+    The stand-in, serving on a background thread between start() and stop() (or as a context manager).
+    stats counts requests and injected faults per API.
+    """
+    daemon_threads = True
+
+    def __init__(self, config: StandInConfig, host: str = '127.0.0.1', port: int = 0):
+        super().__init__((host, port), _Handler)
+        self.config = config
+        self.stats: dict[str, dict[str, int]] = {
+            kind: {'requests': 0, 'errors': 0, 'challenges': 0} for kind in ('k-ruoka', 's-kaupat')
+        }
+        self._random = random.Random(config.seed)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def env(self) -> dict[str, str]:
+        """Environment variables that point both fetchers at this server"""
+        return {'K_RUOKA_BASE_URL': self.url, 'S_KAUPAT_API_URL': f"{self.url}{S_KAUPAT_PATH}"}
+
+    def next_fault(self, kind: str) -> Optional[str]:
+        """Counts the request, sleeps the configured latency and draws the fault to inject (if any)"""
+        config = self.config
+        with self._lock:
+            stats = self.stats[kind]
+            stats['requests'] += 1
+            draw = self._random.random()
+            jitter = self._random.uniform(-config.latency_jitter_ms, config.latency_jitter_ms)
+            fault = None
+            if draw < config.error_rate:
+                fault = 'error'
+                stats['errors'] += 1
+            elif draw < config.error_rate + config.challenge_rate:
+                fault = 'challenge'
+                stats['challenges'] += 1
+        delay = max(0.0, config.latency_ms + jitter) / 1000
+        if delay:
+            time.sleep(delay)
+        return fault
+
+    def k_ruoka_page(self, query: dict[str, list[str]]) -> dict:
+        store_id = query.get('storeId', [''])[0]
+        offset = int(query.get('offset', ['0'])[0])
+        limit = min(int(query.get('limit', ['100'])[0]), self.config.page_size)
+        end = min(offset + limit, self.config.products_per_store)
+        return {
+            'totalHits': self.config.products_per_store,
+            'result': [k_ruoka_item(self.config, store_id, index) for index in range(offset, end)],
+        }
+
+    def s_kaupat_page(self, payload: dict) -> dict:
+        variables = payload.get('variables', {})
+        store_id = str(variables.get('storeId', ''))
+        indexes = _s_kaupat_indexes(self.config, variables.get('queryString') or '')
+        offset = int(variables.get('from') or 0)
+        limit = min(int(variables.get('limit') or 24), self.config.page_size)
+        return {'data': {'store': {'products': {
+            'total': len(indexes),
+            'items': [s_kaupat_item(self.config, store_id, index) for index in indexes[offset:offset + limit]],
+        }}}}
+
+    def start(self) -> 'StandInServer':
+        self._thread = threading.Thread(target=self.serve_forever, name='standin-server', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def __enter__(self) -> 'StandInServer':
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def add_config_arguments(parser: argparse.ArgumentParser):
+    """Stand-in options shared by this script and run_benchmarks"""
+    parser.add_argument("--products", type=int, default=500, help="products per store (default 500)")
+    parser.add_argument("--page-size", type=int, default=100, help="most items per page (default 100)")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="delay added to every response")
+    parser.add_argument("--latency-jitter-ms", type=float, default=0.0, help="+- random variation of the delay")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with HTTP 503")
+    parser.add_argument("--challenge-rate", type=float, default=0.0,
+                        help="share of requests answered with a Cloudflare challenge page")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the fault injection")
+    parser.add_argument("--k-ruoka-sample", type=Path, help="recorded K-ruoka response whose items are replayed")
+    parser.add_argument("--s-kaupat-sample", type=Path, help="recorded S-kaupat response whose items are replayed")
+
+
+def config_from_arguments(args: argparse.Namespace) -> StandInConfig:
+    return StandInConfig(
+        products_per_store=args.products,
+        page_size=args.page_size,
+        latency_ms=args.latency_ms,
+        latency_jitter_ms=args.latency_jitter_ms,
+        error_rate=args.error_rate,
+        challenge_rate=args.challenge_rate,
+        seed=args.seed,
+        k_ruoka_samples=load_samples(args.k_ruoka_sample) if args.k_ruoka_sample else [],
+        s_kaupat_samples=load_samples(args.s_kaupat_sample) if args.s_kaupat_sample else [],
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve stand-in K-ruoka and S-kaupat APIs for benchmarking")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    server = StandInServer(config_from_arguments(args), args.host, args.port)
+    for name, value in server.env().items():
+        print(f"{name}={value}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
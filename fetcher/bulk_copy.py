@@ -0,0 +1,77 @@
+import datetime
+import decimal
+import io
+from typing import Iterable, Iterator, Sequence
+
+# Rows are encoded this many at a time while COPY pulls data, so a load never holds more than one
+# chunk of encoded text in memory no matter how many records the iterable yields
+ROWS_PER_CHUNK = 1000
+
+_TEXT_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+
+
+def _copy_text_value(value) -> str:
+    """One field in COPY text format: \\N for NULL, t/f for booleans, bytea as hex, control characters escaped"""
+    if value is None:
+        return '\\N'
+    if value is True:
+        return 't'
+    if value is False:
+        return 'f'
+    if isinstance(value, (int, float, decimal.Decimal)):
+        return str(value)
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, (bytes, memoryview)):
+        # bytea hex format, its backslash escaped for COPY
+        return '\\\\x' + bytes(value).hex()
+    return str(value).translate(_TEXT_ESCAPES)
+
+
+class CopyTextStream(io.RawIOBase):
+    """
+    Read-only file object over an iterable of row tuples, producing COPY text format on demand.
+    cursor.copy_expert() reads it in fixed size blocks, so records are encoded lazily, a chunk at a time.
+    """
+
+    def __init__(self, records: Iterable[Sequence]):
+        self._records: Iterator[Sequence] = iter(records)
+        self._buffer = b''
+        self._offset = 0
+        self.row_count = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def _fill(self) -> bool:
+        lines = []
+        for record in self._records:
+            lines.append('\t'.join(_copy_text_value(value) for value in record))
+            if len(lines) >= ROWS_PER_CHUNK:
+                break
+        if not lines:
+            return False
+        self.row_count += len(lines)
+        self._buffer = ('\n'.join(lines) + '\n').encode()
+        self._offset = 0
+        return True
+
+    def readinto(self, target) -> int:
+        if self._offset >= len(self._buffer) and not self._fill():
+            return 0
+        size = min(len(target), len(self._buffer) - self._offset)
+        target[:size] = self._buffer[self._offset:self._offset + size]
+        self._offset += size
+        return size
+
+
+def copy_records(cur, table: str, columns: Sequence[str], records: Iterable[Sequence]) -> int:
+    """
+    Streams records (tuples in the order of columns) into table with COPY FROM STDIN.
+
+    Returns:
+        int: number of rows copied.
+    """
+    stream = CopyTextStream(records)
+    cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", stream)
+    return stream.row_count
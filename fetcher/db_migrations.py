@@ -0,0 +1,126 @@
+import hashlib
+import importlib.util
+import logging
+import os
+import re
+from pathlib import Path
+
+import psycopg2
+
+logger = logging.getLogger("db-migrations")
+
+# db/migrations at the repo root (copied to /app/db/migrations in the fetcher image)
+MIGRATIONS_DIR = Path(os.environ.get(
+    'MIGRATIONS_DIR',
+    Path(__file__).resolve().parent.parent / 'db' / 'migrations'
+))
+
+# Arbitrary constant key, so concurrently starting processes apply migrations one at a time
+MIGRATION_LOCK_KEY = 4_206_001
+
+_MIGRATION_FILE_PATTERN = re.compile(r'^V(\d+)__(\w+)\.(sql|py)$')
+
+
+class MigrationError(Exception):
+    """Raised when the migrations directory is inconsistent (e.g. duplicate version numbers)."""
+    pass
+
+
+def discover_migrations(migrations_dir: Path = MIGRATIONS_DIR) -> list[tuple[int, str, Path]]:
+    """
+    Lists migration files named V<version>__<name>.sql (or .py, see _run_python_migration), ordered by version.
+
+    Returns:
+        list[tuple[int, str, Path]]: (version, name, path) for every migration file.
+    """
+    migrations: dict[int, tuple[int, str, Path]] = {}
+    for path in sorted(migrations_dir.iterdir()):
+        match = _MIGRATION_FILE_PATTERN.match(path.name)
+        if not match:
+            continue
+        version = int(match.group(1))
+        if version in migrations:
+            raise MigrationError(f"Duplicate migration version {version}: {migrations[version][2].name} and {path.name}")
+        migrations[version] = (version, match.group(2), path)
+    return [migrations[version] for version in sorted(migrations)]
+
+
+def _run_python_migration(conn, path: Path):
+    """
+    Runs a .py migration: a module with a migrate(conn) function, for data changes that cannot be
+    written in SQL. It must not commit, apply_migrations commits it together with its schema_migrations row.
+    """
+    spec = importlib.util.spec_from_file_location(f"migration_{path.stem}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    module.migrate(conn)
+
+
+def apply_migrations(conn, migrations_dir: Path = MIGRATIONS_DIR) -> list[str]:
+    """
+    Applies every migration that is not yet recorded in schema_migrations, in version order.
+    Each migration runs in its own transaction together with its schema_migrations row,
+    so a failing migration leaves the schema at the previous version.
+
+    Returns:
+        list[str]: names of the migrations applied by this call.
+    """
+    applied_now: list[str] = []
+    with conn.cursor() as cur:
+        cur.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_KEY,))
+        try:
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    version INTEGER PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    checksum TEXT NOT NULL,
+                    applied_ts TIMESTAMP NOT NULL DEFAULT now()
+                )
+            """)
+            cur.execute("SELECT version, checksum FROM schema_migrations")
+            already_applied: dict[int, str] = dict(cur.fetchall())
+            conn.commit()
+
+            for version, name, path in discover_migrations(migrations_dir):
+                sql = path.read_text()
+                checksum = hashlib.sha256(sql.encode()).hexdigest()
+                if version in already_applied:
+                    if already_applied[version] != checksum:
+                        logger.warning(f"Migration {path.name} has changed after it was applied")
+                    continue
+
+                logger.info(f"Applying migration {path.name}")
+                try:
+                    if path.suffix == '.py':
+                        _run_python_migration(conn, path)
+                    else:
+                        cur.execute(sql)
+                    cur.execute(
+                        "INSERT INTO schema_migrations (version, name, checksum) VALUES (%s, %s, %s)",
+                        (version, name, checksum)
+                    )
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    logger.exception(f"Migration {path.name} failed, schema left at the previous version")
+                    raise
+                applied_now.append(path.name)
+        finally:
+            cur.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_KEY,))
+            conn.commit()
+
+    return applied_now
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s [%(name)s] %(message)s")
+    connection = psycopg2.connect(
+        host=os.environ['DB_HOST'],
+        database=os.environ['DB_NAME'],
+        user=os.environ['DB_USER'],
+        password=os.environ['DB_PASSWORD']
+    )
+    try:
+        print(apply_migrations(connection) or "Schema is up to date.")
+    finally:
+        connection.close()
@@ -1,15 +1,17 @@
+from fetcher.fetcher_main import run_fetcher
 from fetcher.fetchers.kesko_fetcher import KRuokaFetcher
 from unit_tests import test_postgres_existence
 
 def orchestrate_price_fetch_and_insert():
-    """Runs fetch_and_insert of every fetcher we have (defined in the list)"""
+    """
+    Runs the initial load or update of every fetcher we have (defined in the list), one after another.
+    Set K_RUOKA_BASE_URL / S_KAUPAT_API_URL to run against the benchmark stand-in server instead of the shops.
+    """
     fetchers: list = [KRuokaFetcher()]
     all_results: list[str] = []
     for fetcher in fetchers:
-        try:
-            all_results.append(fetcher.fetch_and_insert())
-        except Exception as e:
-            print(f"Error in {type(fetcher).__name__}: {e}")
+        result = run_fetcher(fetcher)
+        all_results.append(f"{result.fetcher}: {result.status} ({result.operation}) {result.message}")
     return all_results
 
 if __name__ == "__main__":
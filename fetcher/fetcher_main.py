@@ -1,10 +1,16 @@
 import time
 import os
 import logging
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from dataclasses import dataclass, field
+from typing import Optional
 import psycopg2
 
 from fetcher.fetchers.kesko_fetcher import KRuokaFetcher
 from fetcher.fetchers.s_ryhma_fetcher import SRyhmaFetcher
+from fetcher.db_migrations import apply_migrations
+from fetcher.partition_maintenance import maintain_partitions
+from fetcher.scheduler import FetchScheduler
 from unit_tests import test_postgres_existence
 
 # Configure logging to stdout (Docker captures this)
@@ -15,6 +21,46 @@ logging.basicConfig(
 )
 logger = logging.getLogger("orchestrator")
 
+#wall-clock budget of one fetcher's fetch + load, after which it is cancelled
+FETCHER_TIMEOUT_SECONDS = float(os.environ.get('FETCHER_TIMEOUT_SECONDS', '1800'))
+#how long a cancelled fetcher gets to notice the cancellation and roll back
+CANCEL_GRACE_SECONDS = 30
+
+#runs that ignored their cancellation past the grace period, by fetcher name; the fetcher is skipped
+#while its abandoned thread (still holding a db connection and its retailer session) is alive
+_abandoned_runs: dict[str, Future] = {}
+
+
+@dataclass
+class FetcherResult:
+    """Outcome of one fetcher within a cycle"""
+    fetcher: str
+    status: str  # 'ok', 'failed', 'timed_out' or 'skipped'
+    operation: Optional[str] = None  # 'init' or 'update', None if it failed before deciding
+    message: str = ''
+    duration_seconds: float = 0.0
+    changes: Optional[int] = None  # LoadResult.changed_rows of a successful run
+
+
+@dataclass
+class CycleSummary:
+    """Per-fetcher results of one fetch/update cycle"""
+    results: list[FetcherResult] = field(default_factory=list)
+    duration_seconds: float = 0.0
+
+    @property
+    def failed(self) -> list[str]:
+        return [result.fetcher for result in self.results if result.status != 'ok']
+
+    def __str__(self) -> str:
+        lines = [f"{len(self.results)} fetchers in {self.duration_seconds:.1f}s, failed: {self.failed or 'none'}"]
+        for result in self.results:
+            lines.append(
+                f"  {result.fetcher}: {result.status} ({result.operation or '-'}, "
+                f"{result.duration_seconds:.1f}s) {result.message}"
+            )
+        return "\n".join(lines)
+
 def wait_for_postgres(max_retries=10, delay=2):
     """Helper method that verifies that the postgres db is up and running before executing anything else"""
     for i in range(max_retries):
@@ -33,33 +79,137 @@ def wait_for_postgres(max_retries=10, delay=2):
             time.sleep(delay)
     raise Exception("❌ PostgreSQL connection failed after retries.")
 
-def orchestrate_init_or_update(fetchers_to_run: list):
-    """Runs fetch_and_insert of every fetcher we have (defined in the list)"""
-    all_results: list[str] = []
-    for fetcher in fetchers_to_run:
+def migrate_schema():
+    """Brings the db schema up to date with db/migrations before any fetcher touches it"""
+    conn = psycopg2.connect(
+        host=os.environ['DB_HOST'],
+        database=os.environ['DB_NAME'],
+        user=os.environ['DB_USER'],
+        password=os.environ['DB_PASSWORD']
+    )
+    try:
+        applied = apply_migrations(conn)
+        if applied:
+            logger.info(f"Applied schema migrations: {applied}")
+    finally:
+        conn.close()
+
+def run_partition_maintenance():
+    """Pre-creates upcoming partitions and archives expired ones (see fetcher/partition_maintenance.py)"""
+    conn = psycopg2.connect(
+        host=os.environ['DB_HOST'],
+        database=os.environ['DB_NAME'],
+        user=os.environ['DB_USER'],
+        password=os.environ['DB_PASSWORD']
+    )
+    try:
+        logger.info(maintain_partitions(conn))
+    finally:
+        conn.close()
+
+def run_fetcher(fetcher) -> FetcherResult:
+    """Runs the initial load or the update of one fetcher and closes its db connection afterwards"""
+    fetcher_name = type(fetcher).__name__
+    operation = None
+    started = time.monotonic()
+    try:
+        if fetcher.target_tbl_has_existing_data():
+            operation = 'update'
+            result = fetcher.run_update()
+            logger.info(f"Update operation for {fetcher_name}: {result}")
+        else:
+            operation = 'init'
+            result = fetcher.init_fetch_and_insert()
+            logger.info(f"Initial insert operation for {fetcher_name}: {result}")
+        return FetcherResult(
+            fetcher_name, 'ok', operation, str(result), time.monotonic() - started, result.changed_rows
+        )
+    except Exception as e:
+        if fetcher.is_cancelled():
+            logger.warning(f"{fetcher_name} was cancelled: {e}")
+            return FetcherResult(fetcher_name, 'timed_out', operation, str(e), time.monotonic() - started)
+        logger.exception(f"Error during process for {fetcher_name}: {e}")
+        return FetcherResult(fetcher_name, 'failed', operation, str(e), time.monotonic() - started)
+    finally:
+        fetcher.close_connection()
+
+def orchestrate_init_or_update(fetchers_to_run: list, timeout_seconds: float = FETCHER_TIMEOUT_SECONDS) -> CycleSummary:
+    """
+    Runs every fetcher (defined in the list) in parallel, each on its own thread and db connection,
+    so the cycle takes as long as the slowest fetcher. A fetcher still running timeout_seconds after
+    the start is cancelled (see BaseProductFetcher.cancel) and reported as timed out. One that does not
+    stop within CANCEL_GRACE_SECONDS is abandoned and reported as skipped until its thread exits.
+    """
+    started = time.monotonic()
+    deadline = started + timeout_seconds
+    summary = CycleSummary()
+    if not fetchers_to_run:
+        return summary
+
+    results: list[Optional[FetcherResult]] = [None] * len(fetchers_to_run)
+    to_run: list[tuple[int, object]] = []
+    for index, fetcher in enumerate(fetchers_to_run):
         fetcher_name = type(fetcher).__name__
-        try:
-            if fetcher.target_tbl_has_existing_data():
-                result = fetcher.run_update()
-                logger.info(f"Update operation for {fetcher_name}: {result}")
-            else:
-                result = fetcher.init_fetch_and_insert()
-                logger.info(f"Initial insert operation for {fetcher_name}: {result}")
-            all_results.append(result)
-        except Exception as e:
-            logger.exception(f"Error during process for {fetcher_name}: {e}")
-    return all_results
+        abandoned = _abandoned_runs.get(fetcher_name)
+        if abandoned is not None and not abandoned.done():
+            logger.error(f"{fetcher_name} is skipped: its previous run is still running after being cancelled")
+            fetcher.close_connection()
+            results[index] = FetcherResult(
+                fetcher_name, 'skipped', message="previous run still running after cancellation"
+            )
+            continue
+        _abandoned_runs.pop(fetcher_name, None)
+        to_run.append((index, fetcher))
+
+    if to_run:
+        executor = ThreadPoolExecutor(max_workers=len(to_run), thread_name_prefix="fetcher")
+        futures = [(index, fetcher, executor.submit(run_fetcher, fetcher)) for index, fetcher in to_run]
+        for index, fetcher, future in futures:
+            fetcher_name = type(fetcher).__name__
+            try:
+                result = future.result(timeout=max(0.0, deadline - time.monotonic()))
+            except FuturesTimeoutError:
+                logger.error(f"{fetcher_name} exceeded its {timeout_seconds:.0f}s deadline, cancelling it")
+                fetcher.cancel()
+                try:
+                    result = future.result(timeout=CANCEL_GRACE_SECONDS)
+                except FuturesTimeoutError:
+                    logger.error(
+                        f"{fetcher_name} did not stop within {CANCEL_GRACE_SECONDS}s of being cancelled, "
+                        f"it is not run again until its thread exits"
+                    )
+                    _abandoned_runs[fetcher_name] = future
+                    result = FetcherResult(
+                        fetcher_name, 'timed_out', message="did not stop after cancellation",
+                        duration_seconds=time.monotonic() - started,
+                    )
+            results[index] = result
+        # never block the next cycle on a fetcher that ignores its cancellation
+        executor.shutdown(wait=False)
+
+    summary.results = results
+    summary.duration_seconds = time.monotonic() - started
+    return summary
+
+def connect_db():
+    return psycopg2.connect(
+        host=os.environ['DB_HOST'],
+        database=os.environ['DB_NAME'],
+        user=os.environ['DB_USER'],
+        password=os.environ['DB_PASSWORD']
+    )
+
+def prepare_cycle():
+    """Runs before every scheduler iteration: the db must be up and its schema current"""
+    wait_for_postgres(max_retries=10, delay=2)
+    migrate_schema()
 
 if __name__ == "__main__":
-    while True:
-        logger.info("🔁 Starting new fetch/update cycle...")
-        try:
-            wait_for_postgres(max_retries=10, delay=2)
-            fetchers = [KRuokaFetcher(), SRyhmaFetcher()]
-            fetchers_results = orchestrate_init_or_update(fetchers)
-            logger.info(f"Cycle completed with results: {fetchers_results}")
-        except Exception as e:
-            logger.exception(f"❌ Error during orchestration cycle: {e}")
-
-        logger.info("⏳ Sleeping for 12 hours...")
-        time.sleep(60 * 60 * 12)
+    scheduler = FetchScheduler(
+        [KRuokaFetcher, SRyhmaFetcher],
+        run_cycle=orchestrate_init_or_update,
+        connect=connect_db,
+        prepare=prepare_cycle,
+        maintenance=run_partition_maintenance,
+    )
+    scheduler.run_forever()
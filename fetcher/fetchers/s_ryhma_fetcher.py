@@ -1,15 +1,10 @@
-import json
+import itertools
 import os
-import datetime
 import logging
-import hashlib
-
-from curl_cffi import requests as cffi_requests
-
-import psycopg2
-from psycopg2.extras import execute_values
+from typing import Iterator
 
 from fetcher.base_fetcher import BaseProductFetcher, FetchResponseValidationError
+from fetcher.product_record import Computed, Const, Path, ProductRecord
 
 # Configure logging to stdout (Docker captures this)
 logging.basicConfig(
@@ -24,33 +19,37 @@ class SRyhmaFetcher(BaseProductFetcher):
     """
     Fetcher for S-ryhmä (S-kaupat) product data.
     
-    Requires the S_KAUPAT_STORE_ID environment variable to be set.
-    This is the numeric store ID used by the S-kaupat GraphQL API to scope product searches.
+    Requires the S_KAUPAT_STORE_IDS (comma separated) or S_KAUPAT_STORE_ID environment variable to be set.
+    These are the numeric store IDs used by the S-kaupat GraphQL API to scope product searches.
     Store IDs can be found on s-kaupat.fi store pages or via their searchStores API.
     Note: S-kaupat may rotate store IDs periodically — update the env var if fetches start failing.
+    S_KAUPAT_MAX_CONCURRENCY / S_KAUPAT_REQUESTS_PER_SECOND limit how hard the API is hit.
     """
     category: str = 'suodatinkahvi'
     _data_source: str = 'S-ryhma'
-
-    def target_tbl_has_existing_data(self) -> bool:
-        """
-        Checks if there are existing rows in the products_and_prices table 
-        for the S-Ryhma data source.
-        
-        Returns:
-            bool: True if there are existing S-Ryhma rows (>0), False if no rows (0)
-        """
-        check_query = f"""
-            SELECT COUNT(*) 
-            FROM products_and_prices 
-            WHERE tonno_data_source = '{self._data_source}'
-        """
-        
-        with self._conn.cursor() as cur:
-            cur.execute(check_query)
-            count = cur.fetchone()[0]
-        
-        return count > 0
+    _env_prefix: str = 'S_KAUPAT'
+    #items requested per GraphQL page (the web shop uses 24); offsets follow what the API really returns
+    _page_size: int = 100
+    _field_mapping = {
+        'id': Path('id'),
+        'name_finnish': Path('name'),
+        'name_english': Path('name'),
+        'available_store': Const(True),
+        'available_web': Const(None),
+        'net_weight': Computed(
+            lambda price, comparison_price: float(price) / float(comparison_price),
+            Path('price'), Path('comparisonPrice'),
+        ),
+        'content_unit': Path('comparisonUnit'),
+        'image_url': Const('not available in S-ryhma'),
+        'brand_name': Path('brandName'),
+        'normal_price_unit': Path('pricing', 'comparisonUnit'),
+        'normal_price': Path('pricing', 'regularPrice'),
+        'batch_price': Path('pricing', 'campaignPrice'),
+        'batch_discount_pct': Const(None),
+        'batch_discount_type': Const(None),
+        'batch_days_left': Const(None),
+    }
 
     def validate_fetch_response(self, response) -> dict:
         """
@@ -112,50 +111,25 @@ class SRyhmaFetcher(BaseProductFetcher):
 
         return data
 
-    def _extract_product_data(self, json_data: dict):
-        extracted_data: list = []
-    
-        for item in json_data['data']['store']['products']['items']:
-            #product: dict = item['product']
-            
-            extracted_item = {
-                'id': item.get('id'),
-                'name_finnish': item.get('name'),
-                'name_english': item.get('name'),
-                'available_store': True,
-                #'available_store': item.get('storeId'),
-                #'available_web': product.get('availability', {}).get('web'),
-                'available_web': None,
-                'net_weight': float(item.get('price')) / float(item.get('comparisonPrice')),
-                'content_unit': item.get('comparisonUnit'),
-                'image_url': 'not available in S-ryhma',
-                'brand_name': item.get('brandName'),
-                'normal_price_unit': item.get('pricing', {}).get('comparisonUnit'),
-                'normal_price': item.get('pricing', {}).get('regularPrice'),
-                'batch_price': item.get('pricing', {}).get('campaignPrice'),
-                'batch_discount_pct': None,
-                'batch_discount_type': None,
-                'batch_days_left': None
-            }
-            
-            extracted_data.append(extracted_item)
-        
-        return extracted_data
+    def _extract_product_data(self, json_data: dict) -> list[ProductRecord]:
+        return [self._extract_product(item) for item in json_data['data']['store']['products']['items']]
 
-    def _get_store_id(self) -> str:
-        """Returns the S-kaupat store ID from the S_KAUPAT_STORE_ID environment variable."""
-        store_id = os.environ.get('S_KAUPAT_STORE_ID')
-        if not store_id:
+    def _get_store_ids(self) -> list[str]:
+        """Returns the S-kaupat store IDs from S_KAUPAT_STORE_IDS, falling back to the single S_KAUPAT_STORE_ID."""
+        raw_store_ids = os.environ.get('S_KAUPAT_STORE_IDS') or os.environ.get('S_KAUPAT_STORE_ID') or ''
+        store_ids = [store_id.strip() for store_id in raw_store_ids.split(',') if store_id.strip()]
+        if not store_ids:
             raise ValueError(
-                "S_KAUPAT_STORE_ID environment variable is not set. "
-                "Set it to the desired S-kaupat store ID (e.g. '513971200' for Prisma Kaari Kannelmäki)."
+                "Neither S_KAUPAT_STORE_IDS nor S_KAUPAT_STORE_ID environment variable is set. "
+                "Set it to the desired S-kaupat store ID(s) (e.g. '513971200' for Prisma Kaari Kannelmäki)."
             )
-        logger.info(f"Using S-kaupat store ID: {store_id}")
-        return store_id
+        logger.info(f"Using S-kaupat store IDs: {store_ids}")
+        return store_ids
 
-    def _fetch_prices(self):
-        base_url = "https://api.s-kaupat.fi/"
-        store_id = self._get_store_id()
+    def _fetch_page(self, store_id: str, term: str, offset: int) -> dict:
+        """Fetches and validates one page of search results for a term in a store"""
+        #S_KAUPAT_API_URL points the fetcher at another GraphQL endpoint, e.g. the benchmark stand-in server
+        base_url = os.environ.get('S_KAUPAT_API_URL', 'https://api.s-kaupat.fi/')
 
         headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:140.0) Gecko/20100101 Firefox/140.0',
@@ -193,271 +167,57 @@ class SRyhmaFetcher(BaseProductFetcher):
             }
         """
 
-        # The inline GraphQL API does not support OR syntax in queryString,
-        # so we search each term separately and deduplicate by product ID.
-        search_terms = ["suodatinkahvi", "suodatinjauhatus"]
-        seen_ids = set()
-        all_data = []
-
-        for term in search_terms:
-            offset = 0
-            limit = 24
-
-            while True:
-                payload = {
-                    "operationName": "RemoteFilteredProducts",
-                    "variables": {
-                        "storeId": store_id,
-                        "queryString": term,
-                        "limit": limit,
-                        "from": offset
-                    },
-                    "query": graphql_query
-                }
-
-                # Using curl_cffi with Firefox TLS fingerprint impersonation to bypass Cloudflare
-                response = cffi_requests.post(base_url, headers=headers, json=payload, impersonate="firefox")
-                logger.info(f"API call (term='{term}', offset={offset}) response code: {response.status_code}")
-
-                json_data = self.validate_fetch_response(response)
-                product_data = self._extract_product_data(json_data)
-
-                # Deduplicate across search terms
-                for product in product_data:
-                    if product['id'] not in seen_ids:
-                        seen_ids.add(product['id'])
-                        all_data.append(product)
-
-                # Pagination check
-                product_info = json_data["data"]["store"]["products"]
-                total = product_info["total"]
-                received = len(product_info["items"])
-                offset += received
-
-                logger.info(f"S-Ryhma API [{term}], fetched {received} products, unique so far: {len(all_data)}")
-
-                if offset >= total:
-                    break
-
-        return all_data
-
-    def _insert_init_prices(self, conn, product_data: list[dict]) -> str:
-        "Initial insert product data into products_and_prices table"
-        if not product_data:
-            return "No products to insert."
-
-        insert_query = """
-            INSERT INTO products_and_prices (
-                id, name_finnish, name_english, available_store, available_web,
-                net_weight, content_unit, image_url, brand_name,
-                normal_price_unit, normal_price, batch_price,
-                batch_discount_pct, batch_discount_type, batch_days_left,
-                tonno_data_source, tonno_load_ts, tonno_end_ts,
-                tonno_row_hash
-            ) VALUES %s
-            ON CONFLICT (id, tonno_load_ts) DO NOTHING
-        """
-
-        records: list[tuple] = []
-        for item in product_data:
-            # Calculate the hash for each row
-            hash_input = '||'.join([
-                str(item.get('id', 'null')),
-                str(item.get('name_finnish', 'null')),
-                str(item.get('name_english', 'null')),
-                str(item.get('available_store', 'false')),
-                str(item.get('available_web', 'false')),
-                str(item.get('net_weight', '0')),
-                str(item.get('content_unit', 'null')),
-                str(item.get('image_url', 'null')),
-                str(item.get('brand_name', 'null')),
-                str(item.get('normal_price_unit', 'null')),
-                str(item.get('normal_price', '0')),
-                str(item.get('batch_price', '0')),
-                str(item.get('batch_discount_pct', '0')),
-                str(item.get('batch_discount_type', 'null')),
-                str(item.get('batch_days_left', '0'))
-            ])
-            
-            row_hash = hashlib.sha256(hash_input.encode()).hexdigest()
+        payload = {
+            "operationName": "RemoteFilteredProducts",
+            "variables": {
+                "storeId": store_id,
+                "queryString": term,
+                "limit": self._page_size,
+                "from": offset
+            },
+            "query": graphql_query
+        }
 
-            records.append((
-                item['id'], item['name_finnish'], item['name_english'],
-                item['available_store'], item['available_web'],
-                item['net_weight'], item['content_unit'], item['image_url'],
-                item['brand_name'], item['normal_price_unit'], item['normal_price'],
-                item['batch_price'], item['batch_discount_pct'],
-                item['batch_discount_type'], item['batch_days_left'],
-                self._data_source,  # tonno_data_source (constant value)
-                datetime.datetime.now(),  # tonno_load_ts (current time)
-                None,  # tonno_end_ts (NULL)
-                row_hash  # tonno_row_hash
-            ))
+        # RetailerSession uses curl_cffi with Firefox TLS fingerprint impersonation to bypass Cloudflare
+        response = self._post(base_url, headers=headers, json=payload)
+        logger.info(f"API call (store={store_id}, term='{term}', offset={offset}) response code: {response.status_code}")
 
-        with conn.cursor() as cur:
-            execute_values(cur, insert_query, records)
-        conn.commit()
+        return self.validate_fetch_response(response)
 
-        return f"Attempted to insert {len(records)} products (duplicates skipped)."
-    
-    def _update_prices(self, conn, product_data: list[dict]) -> str:
+    def _iter_store_products(self, store_id: str) -> Iterator[list[ProductRecord]]:
         """
-        Updates product data in the target table using a slowly changing dimension + row_hash.
-        1. Marks existing rows as historical only if the incoming row differs (row_hash mismatch).
-        2. Marks rows no longer present in the source as historical.
-        3. Inserts incoming rows as new current rows (only those with changed hash or new ids).
+        Yields the products of a store matching any of the search terms, page by page. The first page of
+        each term is fetched concurrently; its total and item count give all remaining offsets, which are
+        then fetched concurrently as well and yielded as they arrive. A product found by both terms is
+        staged once (see _stream_to_staging).
         """
-        if not product_data:
-            return "No product data from source, no updates performed."
-
-        update_ts = datetime.datetime.now()
-        incoming_ids = tuple(item['id'] for item in product_data)
-
-        # Calculate row_hash for each item in Python
-        for item in product_data:
-            hash_input = '||'.join([
-                str(item.get('id', 'null')),
-                str(item.get('name_finnish', 'null')),
-                str(item.get('name_english', 'null')),
-                str(item.get('available_store', 'false')),
-                str(item.get('available_web', 'false')),
-                str(item.get('net_weight', '0')),
-                str(item.get('content_unit', 'null')),
-                str(item.get('image_url', 'null')),
-                str(item.get('brand_name', 'null')),
-                str(item.get('normal_price_unit', 'null')),
-                str(item.get('normal_price', '0')),
-                str(item.get('batch_price', '0')),
-                str(item.get('batch_discount_pct', '0')),
-                str(item.get('batch_discount_type', 'null')),
-                str(item.get('batch_days_left', '0'))
-            ])
-            item['tonno_row_hash'] = hashlib.sha256(hash_input.encode()).hexdigest()
-
-        with conn.cursor() as cur:
-            # Create a temp table to hold incoming rows + their row_hash
-            cur.execute("""
-                CREATE TEMP TABLE incoming_products (
-                    id TEXT,
-                    name_finnish TEXT,
-                    name_english TEXT,
-                    available_store BOOLEAN,
-                    available_web BOOLEAN,
-                    net_weight NUMERIC,
-                    content_unit TEXT,
-                    image_url TEXT,
-                    brand_name TEXT,
-                    normal_price_unit TEXT,
-                    normal_price NUMERIC,
-                    batch_price NUMERIC,
-                    batch_discount_pct NUMERIC,
-                    batch_discount_type TEXT,
-                    batch_days_left INT,
-                    tonno_row_hash TEXT
-                ) ON COMMIT DROP;
-            """)
-
-            # Insert all incoming rows into the temp table with pre-calculated row_hash
-            insert_temp_query = """
-                INSERT INTO incoming_products (
-                    id, name_finnish, name_english, available_store, available_web,
-                    net_weight, content_unit, image_url, brand_name,
-                    normal_price_unit, normal_price, batch_price,
-                    batch_discount_pct, batch_discount_type, batch_days_left,
-                    tonno_row_hash
-                )
-                VALUES %s
-            """
-            records_for_temp = [
-                (
-                    item['id'], item['name_finnish'], item['name_english'],
-                    item['available_store'], item['available_web'],
-                    item['net_weight'], item['content_unit'], item['image_url'],
-                    item['brand_name'], item['normal_price_unit'], item['normal_price'],
-                    item['batch_price'], item['batch_discount_pct'],
-                    item['batch_discount_type'], item['batch_days_left'],
-                    item['tonno_row_hash']  # Use the pre-calculated hash
-                )
-                for item in product_data
-            ]
-            execute_values(cur, insert_temp_query, records_for_temp)
-
-            # Count current rows in DB for comparison logging
-            cur.execute(
-                "SELECT COUNT(*) FROM products_and_prices WHERE tonno_end_ts IS NULL AND tonno_data_source = %s",
-                (self._data_source,)
-            )
-            existing_count = cur.fetchone()[0]
-            logger.info(
-                f"Comparing {len(product_data)} incoming products against {existing_count} existing active rows"
-            )
-
-            # 1. Mark old versions as historical only where hash differs
-            update_existing_query = """
-                UPDATE products_and_prices p
-                SET tonno_end_ts = %s
-                FROM incoming_products i
-                WHERE 
-                    p.id = i.id
-                    AND p.tonno_end_ts IS NULL
-                    AND p.tonno_data_source = %s
-                    AND p.tonno_row_hash IS DISTINCT FROM i.tonno_row_hash;
-            """
-            cur.execute(update_existing_query, (update_ts, self._data_source))
-            updated_count = cur.rowcount
-
-            # 2. Mark disappeared products as historical
-            update_disappeared_query = """
-                UPDATE products_and_prices
-                SET tonno_end_ts = %s
-                WHERE 
-                    id NOT IN %s AND
-                    tonno_end_ts IS NULL AND
-                    tonno_data_source = %s;
-            """
-            cur.execute(update_disappeared_query, (update_ts, incoming_ids, self._data_source))
-            disappeared_count = cur.rowcount
+        # The inline GraphQL API does not support OR syntax in queryString,
+        # so we search each term separately; products are deduplicated by ID when staged.
+        search_terms = ["suodatinkahvi", "suodatinjauhatus"]
 
-            # 3. Insert only changed or new rows
-            insert_query = """
-                INSERT INTO products_and_prices (
-                    id, name_finnish, name_english, available_store, available_web,
-                    net_weight, content_unit, image_url, brand_name,
-                    normal_price_unit, normal_price, batch_price,
-                    batch_discount_pct, batch_discount_type, batch_days_left,
-                    tonno_data_source, tonno_load_ts, tonno_end_ts, tonno_row_hash
+        first_pages = self._fetch_concurrently(lambda term: self._fetch_page(store_id, term, 0), search_terms)
+
+        # Plan the rest from what the API actually returned: it may cap the page size below _page_size
+        remaining: list[tuple[str, int]] = []
+        for term, page in zip(search_terms, first_pages):
+            product_info = page["data"]["store"]["products"]
+            total = product_info["total"]
+            received = len(product_info["items"])
+            if received == 0 and total > 0:
+                raise FetchResponseValidationError(
+                    f"S-kaupat API returned no items for '{term}' although total is {total}"
                 )
-                SELECT
-                    i.id, i.name_finnish, i.name_english, i.available_store, i.available_web,
-                    i.net_weight, i.content_unit, i.image_url, i.brand_name,
-                    i.normal_price_unit, i.normal_price, i.batch_price,
-                    i.batch_discount_pct, i.batch_discount_type, i.batch_days_left,
-                    %s, %s, NULL, i.tonno_row_hash
-                FROM incoming_products i
-                LEFT JOIN products_and_prices p
-                ON p.id = i.id
-                AND p.tonno_end_ts IS NULL
-                AND p.tonno_data_source = %s
-                WHERE p.id IS NULL OR p.tonno_row_hash IS DISTINCT FROM i.tonno_row_hash;
-            """
-            cur.execute(insert_query, (self._data_source, update_ts, self._data_source))
-            inserted_count = cur.rowcount
-
-        conn.commit()
+            logger.info(f"S-Ryhma API [{store_id}/{term}], total {total}, {received} per page")
+            if received:
+                remaining.extend((term, offset) for offset in range(received, total, received))
 
-        unchanged_count = len(product_data) - inserted_count
-        return (f"Price update complete. Incoming: {len(product_data)}, "
-                f"Unchanged: {unchanged_count}, Inserted: {inserted_count}, "
-                f"Updated (new version): {updated_count}, "
-                f"Disappeared: {disappeared_count}.")
+        pages = itertools.chain(first_pages, self._iter_concurrently(
+            lambda term_offset: self._fetch_page(store_id, *term_offset), remaining
+        ))
 
-    
-    def init_fetch_and_insert(self):
-        """Performs both fetch + insert operations, returns some description string of the operation end result from insert"""
-        fetched_data: list[dict] = self._fetch_prices()
-        return self._insert_init_prices(self._conn, fetched_data)
+        page_count = 0
+        for page in pages:
+            page_count += 1
+            yield self._extract_product_data(page)
 
-    def run_update(self):
-        """Performs a scheduled fetch and update of prices."""
-        fetched_data: list[dict] = self._fetch_prices()
-        return self._update_prices(self._conn, fetched_data)
+        logger.info(f"S-Ryhma API [{store_id}], fetched {page_count} pages")
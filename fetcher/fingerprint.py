@@ -0,0 +1,52 @@
+import decimal
+import hashlib
+from typing import Iterable
+
+# 128 bits: far beyond any chance of collision between versions of one product, 16 bytes per row
+FINGERPRINT_BYTES = 16
+
+_NULL, _TRUE, _FALSE, _NUMBER, _TEXT = b'\x00', b'\x01', b'\x02', b'\x03', b'\x04'
+
+
+def _canonical_number(value) -> str:
+    """
+    Plain decimal text of a number without exponent or trailing zeros, so 5, 5.0 and Decimal('5.00')
+    (as the APIs and the numeric columns may give the same price) encode the same
+    """
+    number = value if isinstance(value, decimal.Decimal) else decimal.Decimal(str(value))
+    if not number.is_finite():
+        return str(number)
+    if number.is_zero():
+        return '0'
+    return format(number.normalize(), 'f')
+
+
+def _encode(value) -> bytes:
+    """Type tag + value; text and numbers are length prefixed so field boundaries cannot shift"""
+    if value is None:
+        return _NULL
+    if value is True:
+        return _TRUE
+    if value is False:
+        return _FALSE
+    if isinstance(value, (int, float, decimal.Decimal)):
+        data = _canonical_number(value).encode()
+        tag = _NUMBER
+    else:
+        data = str(value).encode()
+        tag = _TEXT
+    return tag + len(data).to_bytes(4, 'big') + data
+
+
+def row_fingerprint(values: Iterable) -> bytes:
+    """
+    BLAKE2b-128 over a typed, ordered encoding of values. None, False, 0 and '' all hash differently,
+    numbers hash by value (see _canonical_number), and the order of values matters.
+
+    Returns:
+        bytes: FINGERPRINT_BYTES long digest, stored as bytea (tonno_row_hash).
+    """
+    digest = hashlib.blake2b(digest_size=FINGERPRINT_BYTES)
+    for value in values:
+        digest.update(_encode(value))
+    return digest.digest()
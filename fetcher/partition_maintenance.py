@@ -0,0 +1,113 @@
+import datetime
+import logging
+import os
+import re
+from typing import Optional
+
+logger = logging.getLogger("partition-maintenance")
+
+PARENT_TABLE = 'products_and_prices'
+_PARTITION_NAME_PATTERN = re.compile(rf'^{PARENT_TABLE}_(\d{{4}})_(\d{{2}})$')
+
+
+def ensure_partitions(cur, *timestamps: datetime.datetime):
+    """Creates the monthly products_and_prices partitions covering the given load timestamps (no-op if they exist)"""
+    for month_start in sorted({ts.replace(day=1, hour=0, minute=0, second=0, microsecond=0) for ts in timestamps}):
+        cur.execute("SELECT ensure_products_and_prices_partition(%s)", (month_start,))
+
+
+def _add_months(month_start: datetime.date, months: int) -> datetime.date:
+    month_index = month_start.year * 12 + month_start.month - 1 + months
+    return datetime.date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def list_partitions(cur) -> list[tuple[str, datetime.date]]:
+    """
+    Lists the attached monthly partitions of products_and_prices.
+
+    Returns:
+        list[tuple[str, datetime.date]]: (partition name, first day of its month), oldest first.
+    """
+    cur.execute("""
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = %s::regclass
+    """, (PARENT_TABLE,))
+    partitions = []
+    for (name,) in cur.fetchall():
+        match = _PARTITION_NAME_PATTERN.match(name)
+        if match:
+            partitions.append((name, datetime.date(int(match.group(1)), int(match.group(2)), 1)))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
+def archive_old_partitions(conn, retention_months: int, archive_tablespace: Optional[str] = None) -> list[str]:
+    """
+    Archives partitions whose whole month lies more than retention_months before the current month.
+
+    With archive_tablespace set the partition stays attached and is moved to that (cheaper) tablespace,
+    otherwise it is detached from products_and_prices and left as a standalone table. Partitions that
+    still hold open SCD rows (tonno_end_ts IS NULL) are skipped: those rows are current prices of
+    products that have not changed since that month.
+
+    Returns:
+        list[str]: names of the partitions archived by this call.
+    """
+    cutoff = _add_months(datetime.date.today().replace(day=1), -retention_months)
+    archived: list[str] = []
+
+    with conn.cursor() as cur:
+        for name, month_start in list_partitions(cur):
+            if _add_months(month_start, 1) > cutoff:
+                break
+
+            cur.execute(f'SELECT EXISTS (SELECT 1 FROM "{name}" WHERE tonno_end_ts IS NULL)')
+            if cur.fetchone()[0]:
+                logger.info(f"Keeping partition {name}: it still holds current (open) rows")
+                continue
+
+            if archive_tablespace:
+                cur.execute(
+                    "SELECT tablespace FROM pg_tables WHERE schemaname = current_schema() AND tablename = %s",
+                    (name,)
+                )
+                if cur.fetchone()[0] == archive_tablespace:
+                    continue
+                cur.execute(f'ALTER TABLE "{name}" SET TABLESPACE "{archive_tablespace}"')
+                logger.info(f"Moved partition {name} to tablespace {archive_tablespace}")
+            else:
+                cur.execute(f'ALTER TABLE {PARENT_TABLE} DETACH PARTITION "{name}"')
+                logger.info(f"Detached partition {name} from {PARENT_TABLE}")
+            conn.commit()
+            archived.append(name)
+
+    return archived
+
+
+def maintain_partitions(conn) -> str:
+    """
+    Periodic partition upkeep, run by the orchestrator after every cycle:
+    1. Pre-creates the partitions for this and next month, so loads never wait on DDL at a month boundary.
+    2. Archives old partitions when PARTITION_RETENTION_MONTHS is set (optionally moving them to
+       PARTITION_ARCHIVE_TABLESPACE instead of detaching).
+    3. ANALYZEs the parent table; autovacuum analyzes each partition but never the partitioned parent.
+    """
+    now = datetime.datetime.now()
+    with conn.cursor() as cur:
+        next_month = _add_months(now.date().replace(day=1), 1)
+        ensure_partitions(cur, now, datetime.datetime.combine(next_month, datetime.time()))
+    conn.commit()
+
+    archived: list[str] = []
+    retention_months = os.environ.get('PARTITION_RETENTION_MONTHS')
+    if retention_months:
+        archived = archive_old_partitions(
+            conn, int(retention_months), os.environ.get('PARTITION_ARCHIVE_TABLESPACE') or None
+        )
+
+    with conn.cursor() as cur:
+        cur.execute(f"ANALYZE {PARENT_TABLE}")
+    conn.commit()
+
+    return f"Partition maintenance complete. Archived: {archived or 'none'}."
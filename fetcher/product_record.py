@@ -0,0 +1,145 @@
+from dataclasses import dataclass, fields
+from operator import attrgetter
+from typing import Any, Callable, Optional
+
+
+@dataclass(slots=True)
+class ProductRecord:
+    """
+    One product of one store as extracted by a fetcher (see compile_mapping). The product attributes are in
+    the column order of products_and_prices; tonno_store_id and tonno_row_hash are set by the load.
+    """
+    id: Optional[str]
+    name_finnish: Optional[str]
+    name_english: Optional[str]
+    available_store: Optional[bool]
+    available_web: Optional[bool]
+    net_weight: Optional[float]
+    content_unit: Optional[str]
+    image_url: Optional[str]
+    brand_name: Optional[str]
+    normal_price_unit: Optional[str]
+    normal_price: Optional[float]
+    batch_price: Optional[float]
+    batch_discount_pct: Optional[float]
+    batch_discount_type: Optional[str]
+    batch_days_left: Optional[int]
+    tonno_store_id: Optional[str] = None
+    tonno_row_hash: Optional[bytes] = None
+
+    def product_values(self) -> tuple:
+        """The product attributes (PRODUCT_COLUMNS) plus tonno_store_id, the input of the row hash"""
+        return _product_values(self)
+
+    def staging_row(self) -> tuple:
+        """Row of the incoming_products staging table: PRODUCT_COLUMNS, tonno_store_id, tonno_row_hash"""
+        return _staging_row(self)
+
+
+#attributes of a product as extracted by the fetchers, in the column order of products_and_prices
+PRODUCT_COLUMNS = tuple(field.name for field in fields(ProductRecord))[:-2]
+STAGING_COLUMNS = PRODUCT_COLUMNS + ('tonno_store_id', 'tonno_row_hash')
+
+_product_values = attrgetter(*PRODUCT_COLUMNS, 'tonno_store_id')
+_staging_row = attrgetter(*STAGING_COLUMNS)
+
+
+@dataclass(frozen=True)
+class Path:
+    """Value at a chain of keys in the raw JSON item (or in the value of source); None if any key is missing"""
+    keys: tuple
+    source: Optional['FieldSpec'] = None
+
+    def __init__(self, *keys: str, source: Optional['FieldSpec'] = None):
+        object.__setattr__(self, 'keys', keys)
+        object.__setattr__(self, 'source', source)
+
+
+@dataclass(frozen=True)
+class FirstOf:
+    """Value of the first spec that is not None"""
+    specs: tuple
+
+    def __init__(self, *specs: 'FieldSpec'):
+        object.__setattr__(self, 'specs', specs)
+
+
+@dataclass(frozen=True)
+class Computed:
+    """func applied to the values of specs"""
+    func: Callable
+    specs: tuple
+
+    def __init__(self, func: Callable, *specs: 'FieldSpec'):
+        object.__setattr__(self, 'func', func)
+        object.__setattr__(self, 'specs', specs)
+
+
+@dataclass(frozen=True)
+class Const:
+    """The same value for every item"""
+    value: Any
+
+
+FieldSpec = Path | FirstOf | Computed | Const
+Accessor = Callable[[dict], Any]
+
+
+def _compile_keys(keys: tuple) -> Accessor:
+    if len(keys) == 1:
+        key = keys[0]
+        return lambda data: data.get(key) if isinstance(data, dict) else None
+
+    def get(data):
+        for key in keys:
+            if not isinstance(data, dict):
+                return None
+            data = data.get(key)
+        return data
+    return get
+
+
+def compile_spec(spec: FieldSpec) -> Accessor:
+    """Turns a field spec into a function of the raw JSON item"""
+    if isinstance(spec, Path):
+        get = _compile_keys(spec.keys)
+        if spec.source is None:
+            return get
+        source = compile_spec(spec.source)
+        return lambda item: get(source(item))
+    if isinstance(spec, FirstOf):
+        accessors = [compile_spec(inner) for inner in spec.specs]
+
+        def first(item):
+            for accessor in accessors:
+                value = accessor(item)
+                if value is not None:
+                    return value
+            return None
+        return first
+    if isinstance(spec, Computed):
+        func = spec.func
+        accessors = [compile_spec(inner) for inner in spec.specs]
+        return lambda item: func(*[accessor(item) for accessor in accessors])
+    if isinstance(spec, Const):
+        value = spec.value
+        return lambda item: value
+    raise TypeError(f"Unknown field spec {spec!r}")
+
+
+def compile_mapping(mapping: dict[str, FieldSpec]) -> Callable[[dict], ProductRecord]:
+    """
+    Compiles a retailer's declarative mapping (one spec per PRODUCT_COLUMNS field) into a function that
+    turns a raw JSON item into a ProductRecord. Done once at import, so a mapping missing a field or naming
+    an unknown one fails right away.
+    """
+    missing = [column for column in PRODUCT_COLUMNS if column not in mapping]
+    unknown = [column for column in mapping if column not in PRODUCT_COLUMNS]
+    if missing or unknown:
+        raise ValueError(f"Field mapping does not match ProductRecord: missing {missing}, unknown {unknown}")
+
+    accessors = [compile_spec(mapping[column]) for column in PRODUCT_COLUMNS]
+
+    def extract(item: dict) -> ProductRecord:
+        return ProductRecord(*[accessor(item) for accessor in accessors])
+    return extract
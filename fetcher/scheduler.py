@@ -0,0 +1,296 @@
+import datetime
+import logging
+import os
+import random
+import re
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional, Union
+
+logger = logging.getLogger("scheduler")
+
+# Used when a fetcher has no <prefix>_SCHEDULE; equal to the fixed cadence the service had before
+DEFAULT_SCHEDULE = '12h'
+# Number of latest successful runs adaptive polling looks at
+ADAPTIVE_WINDOW = 3
+# Adaptive polling never stretches an interval more than this
+ADAPTIVE_MAX_FACTOR = 4.0
+# Pause before retrying when a scheduler iteration itself fails (e.g. the db is down)
+ERROR_RETRY_SECONDS = 60
+
+_INTERVAL_PATTERN = re.compile(r'^(\d+(?:\.\d+)?)\s*([smhd]?)$')
+_UNIT_SECONDS = {'': 1, 's': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+@dataclass(frozen=True)
+class IntervalSchedule:
+    """Runs every `interval` after the end of the previous run"""
+    interval: datetime.timedelta
+
+    def next_after(self, ts: datetime.datetime, factor: float = 1.0) -> datetime.datetime:
+        return ts + self.interval * factor
+
+
+def _parse_cron_field(text: str, low: int, high: int) -> frozenset[int]:
+    values: set[int] = set()
+    for part in text.split(','):
+        step = 1
+        if '/' in part:
+            part, step_text = part.split('/', 1)
+            step = int(step_text)
+        if part == '*':
+            start, end = low, high
+        elif '-' in part:
+            start_text, end_text = part.split('-', 1)
+            start, end = int(start_text), int(end_text)
+        else:
+            start = int(part)
+            end = high if step > 1 else start
+        if step < 1 or start < low or end > high or start > end:
+            raise ValueError(f"Invalid cron field '{text}' (allowed {low}-{high})")
+        values.update(range(start, end + 1, step))
+    return frozenset(values)
+
+
+@dataclass(frozen=True)
+class CronSchedule:
+    """
+    Minimal five field cron expression: minute hour day-of-month month day-of-week, with `*`, lists,
+    ranges and `/step`. Day-of-week 0 and 7 are Sunday. As in cron, when both day fields are
+    restricted a day matches if either does.
+    """
+    minutes: frozenset[int]
+    hours: frozenset[int]
+    days: frozenset[int]
+    months: frozenset[int]
+    weekdays: frozenset[int]
+    any_day: bool
+    any_weekday: bool
+
+    @classmethod
+    def parse(cls, expression: str) -> 'CronSchedule':
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression '{expression}' must have 5 fields")
+        weekdays = _parse_cron_field(fields[4], 0, 7)
+        return cls(
+            minutes=_parse_cron_field(fields[0], 0, 59),
+            hours=_parse_cron_field(fields[1], 0, 23),
+            days=_parse_cron_field(fields[2], 1, 31),
+            months=_parse_cron_field(fields[3], 1, 12),
+            weekdays=frozenset(day % 7 for day in weekdays),
+            any_day=fields[2] == '*',
+            any_weekday=fields[4] == '*',
+        )
+
+    def _day_matches(self, ts: datetime.datetime) -> bool:
+        day_ok = ts.day in self.days
+        weekday_ok = (ts.weekday() + 1) % 7 in self.weekdays
+        if self.any_day or self.any_weekday:
+            return day_ok and weekday_ok
+        return day_ok or weekday_ok
+
+    def next_after(self, ts: datetime.datetime, factor: float = 1.0) -> datetime.datetime:
+        """First matching minute after ts (factor is ignored: cron times are fixed)"""
+        candidate = ts.replace(second=0, microsecond=0) + datetime.timedelta(minutes=1)
+        limit = candidate + datetime.timedelta(days=366 * 5)
+        while candidate < limit:
+            if candidate.month not in self.months or not self._day_matches(candidate):
+                candidate = candidate.replace(hour=0, minute=0) + datetime.timedelta(days=1)
+            elif candidate.hour not in self.hours:
+                candidate = candidate.replace(minute=0) + datetime.timedelta(hours=1)
+            elif candidate.minute not in self.minutes:
+                candidate += datetime.timedelta(minutes=1)
+            else:
+                return candidate
+        raise ValueError("Cron expression never matches")
+
+
+Schedule = Union[IntervalSchedule, CronSchedule]
+
+
+def parse_schedule(text: str) -> Schedule:
+    """Parses an interval ('90s', '30m', '6h', '1d', plain seconds) or a five field cron expression"""
+    match = _INTERVAL_PATTERN.match(text.strip())
+    if match:
+        seconds = float(match.group(1)) * _UNIT_SECONDS[match.group(2)]
+        if seconds <= 0:
+            raise ValueError(f"Schedule interval must be positive, got '{text}'")
+        return IntervalSchedule(datetime.timedelta(seconds=seconds))
+    return CronSchedule.parse(text)
+
+
+def adaptive_factor(recent_changes: list[int], busy_threshold: int) -> float:
+    """
+    Multiplier for a source's polling interval from the changed row counts of its latest successful
+    runs (newest first): sources whose last ADAPTIVE_WINDOW runs changed nothing are polled 2x (then 4x)
+    less often, sources averaging at least busy_threshold changed rows twice as often.
+    """
+    window = recent_changes[:ADAPTIVE_WINDOW]
+    if len(window) < ADAPTIVE_WINDOW:
+        return 1.0
+    idle_streak = next((i for i, changes in enumerate(recent_changes) if changes), len(recent_changes))
+    if idle_streak >= ADAPTIVE_WINDOW:
+        return min(ADAPTIVE_MAX_FACTOR, 2.0 ** (idle_streak // ADAPTIVE_WINDOW))
+    if sum(window) / len(window) >= busy_threshold:
+        return 0.5
+    return 1.0
+
+
+@dataclass
+class ScheduledFetcher:
+    """A fetcher class with its schedule; next_run is None until planned from fetch_runs"""
+    fetcher_class: type
+    schedule: Schedule
+    jitter_seconds: float
+    next_run: Optional[datetime.datetime] = None
+
+    @property
+    def data_source(self) -> str:
+        return self.fetcher_class._data_source
+
+
+class FetchScheduler:
+    """
+    Runs each fetcher on its own schedule, read from <prefix>_SCHEDULE (interval or cron, default 12h)
+    with up to <prefix>_JITTER_SECONDS (default 300) of random delay, so retailers are not hit at the
+    exact same moment every time.
+
+    Every run is recorded in fetch_runs. On start (and after every run) a source's next run is planned
+    from its last recorded run, so runs missed while the service was down are caught up with a single
+    immediate run. With ADAPTIVE_POLLING=1 (default) interval schedules are stretched for sources that
+    keep returning identical data and shortened for busy ones (see adaptive_factor).
+
+    Args:
+        fetcher_classes: BaseProductFetcher subclasses; instantiated (one db connection each) when due.
+        run_cycle: runs a list of fetcher instances and returns a summary whose .results line up with them.
+        connect: returns a new psycopg2 connection for the scheduler's own bookkeeping.
+        prepare: called before each iteration (wait for the db, apply migrations).
+        maintenance: called after runs, at most every maintenance_interval.
+    """
+
+    def __init__(
+        self,
+        fetcher_classes: list[type],
+        run_cycle: Callable[[list], object],
+        connect: Callable[[], object],
+        prepare: Optional[Callable[[], None]] = None,
+        maintenance: Optional[Callable[[], None]] = None,
+        maintenance_interval: datetime.timedelta = datetime.timedelta(hours=12),
+    ):
+        self._entries = [
+            ScheduledFetcher(
+                fetcher_class,
+                parse_schedule(os.environ.get(f'{fetcher_class._env_prefix}_SCHEDULE', DEFAULT_SCHEDULE)),
+                float(os.environ.get(f'{fetcher_class._env_prefix}_JITTER_SECONDS', '300')),
+            )
+            for fetcher_class in fetcher_classes
+        ]
+        self._run_cycle = run_cycle
+        self._connect = connect
+        self._prepare = prepare
+        self._maintenance = maintenance
+        self._maintenance_interval = maintenance_interval
+        self._last_maintenance: Optional[datetime.datetime] = None
+        self._adaptive = os.environ.get('ADAPTIVE_POLLING', '1') == '1'
+        self._busy_threshold = int(os.environ.get('ADAPTIVE_BUSY_CHANGES', '10'))
+
+    def _recent_runs(self, cur, data_source: str) -> tuple[Optional[datetime.datetime], list[int]]:
+        """(end of the last run, changed row counts of the latest successful runs, newest first)"""
+        cur.execute("""
+            SELECT finished_ts, status, change_count
+            FROM fetch_runs
+            WHERE tonno_data_source = %s
+            ORDER BY started_ts DESC
+            LIMIT %s
+        """, (data_source, ADAPTIVE_WINDOW * 4))
+        rows = cur.fetchall()
+        last_finished = rows[0][0] if rows else None
+        changes = [change_count for _, status, change_count in rows if status == 'ok' and change_count is not None]
+        return last_finished, changes
+
+    def _plan(self, cur, entry: ScheduledFetcher, now: datetime.datetime) -> datetime.datetime:
+        last_finished, recent_changes = self._recent_runs(cur, entry.data_source)
+        if last_finished is None:
+            logger.info(f"{entry.data_source}: no previous run recorded, running now")
+            return now
+
+        factor = adaptive_factor(recent_changes, self._busy_threshold) if self._adaptive else 1.0
+        due = entry.schedule.next_after(last_finished, factor)
+        if due <= now:
+            # however many runs were missed, catch up with one run right away
+            logger.info(f"{entry.data_source}: run due at {due:%Y-%m-%d %H:%M} was missed, running now")
+            return now
+        return due + datetime.timedelta(seconds=random.uniform(0, entry.jitter_seconds))
+
+    def _record(self, cur, entry: ScheduledFetcher, started_at: datetime.datetime, result):
+        cur.execute("""
+            INSERT INTO fetch_runs (
+                tonno_data_source, started_ts, finished_ts, status, operation, change_count, message
+            ) VALUES (%s, %s, %s, %s, %s, %s, %s)
+            ON CONFLICT (tonno_data_source, started_ts) DO NOTHING
+        """, (
+            entry.data_source, started_at, started_at + datetime.timedelta(seconds=result.duration_seconds),
+            result.status, result.operation, result.changes, result.message[:2000],
+        ))
+
+    def run_once(self, now: Optional[datetime.datetime] = None) -> list[str]:
+        """
+        Plans unplanned fetchers and runs the ones that are due (in parallel, through run_cycle).
+
+        Returns:
+            list[str]: data sources run by this call.
+        """
+        now = now or datetime.datetime.now()
+        conn = self._connect()
+        try:
+            with conn.cursor() as cur:
+                for entry in self._entries:
+                    if entry.next_run is None:
+                        entry.next_run = self._plan(cur, entry, now)
+
+            due = [entry for entry in self._entries if entry.next_run <= now]
+            if not due:
+                return []
+
+            logger.info(f"🔁 Starting fetch/update cycle for {[entry.data_source for entry in due]}...")
+            summary = self._run_cycle([entry.fetcher_class() for entry in due])
+            logger.info(f"Cycle completed: {summary}")
+
+            with conn.cursor() as cur:
+                for entry, result in zip(due, summary.results):
+                    self._record(cur, entry, now, result)
+                conn.commit()
+                planned_at = datetime.datetime.now()
+                for entry in due:
+                    entry.next_run = self._plan(cur, entry, planned_at)
+                    logger.info(f"{entry.data_source}: next run at {entry.next_run:%Y-%m-%d %H:%M:%S}")
+            return [entry.data_source for entry in due]
+        finally:
+            conn.close()
+
+    def _maybe_run_maintenance(self):
+        now = datetime.datetime.now()
+        if self._maintenance and (
+            self._last_maintenance is None or now - self._last_maintenance >= self._maintenance_interval
+        ):
+            self._maintenance()
+            self._last_maintenance = now
+
+    def run_forever(self):
+        while True:
+            try:
+                if self._prepare:
+                    self._prepare()
+                if self.run_once():
+                    self._maybe_run_maintenance()
+            except Exception as e:
+                logger.exception(f"❌ Error during scheduling iteration: {e}")
+                time.sleep(ERROR_RETRY_SECONDS)
+                continue
+
+            next_entry = min(self._entries, key=lambda entry: entry.next_run)
+            sleep_seconds = max(1.0, (next_entry.next_run - datetime.datetime.now()).total_seconds())
+            logger.info(f"⏳ Next run: {next_entry.data_source} at {next_entry.next_run:%Y-%m-%d %H:%M:%S}, "
+                        f"sleeping {sleep_seconds:.0f}s")
+            time.sleep(sleep_seconds)
@@ -0,0 +1,96 @@
+import datetime
+import decimal
+import unittest
+from unittest import mock
+
+from fetcher import bulk_copy
+from fetcher.bulk_copy import CopyTextStream, _copy_text_value, copy_records
+
+
+class CopyTextValueTest(unittest.TestCase):
+
+    def test_values(self):
+        cases = [
+            (None, '\\N'),
+            (True, 't'),
+            (False, 'f'),
+            (0, '0'),
+            (4.95, '4.95'),
+            (decimal.Decimal('12.50'), '12.50'),
+            (datetime.datetime(2026, 10, 18, 6, 0, 30), '2026-10-18T06:00:30'),
+            (datetime.date(2026, 10, 18), '2026-10-18'),
+            (b'\x00\xab\xff', '\\\\x00abff'),
+            (memoryview(b'\x01'), '\\\\x01'),
+            ('Juhla Mokka', 'Juhla Mokka'),
+            ('', ''),
+        ]
+        for value, expected in cases:
+            with self.subTest(value=value):
+                self.assertEqual(_copy_text_value(value), expected)
+
+    def test_control_characters_are_escaped(self):
+        self.assertEqual(_copy_text_value('a\\b\tc\nd\re'), 'a\\\\b\\tc\\nd\\re')
+
+    def test_null_marker_text_is_not_null(self):
+        self.assertEqual(_copy_text_value('\\N'), '\\\\N')
+
+
+class CopyTextStreamTest(unittest.TestCase):
+
+    def test_rows_are_tab_separated_lines(self):
+        stream = CopyTextStream([('1', None, True), ('2', 'x\ty', 3.5)])
+        self.assertEqual(stream.read(), b'1\t\\N\tt\n2\tx\\ty\t3.5\n')
+        self.assertEqual(stream.row_count, 2)
+
+    def test_empty(self):
+        stream = CopyTextStream([])
+        self.assertEqual(stream.read(), b'')
+        self.assertEqual(stream.row_count, 0)
+
+    def test_small_reads_reassemble_the_rows(self):
+        rows = [(str(i), f'kahvi {i} äö', i * 0.5) for i in range(250)]
+        expected = ''.join(f'{i}\tkahvi {i} äö\t{i * 0.5}\n' for i in range(250)).encode()
+        with mock.patch.object(bulk_copy, 'ROWS_PER_CHUNK', 7):
+            stream = CopyTextStream(rows)
+            chunks = []
+            while chunk := stream.read(13):
+                chunks.append(chunk)
+        self.assertEqual(b''.join(chunks), expected)
+        self.assertEqual(stream.row_count, 250)
+
+    def test_records_are_encoded_lazily(self):
+        consumed = []
+
+        def records():
+            for i in range(10):
+                consumed.append(i)
+                yield (str(i),)
+        with mock.patch.object(bulk_copy, 'ROWS_PER_CHUNK', 3):
+            stream = CopyTextStream(records())
+            self.assertEqual(stream.read(2), b'0\n')
+            self.assertEqual(len(consumed), 3)
+
+
+class _CopyCursor:
+    def __init__(self):
+        self.sql = None
+        self.data = b''
+
+    def copy_expert(self, sql, file, size=8192):
+        self.sql = sql
+        while chunk := file.read(size):
+            self.data += chunk
+
+
+class CopyRecordsTest(unittest.TestCase):
+
+    def test_copies_all_records(self):
+        cur = _CopyCursor()
+        count = copy_records(cur, 'incoming_products', ('id', 'normal_price'), iter([('a', 1.5), ('b', None)]))
+        self.assertEqual(count, 2)
+        self.assertEqual(cur.sql, 'COPY incoming_products (id, normal_price) FROM STDIN')
+        self.assertEqual(cur.data, b'a\t1.5\nb\t\\N\n')
+
+
+if __name__ == '__main__':
+    unittest.main()
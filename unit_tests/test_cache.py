@@ -0,0 +1,77 @@
+import asyncio
+import datetime
+import sys
+import unittest
+from pathlib import Path
+
+# the backend runs from its own directory and imports its modules flat
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'backend'))
+
+from cache import ResponseCache, cache_key
+
+
+class CacheKeyTest(unittest.TestCase):
+
+    def test_order_and_unset_params_do_not_matter(self):
+        self.assertEqual(
+            cache_key('/coffees', brand='Paulig', data_source=None, limit=10),
+            cache_key('/coffees', limit=10, brand='Paulig'),
+        )
+
+    def test_values_and_paths_are_distinct(self):
+        keys = {
+            cache_key('/coffees', limit=10),
+            cache_key('/coffees', limit=20),
+            cache_key('/coffees', store_id='10'),
+            cache_key('/coffees/products', limit=10),
+            cache_key('/coffees', brand='a&limit=10'),
+        }
+        self.assertEqual(len(keys), 5)
+
+    def test_values_are_rendered_canonically(self):
+        self.assertEqual(
+            cache_key('/coffees', since=datetime.datetime(2026, 10, 18, 6, 0)),
+            '/coffees?since=2026-10-18+06%3A00%3A00',
+        )
+
+
+class ResponseCacheTest(unittest.TestCase):
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = ResponseCache(ttl_seconds=60, max_entries=2)
+        cache.set('a', (b'a', {}))
+        cache.set('b', (b'b', {}))
+        cache.get('a')
+        cache.set('c', (b'c', {}))
+
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), (b'a', {}))
+        self.assertEqual(cache.get('c'), (b'c', {}))
+        stats = cache.stats()
+        self.assertEqual((stats['entries'], stats['max_entries'], stats['evictions']), (2, 2, 1))
+
+    def test_replacing_an_entry_does_not_evict(self):
+        cache = ResponseCache(ttl_seconds=60, max_entries=2)
+        cache.set('a', (b'a', {}))
+        cache.set('b', (b'b', {}))
+        cache.set('a', (b'a2', {}))
+        self.assertEqual(cache.stats()['evictions'], 0)
+        self.assertEqual(cache.get('a'), (b'a2', {}))
+
+    def test_expired_entries_miss(self):
+        cache = ResponseCache(ttl_seconds=-1)
+        cache.set('a', (b'a', {}))
+        self.assertIsNone(cache.get('a'))
+
+    def test_get_or_build_skips_bodies_built_before_an_invalidation(self):
+        cache = ResponseCache(ttl_seconds=60)
+
+        async def build():
+            cache.invalidate()
+            return b'stale', {}
+        self.assertEqual(asyncio.run(cache.get_or_build('a', build)), (b'stale', {}))
+        self.assertIsNone(cache.get('a'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import datetime
+import sys
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+
+# the backend runs from its own directory and imports its modules flat
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'backend'))
+
+from conditional import _etag, _not_modified
+
+LAST_MODIFIED = datetime.datetime(2026, 10, 18, 6, 0, 30, 123456, tzinfo=datetime.timezone.utc)
+
+
+def _request(path: str = '/coffees', query: str = '', **headers) -> SimpleNamespace:
+    """The parts of a starlette Request the validators read"""
+    return SimpleNamespace(
+        url=SimpleNamespace(path=path, query=query),
+        headers={name.replace('_', '-'): value for name, value in headers.items()},
+    )
+
+
+class EtagTest(unittest.TestCase):
+
+    def test_weak_and_stable(self):
+        etag = _etag('v1', _request(query='limit=10'))
+        self.assertRegex(etag, r'^W/"[0-9a-f]{20}"$')
+        self.assertEqual(etag, _etag('v1', _request(query='limit=10')))
+
+    def test_depends_on_version_path_and_query(self):
+        etag = _etag('v1', _request(query='limit=10'))
+        self.assertNotEqual(etag, _etag('v2', _request(query='limit=10')))
+        self.assertNotEqual(etag, _etag('v1', _request(query='limit=20')))
+        self.assertNotEqual(etag, _etag('v1', _request('/coffees/products', 'limit=10')))
+
+
+class NotModifiedTest(unittest.TestCase):
+    ETAG = 'W/"0123456789abcdef0123"'
+
+    def test_no_validators(self):
+        self.assertFalse(_not_modified(_request(), self.ETAG, LAST_MODIFIED))
+
+    def test_if_none_match(self):
+        cases = {
+            self.ETAG: True,
+            '"0123456789abcdef0123"': True,  # weak comparison ignores W/
+            f'"other", {self.ETAG}': True,
+            '*': True,
+            '"other"': False,
+            'W/"other"': False,
+        }
+        for header, expected in cases.items():
+            with self.subTest(header):
+                self.assertIs(_not_modified(_request(if_none_match=header), self.ETAG, LAST_MODIFIED), expected)
+
+    def test_if_modified_since(self):
+        cases = {
+            'Sun, 18 Oct 2026 06:00:30 GMT': True,  # second precision, microseconds dropped
+            'Sun, 18 Oct 2026 07:00:00 GMT': True,
+            'Sun, 18 Oct 2026 06:00:29 GMT': False,
+            'not a date': False,
+        }
+        for header, expected in cases.items():
+            with self.subTest(header):
+                self.assertIs(_not_modified(_request(if_modified_since=header), self.ETAG, LAST_MODIFIED), expected)
+
+    def test_if_modified_since_compares_absolute_times(self):
+        # 09:00:30 in Helsinki (UTC+3) is 06:00:30 GMT
+        helsinki = LAST_MODIFIED.astimezone(datetime.timezone(datetime.timedelta(hours=3)))
+        self.assertTrue(_not_modified(_request(if_modified_since='Sun, 18 Oct 2026 06:00:30 GMT'), self.ETAG, helsinki))
+        self.assertFalse(_not_modified(_request(if_modified_since='Sun, 18 Oct 2026 06:00:29 GMT'), self.ETAG, helsinki))
+
+    def test_if_modified_since_without_data(self):
+        request = _request(if_modified_since='Sun, 18 Oct 2026 07:00:00 GMT')
+        self.assertFalse(_not_modified(request, self.ETAG, None))
+
+    def test_if_none_match_takes_precedence(self):
+        request = _request(if_none_match='"other"', if_modified_since='Sun, 18 Oct 2026 07:00:00 GMT')
+        self.assertFalse(_not_modified(request, self.ETAG, LAST_MODIFIED))
+
+
+if __name__ == '__main__':
+    unittest.main()
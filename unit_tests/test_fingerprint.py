@@ -0,0 +1,55 @@
+import decimal
+import unittest
+
+from fetcher.fingerprint import FINGERPRINT_BYTES, _canonical_number, row_fingerprint
+
+ROW = ['6411300000000', 'Juhla Mokka 500g', None, True, False, 0.5, 'kg', None, 'Paulig', 'kpl', 4.95,
+       None, None, None, None, 'N106']
+
+
+class CanonicalNumberTest(unittest.TestCase):
+
+    def test_same_value_same_text(self):
+        cases = {
+            '5': (5, 5.0, decimal.Decimal('5.00'), decimal.Decimal('5E0')),
+            '4.95': (4.95, decimal.Decimal('4.950')),
+            '0': (0, 0.0, -0.0, decimal.Decimal('0.000')),
+            '1500': (1500, decimal.Decimal('1.5E3')),
+            '0.0000001': (1e-7,),
+        }
+        for text, values in cases.items():
+            for value in values:
+                with self.subTest(value=value):
+                    self.assertEqual(_canonical_number(value), text)
+
+
+class RowFingerprintTest(unittest.TestCase):
+
+    def test_size(self):
+        self.assertEqual(len(row_fingerprint(ROW)), FINGERPRINT_BYTES)
+        self.assertEqual(len(row_fingerprint([])), FINGERPRINT_BYTES)
+
+    def test_encoding_is_pinned(self):
+        # stored tonno_row_hash values depend on this: changing the encoding needs a migration re-hashing them
+        self.assertEqual(row_fingerprint(ROW).hex(), '038db2a0226324b874e9216600f571da')
+
+    def test_numbers_hash_by_value(self):
+        self.assertEqual(row_fingerprint(['a', 5]), row_fingerprint(['a', decimal.Decimal('5.00')]))
+        self.assertEqual(row_fingerprint(['a', 4.95]), row_fingerprint(['a', decimal.Decimal('4.950')]))
+        self.assertNotEqual(row_fingerprint(['a', 4.95]), row_fingerprint(['a', 4.96]))
+
+    def test_types_are_distinct(self):
+        values = [None, False, True, 0, 1, '', '0', '1', 'None', 'False']
+        fingerprints = {row_fingerprint([value]) for value in values}
+        self.assertEqual(len(fingerprints), len(values))
+
+    def test_field_boundaries_cannot_shift(self):
+        self.assertNotEqual(row_fingerprint(['ab', 'c']), row_fingerprint(['a', 'bc']))
+        self.assertNotEqual(row_fingerprint(['a', '']), row_fingerprint(['a']))
+
+    def test_order_matters(self):
+        self.assertNotEqual(row_fingerprint(['a', 'b']), row_fingerprint(['b', 'a']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import sys
+import unittest
+from pathlib import Path
+
+# the backend runs from its own directory and imports its modules flat
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'backend'))
+
+from fastapi import HTTPException
+
+from pagination import decode_cursor, encode_cursor, limit_clause, where_clause
+
+
+class CursorTest(unittest.TestCase):
+
+    def test_round_trip(self):
+        values = ['Juhla Mokka 500g', '6411300000000', '726308750']
+        self.assertEqual(decode_cursor(encode_cursor(*values), 3), values)
+
+    def test_cursor_is_url_safe_without_padding(self):
+        # characters whose base64 would contain '+', '/' and '='
+        cursor = encode_cursor('ÿ?>', 'ä~')
+        self.assertNotRegex(cursor, r'[+/=]')
+        self.assertEqual(decode_cursor(cursor, 2), ['ÿ?>', 'ä~'])
+
+    def test_malformed_cursors_are_rejected(self):
+        not_json = encode_cursor('a')[:-3]
+        cases = {
+            'not base64': '!!!',
+            'not json': not_json,
+            'not a list': 'eyJhIjoxfQ',  # {"a":1}
+            'wrong size': encode_cursor('a', 'b'),
+            'not strings': encode_cursor(1, 'b', 'c'),
+        }
+        for name, cursor in cases.items():
+            with self.subTest(name):
+                with self.assertRaises(HTTPException) as raised:
+                    decode_cursor(cursor, 3)
+                self.assertEqual(raised.exception.status_code, 400)
+
+
+class ClauseTest(unittest.TestCase):
+
+    def test_where_clause(self):
+        self.assertEqual(where_clause([]), "")
+        self.assertEqual(where_clause(["a = %s", "b > %s"]), "WHERE a = %s AND b > %s")
+
+    def test_limit_clause_fetches_one_extra_row(self):
+        params: list = []
+        self.assertEqual(limit_clause(None, params), "")
+        self.assertEqual(params, [])
+        self.assertEqual(limit_clause(50, params), "LIMIT %s")
+        self.assertEqual(params, [51])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import unittest
+
+from fetcher.product_record import (
+    PRODUCT_COLUMNS, STAGING_COLUMNS, Computed, Const, FirstOf, Path, ProductRecord, compile_mapping, compile_spec,
+)
+
+ITEM = {
+    'id': '6411300000000',
+    'product': {
+        'name': {'fi': 'Juhla Mokka 500g'},
+        'price': {'normal': 4.95, 'batch': None, 'discount': 3.99},
+        'tags': ['kahvi'],
+    },
+}
+
+
+def _mapping(**overrides) -> dict:
+    mapping = {column: Const(None) for column in PRODUCT_COLUMNS}
+    mapping.update(overrides)
+    return mapping
+
+
+class CompileSpecTest(unittest.TestCase):
+
+    def test_path(self):
+        self.assertEqual(compile_spec(Path('id'))(ITEM), '6411300000000')
+        self.assertEqual(compile_spec(Path('product', 'name', 'fi'))(ITEM), 'Juhla Mokka 500g')
+
+    def test_missing_path_is_none(self):
+        self.assertIsNone(compile_spec(Path('missing'))(ITEM))
+        self.assertIsNone(compile_spec(Path('product', 'missing', 'fi'))(ITEM))
+        # a key into something that is not a dict
+        self.assertIsNone(compile_spec(Path('id', 'x'))(ITEM))
+        self.assertIsNone(compile_spec(Path('product', 'tags', 'x'))(ITEM))
+
+    def test_path_from_source(self):
+        price = Path('product', 'price')
+        self.assertEqual(compile_spec(Path('normal', source=price))(ITEM), 4.95)
+        self.assertIsNone(compile_spec(Path('normal', source=Path('missing')))(ITEM))
+
+    def test_first_of_skips_none(self):
+        spec = FirstOf(Path('product', 'price', 'batch'), Path('product', 'price', 'discount'), Const(0))
+        self.assertEqual(compile_spec(spec)(ITEM), 3.99)
+        self.assertEqual(compile_spec(FirstOf(Path('missing'), Const(False)))(ITEM), False)
+        self.assertIsNone(compile_spec(FirstOf(Path('missing'), Path('product', 'price', 'batch')))(ITEM))
+
+    def test_computed(self):
+        spec = Computed(lambda normal, discount: round(normal - discount, 2),
+                        Path('product', 'price', 'normal'), Path('product', 'price', 'discount'))
+        self.assertEqual(compile_spec(spec)(ITEM), 0.96)
+
+    def test_const(self):
+        self.assertEqual(compile_spec(Const('kpl'))(ITEM), 'kpl')
+        self.assertEqual(compile_spec(Const('kpl'))({}), 'kpl')
+
+    def test_unknown_spec(self):
+        with self.assertRaises(TypeError):
+            compile_spec('id')
+
+
+class CompileMappingTest(unittest.TestCase):
+
+    def test_extracts_a_record_in_column_order(self):
+        extract = compile_mapping(_mapping(
+            id=Path('id'),
+            name_finnish=Path('product', 'name', 'fi'),
+            normal_price=Path('product', 'price', 'normal'),
+            normal_price_unit=Const('kpl'),
+        ))
+        record = extract(ITEM)
+        self.assertIsInstance(record, ProductRecord)
+        self.assertEqual(record.id, '6411300000000')
+        self.assertEqual(record.name_finnish, 'Juhla Mokka 500g')
+        self.assertEqual(record.normal_price, 4.95)
+        self.assertEqual(record.normal_price_unit, 'kpl')
+        self.assertIsNone(record.brand_name)
+        self.assertIsNone(record.tonno_store_id)
+        self.assertIsNone(record.tonno_row_hash)
+
+    def test_missing_field_fails(self):
+        mapping = _mapping()
+        del mapping['brand_name']
+        with self.assertRaisesRegex(ValueError, 'brand_name'):
+            compile_mapping(mapping)
+
+    def test_unknown_field_fails(self):
+        with self.assertRaisesRegex(ValueError, 'brand'):
+            compile_mapping(_mapping(brand=Const('Paulig')))
+
+
+class ProductRecordTest(unittest.TestCase):
+
+    def test_rows(self):
+        record = ProductRecord(*range(len(PRODUCT_COLUMNS)), tonno_store_id='N106', tonno_row_hash=b'\x01')
+        self.assertEqual(record.product_values(), tuple(range(len(PRODUCT_COLUMNS))) + ('N106',))
+        self.assertEqual(record.staging_row(), tuple(range(len(PRODUCT_COLUMNS))) + ('N106', b'\x01'))
+        self.assertEqual(len(record.staging_row()), len(STAGING_COLUMNS))
+
+    def test_slots(self):
+        record = ProductRecord(*[None] * len(PRODUCT_COLUMNS))
+        with self.assertRaises(AttributeError):
+            record.unknown = 1
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,159 @@
+import threading
+import time
+import unittest
+
+from fetcher.base_fetcher import CircuitBreaker, FetchCancelledError, RetailerSession, TokenBucket
+
+
+class _Response:
+    def __init__(self, status_code: int = 200):
+        self.status_code = status_code
+        self.headers = {'content-type': 'application/json'}
+        self.text = '{}'
+
+
+class TokenBucketTest(unittest.TestCase):
+
+    def test_burst_then_waits_for_refill(self):
+        bucket = TokenBucket(rate_per_second=20, capacity=3)
+        started = time.monotonic()
+        for _ in range(3):
+            bucket.acquire()
+        self.assertLess(time.monotonic() - started, 0.03)
+        bucket.acquire()
+        self.assertGreaterEqual(time.monotonic() - started, 0.04)
+
+    def test_zero_rate_never_waits(self):
+        bucket = TokenBucket(rate_per_second=0)
+        started = time.monotonic()
+        for _ in range(1000):
+            bucket.acquire()
+        self.assertLess(time.monotonic() - started, 0.1)
+
+    def test_cancel_stops_waiting(self):
+        bucket = TokenBucket(rate_per_second=0.1)
+        bucket.acquire()
+        cancelled = threading.Event()
+        cancelled.set()
+        started = time.monotonic()
+        bucket.acquire(cancelled)
+        self.assertLess(time.monotonic() - started, 0.1)
+
+
+class CircuitBreakerTest(unittest.TestCase):
+
+    def test_opens_after_threshold_consecutive_challenges(self):
+        breaker = CircuitBreaker(threshold=3, cooldown_seconds=60)
+        self.assertFalse(breaker.record_challenge())
+        self.assertFalse(breaker.record_challenge())
+        self.assertTrue(breaker.record_challenge())
+        self.assertEqual(breaker.before_request(), (False, False))
+
+    def test_success_resets_the_challenge_count(self):
+        breaker = CircuitBreaker(threshold=2, cooldown_seconds=60)
+        breaker.record_challenge()
+        breaker.record_success()
+        self.assertFalse(breaker.record_challenge())
+        self.assertEqual(breaker.before_request(), (True, False))
+
+    def test_half_open_lets_one_trial_through(self):
+        breaker = CircuitBreaker(threshold=1, cooldown_seconds=0)
+        breaker.record_challenge()
+        self.assertEqual(breaker.before_request(), (True, True))
+        self.assertEqual(breaker.before_request(), (False, False))
+
+    def test_challenged_trial_reopens(self):
+        breaker = CircuitBreaker(threshold=1, cooldown_seconds=0.05)
+        breaker.record_challenge()
+        time.sleep(0.06)
+        self.assertEqual(breaker.before_request(), (True, True))
+        self.assertTrue(breaker.record_challenge())
+        self.assertEqual(breaker.before_request(), (False, False))
+
+    def test_successful_trial_closes(self):
+        breaker = CircuitBreaker(threshold=1, cooldown_seconds=0)
+        breaker.record_challenge()
+        self.assertEqual(breaker.before_request(), (True, True))
+        breaker.record_success()
+        self.assertEqual(breaker.before_request(), (True, False))
+        self.assertEqual(breaker.before_request(), (True, False))
+
+    def test_released_trial_allows_another(self):
+        breaker = CircuitBreaker(threshold=1, cooldown_seconds=0)
+        breaker.record_challenge()
+        self.assertEqual(breaker.before_request(), (True, True))
+        breaker.release_trial()
+        self.assertEqual(breaker.before_request(), (True, True))
+
+    def test_only_the_trial_holds_the_trial_slot(self):
+        breaker = CircuitBreaker(threshold=1, cooldown_seconds=60)
+        # granted while the circuit was still closed: not a trial, even if the circuit opens meanwhile
+        self.assertEqual(breaker.before_request(), (True, False))
+        breaker.record_challenge()
+        breaker._opened_at -= 60
+        self.assertEqual(breaker.before_request(), (True, True))
+        self.assertEqual(breaker.before_request(), (False, False))
+
+
+class RetailerSessionCircuitTest(unittest.TestCase):
+
+    def _half_open_session(self, rate_per_second: float = 0) -> RetailerSession:
+        session = RetailerSession('test', rate_per_second=rate_per_second, max_retries=0,
+                                  circuit_threshold=1, circuit_cooldown_seconds=0)
+        self.assertTrue(session._breaker.record_challenge())
+        return session
+
+    def test_trial_cancelled_while_rate_limited_is_released(self):
+        session = self._half_open_session(rate_per_second=0.5)
+        session._bucket.acquire()  # empty the bucket, the next acquire waits ~2s
+        cancelled = threading.Event()
+        threading.Timer(0.05, cancelled.set).start()
+
+        with self.assertRaises(FetchCancelledError):
+            session.request('POST', 'http://retailer.invalid', cancelled=cancelled)
+
+        # the cooldown has passed, so the next request must get a new trial instead of CircuitOpenError
+        self.assertEqual(session._breaker.before_request(), (True, True))
+
+    def test_trial_failing_with_unexpected_error_is_released(self):
+        session = self._half_open_session()
+
+        def fail(*args, **kwargs):
+            raise ValueError("boom")
+        session._send = fail
+
+        with self.assertRaises(ValueError):
+            session.request('POST', 'http://retailer.invalid')
+        self.assertEqual(session._breaker.before_request(), (True, True))
+
+    def test_failing_regular_request_leaves_the_trial_in_flight(self):
+        session = RetailerSession('test', rate_per_second=0, max_retries=0,
+                                  circuit_threshold=1, circuit_cooldown_seconds=0)
+        trial_started = threading.Event()
+
+        def fail(*args, **kwargs):
+            # the regular request is sent while the circuit is closed, then the circuit opens and another
+            # request takes the half-open trial before this one fails
+            session._breaker.record_challenge()
+            self.assertEqual(session._breaker.before_request(), (True, True))
+            trial_started.set()
+            raise ValueError("boom")
+        session._send = fail
+
+        with self.assertRaises(ValueError):
+            session.request('POST', 'http://retailer.invalid')
+        self.assertTrue(trial_started.is_set())
+        # the other caller's trial is still in flight, so nobody else gets through
+        self.assertEqual(session._breaker.before_request(), (False, False))
+
+    def test_successful_trial_closes_circuit(self):
+        session = self._half_open_session()
+        session._send = lambda *args, **kwargs: _Response(200)
+
+        self.assertEqual(session.request('POST', 'http://retailer.invalid').status_code, 200)
+        self.assertEqual(session._breaker.before_request(), (True, False))
+        self.assertEqual(session._breaker.before_request(), (True, False))
+
+
+if __name__ == '__main__':
+    unittest.main()
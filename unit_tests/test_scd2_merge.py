@@ -0,0 +1,162 @@
+"""
+Runs the fetcher's initial insert and SCD2 merge against a real PostgreSQL. The test creates a throwaway
+database next to DB_NAME on the DB_* server (the role needs CREATEDB) and is skipped when none is reachable.
+"""
+import os
+import unittest
+import uuid
+from typing import Iterator
+
+import psycopg2
+from psycopg2 import sql
+
+from fetcher.base_fetcher import BaseProductFetcher
+from fetcher.db_migrations import apply_migrations
+from fetcher.product_record import ProductRecord
+
+
+def _connect(database: str):
+    return psycopg2.connect(
+        host=os.environ['DB_HOST'],
+        database=database,
+        user=os.environ['DB_USER'],
+        password=os.environ['DB_PASSWORD'],
+        connect_timeout=3,
+    )
+
+
+def _product(product_id: str, price: float) -> ProductRecord:
+    return ProductRecord(
+        id=product_id, name_finnish=f"Testikahvi {product_id}", name_english=None, available_store=True,
+        available_web=True, net_weight=0.5, content_unit='kg', image_url=None, brand_name='Testi',
+        normal_price_unit='kpl', normal_price=price, batch_price=None, batch_discount_pct=None,
+        batch_discount_type=None, batch_days_left=None,
+    )
+
+
+class _StaticFetcher(BaseProductFetcher):
+    """Serves a fixed product list per store instead of calling a retailer API"""
+    category = 'suodatinkahvi'
+    _data_source = 'scd2-test'
+    _env_prefix = 'SCD2_TEST'
+
+    def __init__(self, conn, products: dict[str, list[ProductRecord]]):
+        super().__init__(conn)
+        self.products = products
+
+    def _get_store_ids(self) -> list[str]:
+        return list(self.products)
+
+    def _iter_store_products(self, store_id: str) -> Iterator[list[ProductRecord]]:
+        yield [_product(record.id, record.normal_price) for record in self.products[store_id]]
+
+    def validate_fetch_response(self, response) -> dict:
+        raise NotImplementedError
+
+
+class Scd2MergeTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        if not os.environ.get('DB_HOST'):
+            raise unittest.SkipTest("DB_HOST is not set")
+        try:
+            cls.admin_conn = _connect(os.environ['DB_NAME'])
+        except psycopg2.OperationalError as e:
+            raise unittest.SkipTest(f"no database available: {e}")
+        cls.admin_conn.autocommit = True
+        cls.database = f"tonno_scd2_test_{uuid.uuid4().hex[:8]}"
+        with cls.admin_conn.cursor() as cur:
+            cur.execute(sql.SQL("CREATE DATABASE {}").format(sql.Identifier(cls.database)))
+        cls.conn = _connect(cls.database)
+        apply_migrations(cls.conn)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.conn.close()
+        with cls.admin_conn.cursor() as cur:
+            cur.execute(sql.SQL("DROP DATABASE {}").format(sql.Identifier(cls.database)))
+        cls.admin_conn.close()
+
+    def _counts(self, data_source: str = _StaticFetcher._data_source) -> dict[str, int]:
+        with self.conn.cursor() as cur:
+            cur.execute("""
+                SELECT
+                    (SELECT count(*) FROM products_and_prices WHERE tonno_data_source = %(ds)s AND tonno_end_ts IS NULL),
+                    (SELECT count(*) FROM products_and_prices WHERE tonno_data_source = %(ds)s AND tonno_end_ts IS NOT NULL),
+                    (SELECT count(*) FROM price_intervals WHERE tonno_data_source = %(ds)s AND valid_to IS NULL),
+                    (SELECT count(*) FROM price_intervals WHERE tonno_data_source = %(ds)s AND valid_to IS NOT NULL),
+                    (SELECT count(*) FROM price_change_events WHERE tonno_data_source = %(ds)s),
+                    (SELECT count(*) FROM current_prices WHERE tonno_data_source = %(ds)s)
+            """, {'ds': data_source})
+            row = cur.fetchone()
+        self.conn.rollback()
+        return dict(zip(
+            ('open_rows', 'closed_rows', 'open_intervals', 'closed_intervals', 'change_events', 'current_prices'),
+            row,
+        ))
+
+    def test_init_unchanged_change_disappear_reappear(self):
+        fetcher = _StaticFetcher(self.conn, {'S1': [_product('p1', 5.0), _product('p2', 6.0), _product('p3', 7.0)]})
+
+        result = fetcher._insert_init_prices(self.conn)
+        self.assertEqual(result.changed_rows, 3)
+        self.assertEqual(self._counts(), {
+            'open_rows': 3, 'closed_rows': 0, 'open_intervals': 3, 'closed_intervals': 0,
+            'change_events': 0, 'current_prices': 3,
+        })
+
+        result = fetcher._update_prices(self.conn)
+        self.assertEqual(result.changed_rows, 0)
+        self.assertEqual(self._counts()['open_rows'], 3)
+        self.assertEqual(self._counts()['closed_rows'], 0)
+
+        fetcher.products['S1'][0] = _product('p1', 4.5)
+        result = fetcher._update_prices(self.conn)
+        self.assertEqual(result.changed_rows, 1)
+        self.assertEqual(self._counts(), {
+            'open_rows': 3, 'closed_rows': 1, 'open_intervals': 3, 'closed_intervals': 1,
+            'change_events': 1, 'current_prices': 3,
+        })
+
+        disappeared = fetcher.products['S1'].pop()
+        result = fetcher._update_prices(self.conn)
+        self.assertEqual(result.changed_rows, 1)
+        self.assertEqual(self._counts(), {
+            'open_rows': 2, 'closed_rows': 2, 'open_intervals': 2, 'closed_intervals': 2,
+            'change_events': 1, 'current_prices': 2,
+        })
+
+        fetcher.products['S1'].append(disappeared)
+        result = fetcher._update_prices(self.conn)
+        self.assertEqual(result.changed_rows, 1)
+        self.assertEqual(self._counts(), {
+            'open_rows': 3, 'closed_rows': 2, 'open_intervals': 3, 'closed_intervals': 2,
+            'change_events': 1, 'current_prices': 3,
+        })
+
+    def test_rows_of_removed_store_are_closed(self):
+        fetcher = _StaticFetcher(self.conn, {'R1': [_product('r1', 5.0)], 'R2': [_product('r2', 6.0)]})
+        fetcher._data_source = 'scd2-test-removed-store'
+        fetcher._insert_init_prices(self.conn)
+
+        del fetcher.products['R2']
+        with self.assertLogs('base-fetcher', level='WARNING'):
+            result = fetcher._update_prices(self.conn)
+        self.assertEqual(result.changed_rows, 1)
+        with self.conn.cursor() as cur:
+            cur.execute("""
+                SELECT tonno_store_id, tonno_end_ts IS NULL
+                FROM products_and_prices
+                WHERE tonno_data_source = %s
+                ORDER BY tonno_store_id
+            """, (fetcher._data_source,))
+            self.assertEqual(cur.fetchall(), [('R1', True), ('R2', False)])
+            cur.execute("SELECT tonno_store_id FROM current_prices WHERE tonno_data_source = %s",
+                        (fetcher._data_source,))
+            self.assertEqual(cur.fetchall(), [('R1',)])
+        self.conn.rollback()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+import datetime
+import unittest
+
+from fetcher.scheduler import ADAPTIVE_MAX_FACTOR, CronSchedule, IntervalSchedule, adaptive_factor, parse_schedule
+
+# a Sunday
+SUNDAY = datetime.datetime(2026, 10, 18, 5, 30, 15)
+
+
+class ParseScheduleTest(unittest.TestCase):
+
+    def test_intervals(self):
+        cases = {
+            '90s': datetime.timedelta(seconds=90),
+            '30m': datetime.timedelta(minutes=30),
+            '1.5h': datetime.timedelta(minutes=90),
+            '1d': datetime.timedelta(days=1),
+            '3600': datetime.timedelta(hours=1),
+            ' 12h ': datetime.timedelta(hours=12),
+        }
+        for text, interval in cases.items():
+            with self.subTest(text=text):
+                self.assertEqual(parse_schedule(text), IntervalSchedule(interval))
+
+    def test_zero_interval_is_rejected(self):
+        with self.assertRaises(ValueError):
+            parse_schedule('0h')
+
+    def test_cron_expression(self):
+        schedule = parse_schedule('*/15 6-8 * * 1-5')
+        self.assertIsInstance(schedule, CronSchedule)
+        self.assertEqual(schedule.minutes, frozenset({0, 15, 30, 45}))
+        self.assertEqual(schedule.hours, frozenset({6, 7, 8}))
+        self.assertEqual(schedule.weekdays, frozenset({1, 2, 3, 4, 5}))
+
+    def test_invalid_cron_expressions(self):
+        for text in ('* * * *', '60 * * * *', '* 24 * * *', '* * 0 * *', '5-1 * * * *', '*/0 * * * *', 'daily'):
+            with self.subTest(text=text):
+                with self.assertRaises(ValueError):
+                    parse_schedule(text)
+
+
+class IntervalScheduleTest(unittest.TestCase):
+
+    def test_next_after_applies_the_factor(self):
+        schedule = IntervalSchedule(datetime.timedelta(hours=6))
+        self.assertEqual(schedule.next_after(SUNDAY), SUNDAY + datetime.timedelta(hours=6))
+        self.assertEqual(schedule.next_after(SUNDAY, 2.0), SUNDAY + datetime.timedelta(hours=12))
+        self.assertEqual(schedule.next_after(SUNDAY, 0.5), SUNDAY + datetime.timedelta(hours=3))
+
+
+class CronScheduleTest(unittest.TestCase):
+
+    def test_daily(self):
+        schedule = CronSchedule.parse('0 6 * * *')
+        self.assertEqual(schedule.next_after(SUNDAY), datetime.datetime(2026, 10, 18, 6, 0))
+        self.assertEqual(schedule.next_after(datetime.datetime(2026, 10, 18, 6, 0)),
+                         datetime.datetime(2026, 10, 19, 6, 0))
+
+    def test_step_minutes(self):
+        schedule = CronSchedule.parse('*/15 * * * *')
+        self.assertEqual(schedule.next_after(datetime.datetime(2026, 10, 18, 10, 7)),
+                         datetime.datetime(2026, 10, 18, 10, 15))
+        self.assertEqual(schedule.next_after(datetime.datetime(2026, 10, 18, 23, 50)),
+                         datetime.datetime(2026, 10, 19, 0, 0))
+
+    def test_factor_is_ignored(self):
+        schedule = CronSchedule.parse('0 6 * * *')
+        self.assertEqual(schedule.next_after(SUNDAY, 4.0), schedule.next_after(SUNDAY))
+
+    def test_weekday_zero_and_seven_are_sunday(self):
+        for expression in ('0 12 * * 0', '0 12 * * 7'):
+            with self.subTest(expression=expression):
+                self.assertEqual(CronSchedule.parse(expression).next_after(SUNDAY),
+                                 datetime.datetime(2026, 10, 18, 12, 0))
+
+    def test_weekdays_skip_the_weekend(self):
+        schedule = CronSchedule.parse('30 7 * * 1-5')
+        self.assertEqual(schedule.next_after(SUNDAY), datetime.datetime(2026, 10, 19, 7, 30))
+
+    def test_restricted_day_fields_match_either(self):
+        # the 1st of the month or any Monday
+        schedule = CronSchedule.parse('0 0 1 * 1')
+        self.assertEqual(schedule.next_after(SUNDAY), datetime.datetime(2026, 10, 19, 0, 0))
+        self.assertEqual(schedule.next_after(datetime.datetime(2026, 10, 26, 0, 0)),
+                         datetime.datetime(2026, 11, 1, 0, 0))
+
+    def test_month_and_day(self):
+        schedule = CronSchedule.parse('0 0 29 2 *')
+        self.assertEqual(schedule.next_after(SUNDAY), datetime.datetime(2028, 2, 29, 0, 0))
+
+    def test_never_matching_expression(self):
+        with self.assertRaises(ValueError):
+            CronSchedule.parse('0 0 31 2 *').next_after(SUNDAY)
+
+
+class AdaptiveFactorTest(unittest.TestCase):
+
+    def test_too_few_runs_keep_the_schedule(self):
+        self.assertEqual(adaptive_factor([], 10), 1.0)
+        self.assertEqual(adaptive_factor([0, 0], 10), 1.0)
+
+    def test_idle_sources_back_off(self):
+        self.assertEqual(adaptive_factor([0, 0, 0], 10), 2.0)
+        self.assertEqual(adaptive_factor([0, 0, 0, 0, 0, 5], 10), 2.0)
+        self.assertEqual(adaptive_factor([0] * 6, 10), 4.0)
+        self.assertEqual(adaptive_factor([0] * 12, 10), ADAPTIVE_MAX_FACTOR)
+
+    def test_a_recent_change_ends_the_back_off(self):
+        self.assertEqual(adaptive_factor([1, 0, 0, 0, 0, 0], 10), 1.0)
+        self.assertEqual(adaptive_factor([0, 0, 3, 0, 0, 0], 10), 1.0)
+
+    def test_busy_sources_are_polled_more_often(self):
+        self.assertEqual(adaptive_factor([10, 10, 10], 10), 0.5)
+        self.assertEqual(adaptive_factor([30, 0, 0], 10), 0.5)
+        self.assertEqual(adaptive_factor([9, 9, 9, 100], 10), 1.0)
+
+
+if __name__ == '__main__':
+    unittest.main()